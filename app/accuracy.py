@@ -1,7 +1,84 @@
 """Update accuracy log using actual next-day returns."""
-from datetime import datetime, timedelta
-from app.stock_data import fetch_prices, compute_returns
-from app.models import get_latest_prediction, get_predictions_history, save_accuracy, get_accuracy_history
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import trading_calendar
+from app.fetcher import run_bounded
+from app.stock_data import fetch_history
+
+
+def _outcomes(series, dates):
+    """
+    For each date: close on the first trading day on or after it and the close one bar later.
+    Returns arrays (pred_close, next_close) with NaN where the next bar is not in the series yet.
+    """
+    index = pd.DatetimeIndex(series.index)
+    values = series.to_numpy(dtype=np.float64)
+    pos = index.searchsorted(pd.to_datetime(dates), side="left")
+    ok = pos + 1 < len(values)
+    pred = np.full(len(dates), np.nan)
+    nxt = np.full(len(dates), np.nan)
+    pred[ok] = values[pos[ok]]
+    nxt[ok] = values[pos[ok] + 1]
+    return pred, nxt
+
+
+def reconcile_accuracy(app, pending=None):
+    """
+    Score every pick still missing an outcome (all three ranks, every pending date) in one pass:
+    each symbol's exact session range is fetched once, next-day returns are aligned per symbol with one
+    searchsorted, and all results are written in one transaction. Returns the list of results.
+    pending defaults to models.get_pending_accuracy(app).
+    """
+    from app.models import get_pending_accuracy, save_accuracy_results
+
+    pending = get_pending_accuracy(app) if pending is None else pending
+    if not pending:
+        return []
+    # A pick is judged on the session after the first session on or after its date; skip it until that has traded
+    last_session = trading_calendar.session_on_or_before(datetime.now())
+    by_symbol = {}
+    for date_str, rank, symbol, needs_log in pending:
+        due = trading_calendar.next_session(trading_calendar.session_on_or_after(date_str))
+        if due <= last_session:
+            by_symbol.setdefault(symbol.upper(), []).append((date_str, rank, needs_log, due))
+    if not by_symbol:
+        return []
+
+    def _score(item):
+        symbol, picks = item
+        dates = [p[0] for p in picks]
+        start = trading_calendar.session_on_or_after(min(dates))
+        series = fetch_history(symbol, start, max(p[3] for p in picks))
+        if series is None or len(series) < 2:
+            return []
+        pred, nxt = _outcomes(series, dates)
+        out = []
+        for (date_str, rank, needs_log, _), p, n in zip(picks, pred, nxt):
+            if np.isnan(p) or np.isnan(n) or p == 0:
+                continue
+            actual_return = (n / p - 1.0) * 100
+            out.append({
+                "date": date_str,
+                "rank": rank,
+                "symbol": symbol,
+                "pred_close": float(p),
+                "actual_close": float(n),
+                "actual_return": float(actual_return),
+                # We "predicted" this stock would be among the best; treat as correct if it went up
+                "was_correct": actual_return > 0,
+                "needs_log": needs_log,
+            })
+        return out
+
+    results = []
+    for scored in run_bounded(_score, list(by_symbol.items())):
+        results.extend(scored or [])
+    save_accuracy_results(app, results)
+    return results
+
 
 def update_accuracy_for_date(app, for_date_str):
     """
@@ -13,62 +90,20 @@ def update_accuracy_for_date(app, for_date_str):
     symbol = get_predicted_symbol_for_date(app, for_date_str)
     if not symbol:
         return None
-    with app.app_context():
-        # Get actual close on prediction date and next trading day
-        end = datetime.strptime(for_date_str, "%Y-%m-%d") + timedelta(days=5)
-        start = datetime.strptime(for_date_str, "%Y-%m-%d") - timedelta(days=5)
-        prices = fetch_prices(symbol, days=14)
-        series = prices.get(symbol.upper())
-        if series is None or len(series) < 2:
-            return None
-        # Align to dates: close on for_date_str and close on next trading day
-        series = series.sort_index()
-        try:
-            on_or_after = series.index[series.index >= for_date_str]
-            if len(on_or_after) < 2:
-                return None
-            pred_close = float(series.loc[on_or_after[0]])
-            next_day_close = float(series.loc[on_or_after[1]])
-        except Exception:
-            return None
-        actual_return = (next_day_close / pred_close - 1.0) * 100
-        actual_close = next_day_close
-        # We "predicted" this stock would be the best; treat as correct if it went up
-        was_correct = 1 if actual_return > 0 else 0
-        save_accuracy(
-            app,
-            for_date_str,
-            symbol,
-            None,
-            actual_return,
-            actual_close,
-            was_correct,
-        )
-        return {
-            "date": for_date_str,
-            "symbol": symbol,
-            "actual_return": actual_return,
-            "actual_close": actual_close,
-            "was_correct": bool(was_correct),
-        }
+    for r in reconcile_accuracy(app, [(for_date_str, 1, symbol, True)]):
+        if r["rank"] == 1:
+            return {
+                "date": for_date_str,
+                "symbol": r["symbol"],
+                "actual_return": r["actual_return"],
+                "actual_close": r["actual_close"],
+                "was_correct": bool(r["was_correct"]),
+            }
+    return None
+
 
-def update_latest_accuracy(app):
-    """Update accuracy for the most recent prediction that doesn't have an accuracy log yet."""
-    with app.app_context():
-        from app.database import get_db
-        db = get_db()
-        rows = db.execute("""
-            SELECT d.date FROM daily_picks d
-            WHERE d.rank = 1
-            AND d.date NOT IN (SELECT date FROM accuracy_log)
-            ORDER BY d.date DESC
-        """).fetchall()
-        if not rows:
-            rows = db.execute("""
-                SELECT p.date FROM predictions p
-                LEFT JOIN accuracy_log a ON p.date = a.date
-                WHERE a.date IS NULL
-                ORDER BY p.date DESC
-            """).fetchall()
-        for row in rows:
-            update_accuracy_for_date(app, row[0])
+def update_latest_accuracy(app, progress=None):
+    """Update accuracy for every pick (ranks 1-3) that doesn't have an outcome yet."""
+    if progress:
+        progress(0.0, "Reconciling pending picks")
+    return reconcile_accuracy(app)
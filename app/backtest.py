@@ -0,0 +1,204 @@
+"""
+Walk-forward backtest: replay the daily top-3 pick over historical dates for the whole universe.
+
+Features for every (date, symbol) are computed at once from a wide close panel, then date ranges are
+scored in parallel with the production paths (_momentum_score weights, or the saved ML model).
+Timing matches accuracy_log: the pick made the morning after close t uses features up to t and is
+judged on close t+1 -> close t+2. News sentiment is not replayed (no historical news). Each date
+only picks from that date's universe constituents (see app.universe snapshots).
+
+    python -m app.backtest --years 3 --universe sp500 --out data/backtest.json
+"""
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app import indicators, trading_calendar
+from app.features import MIN_ML_OBS, volatility_series
+from app.ml_model import FEATURE_NAMES, model_available, score_with_ml
+from app.parallel import cpu_workers, map_columns
+from app.predictor import MOMENTUM_WEIGHTS
+from config import UNIVERSE
+
+TOP_K = 3
+BLOCK_DAYS = 63  # about one quarter of trading days per parallel work unit
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def _tensor_columns(closes):
+    """FEATURE_NAMES stacked on the last axis plus observation counts, for a (dates, symbols) close array."""
+    cols = {name: indicators.pct_return(closes, periods)
+            for name, periods in (("return_1d", 1), ("return_5d", 5), ("return_20d", 20))}
+    cols["volatility_10d"] = volatility_series(closes)
+    obs = np.cumsum(~np.isnan(closes), axis=0)
+    return np.stack([cols[k] for k in FEATURE_NAMES], axis=-1), obs
+
+
+def feature_tensor(panel, workers=None):
+    """
+    FEATURE_NAMES for every (date, symbol) of a wide close panel. Wide panels are split by symbol
+    across worker processes (app.parallel) reading one shared-memory copy of the closes.
+    Returns (array of shape (dates, symbols, len(FEATURE_NAMES)), observation counts of shape (dates, symbols)).
+    """
+    parts = map_columns(_tensor_columns, panel.to_numpy(dtype=np.float64), workers=workers)
+    return np.concatenate([p[0] for p in parts], axis=1), np.concatenate([p[1] for p in parts], axis=1)
+
+
+def forward_returns(panel):
+    """Percent return from close t+1 to close t+2 for the pick made after close t (NaN near the end)."""
+    closes = panel.to_numpy(dtype=np.float64)
+    out = np.full_like(closes, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:-2] = (closes[2:] / closes[1:-1] - 1.0) * 100
+    return out
+
+
+def _momentum_block(tensor, valid):
+    score = np.zeros(valid.shape)
+    for key, weight in MOMENTUM_WEIGHTS.items():
+        score += weight * np.nan_to_num(tensor[..., FEATURE_NAMES.index(key)], nan=0.0)
+    return np.where(valid, score, np.nan)
+
+
+def _ml_block(tensor, valid):
+    score = np.full(valid.shape, np.nan)
+    if valid.any():
+        probas = score_with_ml(np.nan_to_num(tensor[valid], nan=0.0))
+        if probas is None:
+            return None
+        score[valid] = probas
+    return score
+
+
+def _evaluate_block(rows, tensor, obs, has_close, fwd, use_ml):
+    """Top-K picks for a slice of date rows. Returns (rows, pick columns, scores, forward returns)."""
+    t = tensor[rows]
+    score = None
+    if use_ml:
+        score = _ml_block(t, (obs[rows] >= MIN_ML_OBS) & has_close[rows])
+    if score is None:
+        score = _momentum_block(t, (obs[rows] >= 2) & has_close[rows])
+    k = min(TOP_K, score.shape[1])
+    ranked = np.where(np.isnan(score), -np.inf, score)
+    top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(ranked, top, axis=1), axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    return rows, top, np.take_along_axis(score, top, axis=1), np.take_along_axis(fwd[rows], top, axis=1)
+
+
+def _summary(daily):
+    top1 = daily["top1_return"].dropna()
+    topk = daily["topk_mean_return"].dropna()
+    if top1.empty:
+        return {"days": 0}
+    return {
+        "days": int(len(top1)),
+        "hit_rate": round(float((top1 > 0).mean()), 4),
+        "hit_rate_topk": round(float((topk > 0).mean()), 4),
+        "mean_return": round(float(top1.mean()), 4),
+        "mean_return_topk": round(float(topk.mean()), 4),
+        "std_return": round(float(top1.std()), 4),
+        "percentiles": {str(p): round(float(np.percentile(top1, p)), 4) for p in PERCENTILES},
+        "percentiles_topk": {str(p): round(float(np.percentile(topk, p)), 4) for p in PERCENTILES},
+        "cumulative_return": round(float((np.prod(1 + top1 / 100) - 1) * 100), 4),
+    }
+
+
+def run_backtest(symbols=None, start=None, end=None, years=3, use_ml=None, workers=None, panel=None, universe=None):
+    """
+    Backtest the daily pick between start and end (YYYY-MM-DD; default: the last `years` years).
+    symbols defaults to every name that was in the universe (default UNIVERSE) during the period, and each
+    date only picks from that date's constituents (point-in-time membership from the stored snapshots),
+    so delisted and removed names count. use_ml=None uses the ML path when a model is saved (note the
+    saved model may have been trained on part of the period). panel overrides the price fetch.
+    workers (default CPU_WORKERS) sets the feature-shard processes and the scoring threads.
+    Returns {"picks": DataFrame, "daily": DataFrame, "summary": dict, "used_ml": bool}.
+    """
+    from app.universe import get_universe, members_between, membership_matrix
+
+    end = end or datetime.now().strftime("%Y-%m-%d")
+    start = start or (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=365 * years)).strftime("%Y-%m-%d")
+    if universe is None and symbols is None and panel is None:
+        universe = UNIVERSE
+    if panel is None:
+        from app.stock_data import fetch_close_panel
+        if symbols is None:
+            current = get_universe(universe)
+            symbols = members_between(universe, start, end) or current
+        # The first evaluated date needs MIN_ML_OBS sessions of history
+        warmup = trading_calendar.session_offset(start, -(MIN_ML_OBS - 1))
+        panel = fetch_close_panel(symbols, warmup, end)
+    if use_ml is None:
+        use_ml = model_available()
+    if panel.empty:
+        return {"picks": pd.DataFrame(), "daily": pd.DataFrame(), "summary": {"days": 0}, "used_ml": False}
+
+    workers = cpu_workers(workers)
+    tensor, obs = feature_tensor(panel, workers=workers)
+    has_close = panel.notna().to_numpy()
+    if universe is not None:
+        has_close &= membership_matrix(universe, panel.index, list(panel.columns))
+    fwd = forward_returns(panel)
+    dates = pd.DatetimeIndex(panel.index)
+    first = int(dates.searchsorted(pd.Timestamp(start)))
+    blocks = [np.arange(i, min(i + BLOCK_DAYS, len(dates))) for i in range(first, len(dates), BLOCK_DAYS)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda rows: _evaluate_block(rows, tensor, obs, has_close, fwd, use_ml), blocks))
+
+    symbols_arr = np.asarray(panel.columns)
+    pick_rows, daily_rows = [], []
+    for rows, top, scores, rets in results:
+        for i, row in enumerate(rows):
+            date_str = dates[row].strftime("%Y-%m-%d")
+            valid = ~np.isnan(scores[i])
+            if not valid.any():
+                continue
+            for rank, (j, sc, ret) in enumerate(zip(top[i][valid], scores[i][valid], rets[i][valid]), start=1):
+                pick_rows.append((date_str, rank, symbols_arr[j], float(sc), None if np.isnan(ret) else float(ret)))
+            r = rets[i][valid]
+            daily_rows.append((
+                date_str,
+                None if np.isnan(r[0]) else float(r[0]),
+                None if np.isnan(r).all() else float(np.nanmean(r)),
+            ))
+    picks = pd.DataFrame(pick_rows, columns=["date", "rank", "symbol", "score", "next_day_return"])
+    daily = pd.DataFrame(daily_rows, columns=["date", "top1_return", "topk_mean_return"]).astype(
+        {"top1_return": "float64", "topk_mean_return": "float64"})
+    return {"picks": picks, "daily": daily, "summary": _summary(daily), "used_ml": bool(use_ml)}
+
+
+def save_results(result, path):
+    """Write a run_backtest result as JSON (summary plus per-day picks)."""
+    payload = {
+        "summary": result["summary"],
+        "used_ml": result["used_ml"],
+        "picks": result["picks"].to_dict(orient="records"),
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the daily top-3 pick.")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--mode", choices=["auto", "ml", "momentum"], default="auto")
+    parser.add_argument("--workers", type=int, help="worker processes/threads (default CPU_WORKERS)")
+    parser.add_argument("--universe", help="sp500, russell1000, russell3000, watchlist or csv:<path> (default UNIVERSE)")
+    parser.add_argument("--out", help="write picks and summary as JSON")
+    args = parser.parse_args(argv)
+    use_ml = {"auto": None, "ml": True, "momentum": False}[args.mode]
+    result = run_backtest(start=args.start, end=args.end, years=args.years, use_ml=use_ml, workers=args.workers,
+                          universe=args.universe)
+    print(json.dumps(dict(result["summary"], used_ml=result["used_ml"]), indent=2))
+    if args.out:
+        save_results(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
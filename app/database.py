@@ -1,15 +1,205 @@
 """SQLite database setup and access."""
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
 from flask import g
 
+POOL_SIZE = 5
+# WAL lets the scheduler write while the UI reads; NORMAL sync is durable enough under WAL
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(path):
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return _pools[path]
+
+def acquire(path):
+    """Reusable connection to path from a small per-file pool (new one if the pool is empty)."""
+    path = str(path)
+    try:
+        return _pool(path).get_nowait()
+    except queue.Empty:
+        pass
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def release(path, conn):
+    """Return a connection to its pool (rolled back if a transaction was left open); closes it if the pool is full."""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _pool(str(path)).put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def close_pools():
+    """Close every pooled connection (e.g. before deleting a database file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+@contextmanager
+def connection(path):
+    """Pooled connection; commits on success, rolls back on error."""
+    conn = acquire(path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        release(path, conn)
+
+def _totals_triggers(table, source, rank):
+    """
+    CREATE TRIGGER statements that keep accuracy_totals in step with inserts, updates and deletes on table.
+    rank is an SQL expression for the row's rank, with {row} standing for NEW or OLD.
+    """
+    add = """INSERT INTO accuracy_totals (source, rank, total, correct, return_sum, return_count)
+             VALUES ('{source}', {rank}, 1, NEW.was_correct, COALESCE(NEW.actual_return, 0),
+                     NEW.actual_return IS NOT NULL)
+             ON CONFLICT (source, rank) DO UPDATE SET
+                 total = total + 1, correct = correct + excluded.correct,
+                 return_sum = return_sum + excluded.return_sum, return_count = return_count + excluded.return_count;"""
+    remove = """UPDATE accuracy_totals SET
+                    total = total - 1, correct = correct - OLD.was_correct,
+                    return_sum = return_sum - COALESCE(OLD.actual_return, 0),
+                    return_count = return_count - (OLD.actual_return IS NOT NULL)
+                WHERE source = '{source}' AND rank = {rank};"""
+    add = add.format(source=source, rank=rank.format(row="NEW"))
+    remove = remove.format(source=source, rank=rank.format(row="OLD"))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_totals_insert AFTER INSERT ON {table} BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_totals_update AFTER UPDATE ON {table} BEGIN {remove} {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_totals_delete AFTER DELETE ON {table} BEGIN {remove} END",
+    ]
+
+# Ordered schema changes on top of the CREATE TABLE script; PRAGMA user_version counts those applied.
+# Append only: never edit or reorder an entry that has shipped.
+MIGRATIONS = [
+    ["ALTER TABLE daily_picks ADD COLUMN price REAL"],
+    [
+        "ALTER TABLE features ADD COLUMN last_close REAL",
+        "ALTER TABLE features ADD COLUMN forward_return_1d REAL",
+    ],
+    [
+        "CREATE INDEX IF NOT EXISTS idx_daily_picks_rank_date ON daily_picks(rank, date)",
+        "CREATE INDEX IF NOT EXISTS idx_daily_picks_symbol_date ON daily_picks(symbol, date)",
+        "CREATE INDEX IF NOT EXISTS idx_predictions_date ON predictions(date, created_at)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS score_snapshots (
+               date TEXT NOT NULL,
+               symbol TEXT NOT NULL,
+               rank INTEGER NOT NULL,
+               score REAL NOT NULL,
+               ml_proba REAL,
+               news_sentiment REAL,
+               return_1d REAL,
+               return_5d REAL,
+               return_20d REAL,
+               volatility_10d REAL,
+               last_close REAL,
+               PRIMARY KEY (date, symbol)
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_score_snapshots_date_rank ON score_snapshots(date, rank)",
+        "CREATE INDEX IF NOT EXISTS idx_score_snapshots_symbol_date ON score_snapshots(symbol, date)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS pick_accuracy (
+               date TEXT NOT NULL,
+               rank INTEGER NOT NULL,
+               symbol TEXT NOT NULL,
+               pred_close REAL,
+               actual_close REAL,
+               actual_return REAL,
+               was_correct INTEGER NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY (date, rank)
+           )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS run_stats (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               kind TEXT NOT NULL,
+               started_at REAL NOT NULL,
+               duration_seconds REAL NOT NULL,
+               status TEXT NOT NULL,
+               error TEXT,
+               stages TEXT,
+               timings TEXT,
+               counters TEXT
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_run_stats_kind_started ON run_stats(kind, started_at)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS model_versions (
+               version INTEGER PRIMARY KEY,
+               created_at REAL NOT NULL,
+               kind TEXT NOT NULL,
+               n_trees INTEGER,
+               n_rows INTEGER,
+               rows_added INTEGER,
+               trained_through TEXT,
+               val_accuracy REAL,
+               val_samples INTEGER,
+               cv_score REAL
+           )""",
+    ],
+    ["ALTER TABLE model_versions ADD COLUMN labels TEXT DEFAULT 'picks'"],
+    [
+        # Running hit counts per (source, rank), so the dashboard never counts the whole history. Triggers keep
+        # them current; writers must upsert, because the delete behind INSERT OR REPLACE fires no trigger.
+        """CREATE TABLE IF NOT EXISTS accuracy_totals (
+               source TEXT NOT NULL,
+               rank INTEGER NOT NULL,
+               total INTEGER NOT NULL DEFAULT 0,
+               correct INTEGER NOT NULL DEFAULT 0,
+               return_sum REAL NOT NULL DEFAULT 0,
+               return_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (source, rank)
+           ) WITHOUT ROWID""",
+        """INSERT OR REPLACE INTO accuracy_totals
+           SELECT 'log', 1, COUNT(*), COALESCE(SUM(was_correct), 0), COALESCE(SUM(actual_return), 0),
+                  COUNT(actual_return)
+           FROM accuracy_log""",
+        """INSERT OR REPLACE INTO accuracy_totals
+           SELECT 'picks', rank, COUNT(*), COALESCE(SUM(was_correct), 0), COALESCE(SUM(actual_return), 0),
+                  COUNT(actual_return)
+           FROM pick_accuracy GROUP BY rank""",
+        *_totals_triggers("accuracy_log", "log", "1"),
+        *_totals_triggers("pick_accuracy", "picks", "{row}.rank"),
+    ],
+]
+
 def get_db_path(app):
     return app.config["DATABASE"]
 
 def init_db(app):
-    """Create tables if they don't exist."""
+    """Create tables if they don't exist. A database already at the latest schema version is left untouched."""
     path = get_db_path(app)
     conn = sqlite3.connect(path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS):
+        conn.close()
+        return
+    conn.execute("PRAGMA journal_mode=WAL")
     conn.executescript("""
         CREATE TABLE IF NOT EXISTS watchlist (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,29 +237,52 @@ def init_db(app):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(date, rank)
         );
+        CREATE TABLE IF NOT EXISTS features (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            return_1d REAL,
+            return_5d REAL,
+            return_20d REAL,
+            volatility_10d REAL,
+            last_close REAL,
+            forward_return_1d REAL,
+            PRIMARY KEY (symbol, date)
+        );
+        CREATE INDEX IF NOT EXISTS idx_features_date ON features(date);
     """)
     conn.commit()
-    try:
-        conn.execute("ALTER TABLE daily_picks ADD COLUMN price REAL")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+    migrate(conn)
     conn.close()
 
+def migrate(conn):
+    """Apply MIGRATIONS newer than the database's PRAGMA user_version, one committed step each."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for sql in statements:
+            try:
+                conn.execute(sql)
+            except sqlite3.OperationalError as e:
+                # Columns may already exist in databases created before migrations were tracked
+                if "duplicate column" not in str(e):
+                    raise
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    return len(MIGRATIONS)
+
 def get_db(app=None):
     """Get database connection for current app context."""
     if app is None:
         from flask import current_app
         app = current_app
     if "db" not in g:
-        g.db = sqlite3.connect(get_db_path(app))
-        g.db.row_factory = sqlite3.Row
+        g.db = acquire(get_db_path(app))
+        g.db_path = get_db_path(app)
     return g.db
 
 def close_db(e=None):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        release(g.pop("db_path"), db)
 
 def init_app(app):
     app.teardown_appcontext(close_db)
@@ -77,11 +290,5 @@ def init_app(app):
 @contextmanager
 def db_connection(app):
     """Standalone connection for use outside request context (e.g. scheduler)."""
-    path = app.config["DATABASE"]
-    conn = sqlite3.connect(path)
-    conn.row_factory = sqlite3.Row
-    try:
+    with connection(app.config["DATABASE"]) as conn:
         yield conn
-        conn.commit()
-    finally:
-        conn.close()
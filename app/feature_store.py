@@ -0,0 +1,69 @@
+"""Materialized feature store: ML features and next-day labels per (symbol, date) in the features table."""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import metrics
+from app.features import FEATURE_COLUMNS, MIN_ML_OBS, build_feature_frame
+from app.models import get_feature_rows, get_unlabeled_feature_keys, save_feature_labels, save_feature_rows
+
+
+def _last_bar_dates(prices):
+    return {
+        sym: pd.Timestamp(ser.index[-1]).strftime("%Y-%m-%d")
+        for sym, ser in prices.items()
+        if ser is not None and len(ser)
+    }
+
+
+def features_for_prices(app, prices):
+    """
+    Feature frame (as build_feature_frame) for the latest bar of every series in prices.
+    Rows already in the store for that symbol and bar date are read back in one query; only the
+    rest are computed. Newly computed rows for completed sessions are saved, and pending next-day
+    labels are filled from the same prices.
+    """
+    last = _last_bar_dates(prices)
+    if not last:
+        return build_feature_frame({})
+    stored = get_feature_rows(app, set(last.values()), symbols=last.keys())
+    stored = stored[stored["date"] == stored["symbol"].map(last)].set_index("symbol")
+    hits = stored.reindex(columns=FEATURE_COLUMNS).assign(n_obs=MIN_ML_OBS)
+
+    missing = {sym: prices[sym] for sym in last if sym not in hits.index}
+    metrics.cache_result("feature_store", True, len(last) - len(missing))
+    metrics.cache_result("feature_store", False, len(missing))
+    computed = build_feature_frame(missing)
+    if len(computed):
+        today = datetime.now().strftime("%Y-%m-%d")
+        dates = computed.index.map(last)
+        done = computed[(computed["n_obs"] >= MIN_ML_OBS) & (dates < today)].drop(columns="n_obs")
+        save_feature_rows(app, done.rename_axis("symbol").reset_index().assign(date=lambda f: f["symbol"].map(last)))
+    fill_labels(app, prices)
+
+    frame = pd.concat([f for f in (hits, computed) if len(f)]) if len(hits) or len(computed) else computed
+    return frame.reindex([sym for sym in prices if sym in frame.index])
+
+
+def fill_labels(app, prices):
+    """Set forward_return_1d on stored rows whose next bar is now in prices (completed sessions only)."""
+    if not prices:
+        return 0
+    first = min(pd.Timestamp(ser.index[0]) for ser in prices.values() if ser is not None and len(ser))
+    today = pd.Timestamp(datetime.now().strftime("%Y-%m-%d"))
+    pending = {}
+    for sym, date_str in get_unlabeled_feature_keys(app, first.strftime("%Y-%m-%d"), symbols=prices.keys()):
+        pending.setdefault(sym, []).append(date_str)
+    labels = []
+    for sym, dates in pending.items():
+        series = prices[sym]
+        index = pd.DatetimeIndex(series.index)
+        pos = index.get_indexer(pd.to_datetime(dates))
+        ok = (pos >= 0) & (pos + 1 < len(series))
+        ok[ok] &= index[pos[ok] + 1] < today
+        values = series.to_numpy(dtype=np.float64)
+        for date_str, p in zip(np.asarray(dates)[ok], pos[ok]):
+            labels.append((float((values[p + 1] / values[p] - 1.0) * 100), sym, date_str))
+    save_feature_labels(app, labels)
+    return len(labels)
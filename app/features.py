@@ -0,0 +1,129 @@
+"""Cross-sectional feature engine: momentum and volatility features for a whole universe in a few array operations."""
+import numpy as np
+import pandas as pd
+
+from app import indicators
+
+# Columns of the frame returned by build_feature_frame
+FEATURE_COLUMNS = ["return_1d", "return_5d", "return_20d", "volatility_10d", "last_close", "n_obs"]
+MIN_ML_OBS = 21  # same threshold as get_ml_features
+VOL_WINDOW = 10
+
+
+def close_matrix(prices, lookback=None):
+    """
+    Stack {symbol: close Series} (or a wide date x symbol DataFrame) into a bottom-aligned float array.
+    Each column holds that symbol's own observations with the latest at the last row and NaN padding on top,
+    so row -1 - p is "p observations ago" for every symbol, exactly like series.iloc[-1 - p].
+    Returns (array of shape (rows, n_symbols), list of symbols).
+    """
+    if isinstance(prices, pd.DataFrame):
+        symbols = list(prices.columns)
+        arr = prices.sort_index().to_numpy(dtype=np.float64)
+        # Stable sort on the validity mask pushes NaNs to the top and keeps each column's order
+        order = np.argsort(~np.isnan(arr), axis=0, kind="stable")
+        arr = np.take_along_axis(arr, order, axis=0)
+    else:
+        symbols = [s for s, ser in prices.items() if ser is not None and len(ser)]
+        cols = [np.asarray(prices[s], dtype=np.float64).ravel() for s in symbols]
+        cols = [c[~np.isnan(c)] for c in cols]
+        rows = max((len(c) for c in cols), default=0)
+        arr = np.full((rows, len(cols)), np.nan)
+        for j, c in enumerate(cols):
+            if len(c):
+                arr[rows - len(c):, j] = c
+    if lookback is not None and arr.shape[0] > lookback:
+        arr = arr[-lookback:]
+    return arr, symbols
+
+
+def _period_return(arr, periods):
+    """Percent return over the last `periods` observations per column (NaN where history is too short)."""
+    if arr.shape[0] < periods + 1:
+        return np.full(arr.shape[1], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (arr[-1] / arr[-1 - periods] - 1.0) * 100
+
+
+def _volatility(arr, window=VOL_WINDOW):
+    """Annualized std of the last `window` daily returns per column, in percent."""
+    if arr.shape[0] < window + 1:
+        return np.full(arr.shape[1], np.nan)
+    tail = arr[-(window + 1):]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = tail[1:] / tail[:-1] - 1.0
+    return rets.std(axis=0, ddof=1) * 100 * np.sqrt(252)
+
+
+def volatility_series(closes, window=VOL_WINDOW):
+    """volatility_10d for every row of a (dates, symbols) or 1-D close array (NaN until `window` returns exist)."""
+    return indicators.rolling_std(indicators.pct_return(closes, 1), window) * np.sqrt(252)
+
+
+def build_feature_frame(prices):
+    """
+    Compute return_1d/5d/20d, volatility_10d and last_close for every symbol at once.
+    prices: {symbol: close Series} or a wide date x symbol DataFrame of closes.
+    Returns a DataFrame indexed by symbol with FEATURE_COLUMNS; values that need more history than a
+    symbol has are NaN (n_obs counts its closes, capped at the lookback).
+    """
+    arr, symbols = close_matrix(prices, lookback=max(21, VOL_WINDOW + 1))
+    if not symbols:
+        return pd.DataFrame(columns=FEATURE_COLUMNS, dtype=np.float64)
+    n_obs = (~np.isnan(arr)).sum(axis=0)
+    return pd.DataFrame(
+        {
+            "return_1d": _period_return(arr, 1),
+            "return_5d": _period_return(arr, 5),
+            "return_20d": _period_return(arr, 20),
+            "volatility_10d": _volatility(arr),
+            "last_close": arr[-1],
+            "n_obs": n_obs,
+        },
+        index=pd.Index(symbols, name="symbol"),
+    )
+
+
+def point_in_time_features(series, dates):
+    """
+    ML features for one symbol as of each date's close (the last bar on or before it), from one
+    pass over the full series. Same values get_ml_features gives on the series truncated at that date.
+    Also returns last_close and forward_return_1d (percent return to the next bar, NaN if none yet).
+    Returns a DataFrame indexed by the date strings that had at least MIN_ML_OBS bars of history;
+    missing values stay NaN.
+    """
+    close = series.dropna().sort_index()
+    values = close.to_numpy(dtype=np.float64)
+    n = len(values)
+    cols = {name: indicators.pct_return(values, periods)
+            for name, periods in (("return_1d", 1), ("return_5d", 5), ("return_20d", 20))}
+    cols["volatility_10d"] = volatility_series(values)
+    cols["last_close"] = values
+    forward = np.full(n, np.nan)
+    if n > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            forward[:-1] = (values[1:] / values[:-1] - 1.0) * 100
+    cols["forward_return_1d"] = forward
+    pos = close.index.searchsorted(pd.to_datetime(list(dates)), side="right") - 1
+    keep = pos >= MIN_ML_OBS - 1
+    return pd.DataFrame({k: v[pos[keep]] for k, v in cols.items()}, index=pd.Index(list(dates))[keep])
+
+
+def ml_feature_frame(frame, feature_names):
+    """Rows with enough history for the ML model, NaN features filled with 0.0 (as get_ml_features does)."""
+    rows = frame[frame["n_obs"] >= MIN_ML_OBS]
+    return rows[feature_names].fillna(0.0)
+
+
+def metrics_from_row(row):
+    """Momentum metrics dict for one symbol's row (same shape as get_momentum_metrics), NaN -> None."""
+    def _val(key):
+        v = row[key]
+        return None if pd.isna(v) else float(v)
+
+    return {
+        "return_1d": _val("return_1d"),
+        "return_5d": _val("return_5d"),
+        "return_20d": _val("return_20d"),
+        "last_close": _val("last_close"),
+    }
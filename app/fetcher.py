@@ -0,0 +1,159 @@
+"""Bounded concurrent fetching: worker pool, per-host rate limiting, jittered retries and a per-run deadline."""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from app import metrics
+from config import FETCH_BACKOFF_SECONDS, FETCH_CONCURRENCY, FETCH_RATE_PER_SEC, FETCH_RETRIES
+
+YAHOO_HOST = "query1.finance.yahoo.com"
+
+
+class RateLimiter:
+    """Token bucket shared by every thread talking to one host (rate requests/sec, bursts up to `burst`)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Block until a request may be sent. Returns False instead of waiting past deadline (monotonic time)."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def available(self):
+        """Requests that could be sent right now without waiting."""
+        if self.rate <= 0:
+            return float("inf")
+        with self._lock:
+            return min(self.capacity, self._tokens + (time.monotonic() - self._last) * self.rate)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host, rate=None, burst=None):
+    """Process-wide limiter for host; rate (default FETCH_RATE_PER_SEC) and burst apply on first use."""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(FETCH_RATE_PER_SEC if rate is None else rate, burst)
+        return _limiters[host]
+
+
+def deadline_in(seconds):
+    """Absolute monotonic deadline `seconds` from now, or None for no limit."""
+    if seconds is None or seconds <= 0:
+        return None
+    return time.monotonic() + seconds
+
+
+def call_with_retry(fn, host=None, retries=None, backoff=None, deadline=None):
+    """
+    Call fn() under host's rate limit, retrying exceptions with full-jitter exponential backoff.
+    Raises the last exception when retries run out, or TimeoutError when the deadline leaves no room.
+    Latency (retries included) and outcome are recorded per host in metrics.
+    """
+    start = time.perf_counter()
+    try:
+        result = _call_with_retry(fn, host, retries, backoff, deadline)
+    except Exception:
+        metrics.inc("http_requests_total", host=host or "", outcome="error")
+        raise
+    finally:
+        metrics.observe("http_request_seconds", time.perf_counter() - start, host=host or "")
+    metrics.inc("http_requests_total", host=host or "", outcome="ok")
+    return result
+
+
+def _call_with_retry(fn, host, retries, backoff, deadline):
+    retries = FETCH_RETRIES if retries is None else retries
+    backoff = FETCH_BACKOFF_SECONDS if backoff is None else backoff
+    limiter = get_limiter(host) if host else None
+    attempt = 0
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError("fetch deadline reached")
+        if limiter is not None and not limiter.acquire(deadline):
+            raise TimeoutError("fetch deadline reached")
+        try:
+            return fn()
+        except Exception:
+            attempt += 1
+            if attempt > retries:
+                raise
+            metrics.inc("http_retries_total", host=host or "")
+            delay = random.uniform(0, backoff * (2 ** (attempt - 1)))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+
+
+def _guard(fn, deadline):
+    """fn wrapped to return None instead of raising, and to skip items once the deadline has passed."""
+    def _guarded(item):
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        try:
+            return fn(item)
+        except Exception:
+            metrics.inc("errors_total", where="worker")
+            return None
+
+    return _guarded
+
+
+def run_bounded(fn, items, max_workers=None, deadline=None):
+    """
+    Call fn(item) for every item on at most max_workers threads; returns results in item order.
+    Items not started before the deadline, and items whose call raised, give None.
+    """
+    items = list(items)
+    max_workers = FETCH_CONCURRENCY if max_workers is None else max_workers
+    guarded = _guard(fn, deadline)
+    if max_workers <= 1 or len(items) <= 1:
+        return [guarded(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(guarded, items))
+
+
+def iter_bounded(fn, items, max_workers=None, deadline=None):
+    """
+    Like run_bounded, but yields (item, result) as each call finishes (completion order), so the caller
+    can work on early results while later ones are still in flight. At most 2 * max_workers items are
+    submitted ahead of the consumer, so finished results never pile up.
+    """
+    items = list(items)
+    max_workers = FETCH_CONCURRENCY if max_workers is None else max_workers
+    guarded = _guard(fn, deadline)
+    if max_workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield item, guarded(item)
+        return
+    queue = iter(items)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        running = {pool.submit(guarded, item): item for item in islice(queue, 2 * max_workers)}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                for nxt in islice(queue, 1):
+                    running[pool.submit(guarded, nxt)] = nxt
+                yield item, future.result()
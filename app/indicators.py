@@ -0,0 +1,287 @@
+"""
+Technical indicators over (dates, symbols) arrays, in a batch and an incremental mode that give the same values.
+
+Batch functions (pct_return, rolling_mean, rolling_std, zscore, ema, rsi, atr, macd, volume_ratio) take a
+date-aligned array with one column per symbol (NaN where a symbol has no bar; 1-D arrays are one symbol) and
+return an array of the same shape, value t using bars up to t only.
+
+Batch mode never loops over dates in Python: rolling windows use pandas rolling and the recursive indicators
+pandas ewm(adjust=False). The classes keep per-symbol state and advance every symbol by one bar with update(),
+at a cost per symbol that does not depend on the window or the history length. Each update takes one value per
+symbol (the same row the batch function would see) and returns that row of the batch output. Instances hold only
+NumPy arrays, so they pickle.
+
+Rolling windows follow pandas rolling(window): a NaN inside the window makes the value NaN. Recursive
+indicators (EMA and Wilder's smoothing in RSI/ATR) skip NaN bars, leaving the state unchanged and returning NaN
+for that bar. They are seeded with the simple mean of their first `period` inputs, as in Wilder and TA-Lib, and
+are NaN until then.
+"""
+import numpy as np
+import pandas as pd
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)  # fast EMA, slow EMA, signal EMA
+
+
+def _as_2d(values):
+    arr = np.asarray(values, dtype=np.float64)
+    return (arr.reshape(-1, 1), True) if arr.ndim == 1 else (arr, False)
+
+
+def _shaped(out, flat):
+    return out[:, 0] if flat else out
+
+
+def _smooth(arr, period, alpha):
+    """
+    Batch Ema.update over a 2-D array: per column, the mean of the first `period` valid values, then
+    value += alpha * (x - value) over the later valid values, NaN bars skipped (and NaN in the output).
+    """
+    valid = ~np.isnan(arr)
+    count = np.cumsum(valid, axis=0)
+    seeded = count >= period
+    # The seed goes in place of the period-th valid value; ewm(ignore_na=True) then runs the recursion from it
+    seed_at = valid & (count == period)
+    x = np.where(seeded, arr, np.nan)
+    x[seed_at] = (np.cumsum(np.where(valid, arr, 0.0), axis=0)[seed_at]) / period
+    # Column-major input saves pandas a transpose: ewm runs one column at a time
+    out = pd.DataFrame(np.asfortranarray(x)).ewm(alpha=alpha, adjust=False, ignore_na=True).mean().to_numpy(copy=True)
+    out[~(valid & seeded)] = np.nan
+    return out
+
+
+def _previous_close(close):
+    """Last valid close strictly before each row (NaN before the first)."""
+    prev = np.full_like(close, np.nan)
+    prev[1:] = pd.DataFrame(close).ffill().to_numpy()[:-1]
+    return prev
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+def pct_return(values, periods=1):
+    """Percent return over the last `periods` rows (NaN for the first rows and across missing bars)."""
+    arr, flat = _as_2d(values)
+    out = np.full_like(arr, np.nan)
+    if len(arr) > periods:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[periods:] = (arr[periods:] / arr[:-periods] - 1.0) * 100
+    return _shaped(out, flat)
+
+
+def rolling_mean(values, window):
+    arr, flat = _as_2d(values)
+    return _shaped(pd.DataFrame(arr).rolling(window).mean().to_numpy(), flat)
+
+
+def rolling_std(values, window, ddof=1):
+    arr, flat = _as_2d(values)
+    return _shaped(pd.DataFrame(arr).rolling(window).std(ddof=ddof).to_numpy(), flat)
+
+
+def zscore(values, window):
+    """(value - rolling mean) / rolling std over the last `window` rows; NaN where the std is 0."""
+    arr, flat = _as_2d(values)
+    rolling = pd.DataFrame(arr).rolling(window)
+    mean, std = rolling.mean().to_numpy(), rolling.std().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(std > 0, (arr - mean) / std, np.nan)
+    return _shaped(out, flat)
+
+
+def volume_ratio(volume, window=20):
+    """Volume over the mean volume of the previous `window` bars."""
+    arr, flat = _as_2d(volume)
+    prior = np.full_like(arr, np.nan)
+    prior[1:] = pd.DataFrame(arr).rolling(window).mean().to_numpy()[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(prior > 0, arr / prior, np.nan)
+    return _shaped(out, flat)
+
+
+def ema(values, period):
+    arr, flat = _as_2d(values)
+    return _shaped(_smooth(arr, period, 2.0 / (period + 1)), flat)
+
+
+def rsi(close, period=RSI_PERIOD):
+    """Wilder's RSI (0-100) of close-to-close changes."""
+    arr, flat = _as_2d(close)
+    change = arr - _previous_close(arr)
+    gain = _smooth(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), period, 1.0 / period)
+    loss = _smooth(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)), period, 1.0 / period)
+    total = gain + loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(total > 0, 100.0 * gain / total, np.where(total == 0, 50.0, np.nan))
+    return _shaped(out, flat)
+
+
+def atr(high, low, close, period=ATR_PERIOD):
+    """Wilder's average true range, in price units."""
+    arr, flat = _as_2d(close)
+    high, low = _as_2d(high)[0], _as_2d(low)[0]
+    prev = _previous_close(arr)
+    rng = high - low
+    gap = np.fmax(np.abs(high - prev), np.abs(low - prev))
+    true_range = np.where(np.isnan(prev), rng, np.fmax(rng, gap))
+    true_range[np.isnan(arr) | np.isnan(rng)] = np.nan
+    return _shaped(_smooth(true_range, period, 1.0 / period), flat)
+
+
+def macd(close, periods=MACD_PERIODS):
+    """(MACD line, signal line, histogram) in price units."""
+    fast, slow, signal = periods
+    arr, flat = _as_2d(close)
+    line = _smooth(arr, fast, 2.0 / (fast + 1)) - _smooth(arr, slow, 2.0 / (slow + 1))
+    sig = _smooth(line, signal, 2.0 / (signal + 1))
+    return _shaped(line, flat), _shaped(sig, flat), _shaped(line - sig, flat)
+
+
+# ---------------------------------------------------------------------------
+# Incremental mode
+# ---------------------------------------------------------------------------
+
+class RollingWindow:
+    """
+    Mean and std of the last `window` values per symbol. Sums run over values minus a per-symbol shift, so
+    the variance does not lose precision for large values; they are recomputed from the ring buffer once
+    per `window` updates, which keeps rounding error from piling up at O(1) amortized cost.
+    """
+
+    def __init__(self, n_symbols, window, ddof=1):
+        self.window, self.ddof = window, ddof
+        self.buffer = np.full((window, n_symbols), np.nan)
+        self.pos = 0
+        self.shift = np.zeros(n_symbols)
+        self.total = np.zeros(n_symbols)
+        self.total_sq = np.zeros(n_symbols)
+        self.nans = np.full(n_symbols, window)
+
+    def update(self, x):
+        """Push one value per symbol; returns the window mean."""
+        x = np.asarray(x, dtype=np.float64)
+        old = self.buffer[self.pos]
+        new_nan, old_nan = np.isnan(x), np.isnan(old)
+        d_new = np.where(new_nan, 0.0, x - self.shift)
+        d_old = np.where(old_nan, 0.0, old - self.shift)
+        self.total += d_new - d_old
+        self.total_sq += d_new * d_new - d_old * d_old
+        self.nans += new_nan.astype(np.int64) - old_nan
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        if self.pos == 0:
+            self._resum()
+        return self.mean()
+
+    def _resum(self):
+        valid = ~np.isnan(self.buffer)
+        count = valid.sum(axis=0)
+        self.shift = np.where(count > 0, np.where(valid, self.buffer, 0.0).sum(axis=0) / np.maximum(count, 1), 0.0)
+        d = self.buffer - self.shift
+        self.total = np.nansum(d, axis=0)
+        self.total_sq = np.nansum(d * d, axis=0)
+
+    def mean(self):
+        return np.where(self.nans == 0, self.shift + self.total / self.window, np.nan)
+
+    def std(self):
+        n = self.window
+        if n <= self.ddof:
+            return np.full(len(self.total), np.nan)
+        var = (self.total_sq - self.total * self.total / n) / (n - self.ddof)
+        return np.where(self.nans == 0, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+    def zscore(self, x):
+        """zscore of x against the current window (call after update(x))."""
+        std = self.std()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(std > 0, (np.asarray(x, dtype=np.float64) - self.mean()) / std, np.nan)
+
+
+class Ema:
+    """Exponential moving average, alpha = 2 / (period + 1), seeded with the mean of the first `period` values."""
+
+    def __init__(self, n_symbols, period, alpha=None):
+        self.period = period
+        self.alpha = 2.0 / (period + 1) if alpha is None else alpha
+        self.value = np.full(n_symbols, np.nan)
+        self.count = np.zeros(n_symbols, dtype=np.int64)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        ok = ~np.isnan(x)
+        self.count += ok
+        # 1/count while seeding makes this a running mean of the first `period` values
+        rate = np.where(self.count <= self.period, 1.0 / np.maximum(self.count, 1), self.alpha)
+        value = np.where(self.count == 1, x, self.value + (x - self.value) * rate)
+        self.value = np.where(ok, value, self.value)
+        return np.where(ok & (self.count >= self.period), self.value, np.nan)
+
+
+class Wilder(Ema):
+    """Wilder's smoothing: an EMA with alpha = 1 / period."""
+
+    def __init__(self, n_symbols, period):
+        super().__init__(n_symbols, period, alpha=1.0 / period)
+
+
+class Rsi:
+    def __init__(self, n_symbols, period=RSI_PERIOD):
+        self.prev = np.full(n_symbols, np.nan)
+        self.gain = Wilder(n_symbols, period)
+        self.loss = Wilder(n_symbols, period)
+
+    def update(self, close):
+        close = np.asarray(close, dtype=np.float64)
+        change = close - self.prev
+        gain = self.gain.update(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)))
+        loss = self.loss.update(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)))
+        self.prev = np.where(np.isnan(close), self.prev, close)
+        total = gain + loss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(total > 0, 100.0 * gain / total, np.where(total == 0, 50.0, np.nan))
+
+
+class Atr:
+    def __init__(self, n_symbols, period=ATR_PERIOD):
+        self.prev = np.full(n_symbols, np.nan)
+        self.smooth = Wilder(n_symbols, period)
+
+    def update(self, high, low, close):
+        high, low, close = (np.asarray(v, dtype=np.float64) for v in (high, low, close))
+        rng = high - low
+        # The first bar (no previous close) uses high - low
+        gap = np.fmax(np.abs(high - self.prev), np.abs(low - self.prev))
+        true_range = np.where(np.isnan(self.prev), rng, np.fmax(rng, gap))
+        true_range[np.isnan(close) | np.isnan(rng)] = np.nan
+        self.prev = np.where(np.isnan(close), self.prev, close)
+        return self.smooth.update(true_range)
+
+
+class Macd:
+    def __init__(self, n_symbols, periods=MACD_PERIODS):
+        fast, slow, signal = periods
+        self.fast = Ema(n_symbols, fast)
+        self.slow = Ema(n_symbols, slow)
+        self.signal = Ema(n_symbols, signal)
+
+    def update(self, close):
+        """Returns (MACD line, signal line, histogram)."""
+        line = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(line)
+        return line, signal, line - signal
+
+
+class VolumeRatio:
+    def __init__(self, n_symbols, window=20):
+        self.window = RollingWindow(n_symbols, window)
+
+    def update(self, volume):
+        volume = np.asarray(volume, dtype=np.float64)
+        prior = self.window.mean()
+        self.window.update(volume)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(prior > 0, volume / prior, np.nan)
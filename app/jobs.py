@@ -0,0 +1,147 @@
+"""
+In-process background jobs for the expensive pipeline runs (prediction, training, accuracy update).
+
+submit() returns a job record at once and runs the work on a small thread pool; status and progress
+are read back with get_job(). Only one job per kind is queued or running at a time: a second submit
+while one is pending returns the pending job. The scheduler submits through here too, and each run
+holds its kind's work_lock(), so a manual run and the cron never do the same work twice at once.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app import metrics
+
+KIND_PREDICTION = "prediction"
+KIND_TRAIN = "train"
+KIND_ACCURACY = "accuracy"
+
+JOB_WORKERS = 2
+JOB_HISTORY = 50  # finished jobs kept for status lookups
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs = OrderedDict()
+_active = {}  # kind -> id of its queued/running job
+_jobs_lock = threading.Lock()
+_work_locks = {}
+
+
+def work_lock(kind):
+    """The lock held while a job of this kind runs (also for work started outside submit)."""
+    with _jobs_lock:
+        return _work_locks.setdefault(kind, threading.Lock())
+
+
+def _update(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _snapshot(job):
+    return dict(job) if job is not None else None
+
+
+def get_job(job_id):
+    """Copy of a job record, or None if unknown (or already dropped from the history)."""
+    with _jobs_lock:
+        return _snapshot(_jobs.get(job_id))
+
+
+def list_jobs(limit=20):
+    """Most recent jobs first."""
+    with _jobs_lock:
+        return [dict(j) for j in reversed(_jobs.values())][:limit]
+
+
+def _run(app, job_id, kind, fn, failure, args, kwargs):
+    def progress(fraction, message=None):
+        _update(job_id, progress=round(min(max(float(fraction), 0.0), 1.0), 3), message=message)
+
+    try:
+        with work_lock(kind):
+            _update(job_id, status="running", started_at=time.time())
+            with app.app_context(), metrics.track_run(app, kind) as run:
+                result = fn(app, *args, progress=progress, **kwargs)
+                if not result:
+                    run.update(status="failed", error=failure)
+        if result:
+            final = {"status": "done", "progress": 1.0, "result": result if result is not True else None}
+        else:
+            final = {"status": "failed", "error": failure}
+    except Exception as e:
+        metrics.inc("errors_total", where=f"job_{kind}")
+        final = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    with _jobs_lock:
+        _jobs[job_id].update(final, finished_at=time.time())
+        if _active.get(kind) == job_id:
+            del _active[kind]
+        while len(_jobs) > JOB_HISTORY and next(iter(_jobs)) not in _active.values():
+            _jobs.popitem(last=False)
+
+
+def submit(app, kind, fn, *args, failure="Job failed.", **kwargs):
+    """
+    Run fn(app, *args, progress=callback, **kwargs) in the background; callback(fraction, message) updates
+    the job's progress. A falsy return marks the job failed with `failure`. Returns (job, created): when a
+    job of the same kind is already queued or running, that job is returned and created is False.
+    """
+    with _jobs_lock:
+        pending = _active.get(kind)
+        if pending is not None:
+            return _snapshot(_jobs[pending]), False
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "progress": 0.0,
+            "message": None,
+            "result": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        _jobs[job_id] = job
+        _active[kind] = job_id
+        snapshot = dict(job)
+    _executor.submit(_run, app, job_id, kind, fn, failure, args, kwargs)
+    return snapshot, True
+
+
+def submit_prediction(app):
+    """Queue run_prediction (or return the one already pending)."""
+    from app.predictor import run_prediction
+    from app.universe import universe_label
+    return submit(app, KIND_PREDICTION, run_prediction,
+                  failure=f"Could not load {universe_label()} data or fetch prices. Try again in a moment.")
+
+
+def submit_training(app, sweep=None, labels=None):
+    """Queue train_model (or return the one already pending)."""
+    from app.ml_model import train_model
+    return submit(app, KIND_TRAIN, train_model, sweep=sweep, labels=labels,
+                  failure="Not enough labeled data (picks need 8+ days of accuracy history).")
+
+
+def _accuracy(app, progress=None):
+    from app.accuracy import update_latest_accuracy
+    from config import ML_INCREMENTAL
+    result = {"updated": len(update_latest_accuracy(app, progress=progress))}
+    if ML_INCREMENTAL and result["updated"]:
+        from app.ml_model import update_model
+        if progress:
+            progress(0.9, "Updating the model with the new outcomes")
+        # Waits for a full retrain in progress rather than racing it to the model file
+        with work_lock(KIND_TRAIN):
+            result["model"] = update_model(app) or None
+    return result
+
+
+def submit_accuracy(app):
+    """Queue update_latest_accuracy (or return the one already pending)."""
+    return submit(app, KIND_ACCURACY, _accuracy)
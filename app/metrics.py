@@ -0,0 +1,174 @@
+"""
+In-process metrics: counters and latency histograms, rendered in Prometheus text format at /metrics,
+plus per-run stats (stage seconds and counter deltas) saved to the run_stats table.
+
+With METRICS_ENABLED off every call returns immediately, so instrumented code costs a function call.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config import METRICS_ENABLED
+
+PREFIX = "stockpredictor_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+HELP = {
+    "stage_seconds": "Wall time per pipeline stage.",
+    "http_request_seconds": "Latency of outgoing HTTP requests (including retries) by host.",
+    "http_requests_total": "Outgoing HTTP requests by host and outcome.",
+    "http_retries_total": "Retried HTTP attempts by host.",
+    "model_load_seconds": "Time to unpickle the saved model.",
+    "model_predict_seconds": "Time per score_with_ml call.",
+    "model_train_seconds": "Time per train_model fit.",
+    "model_update_seconds": "Time to add trees in an incremental update_model.",
+    "symbols_total": "Symbols requested by a price fetch, by outcome (fetched or failed).",
+    "cache_requests_total": "Cache lookups by cache and result (hit or miss).",
+    "errors_total": "Exceptions caught and turned into a fallback, by location.",
+    "news_skipped_total": "Symbols scored without news because the Finnhub budget was used up.",
+    "news_deadline_total": "News panel requests that gave up waiting for the Finnhub budget.",
+    "runs_total": "Background job runs by kind and status.",
+}
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add value to a counter (names end in _total)."""
+    if not METRICS_ENABLED or not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    i = bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][i] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """Time the with-block into histogram name."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def stage(name):
+    """Time one pipeline stage (stage_seconds{stage=name}); repeated blocks add up within a run."""
+    return timer("stage_seconds", stage=name)
+
+
+def cache_result(cache, hit, n=1):
+    """Count n lookups of a cache as hits or misses."""
+    inc("cache_requests_total", n, cache=cache, result="hit" if hit else "miss")
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, esc)) + "}"
+
+
+def render():
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (list(h[0]), h[1], h[2])) for k, h in _histograms.items())
+    lines, seen = [], set()
+
+    def _header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in counters:
+        _header(name, "counter")
+        lines.append(f"{PREFIX}{name}{_label_text(labels)} {value:g}")
+    for (name, labels), (buckets, total, count) in histograms:
+        _header(name, "histogram")
+        running = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+            running += n
+            lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, [('le', f'{bound:g}' if bound != '+Inf' else bound)])} {running}")
+        lines.append(f"{PREFIX}{name}_sum{_label_text(labels)} {total:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_label_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _totals():
+    with _lock:
+        return dict(_counters), {k: h[1] for k, h in _histograms.items()}
+
+
+def _series_name(name, labels):
+    return name + _label_text(labels)
+
+
+@contextmanager
+def track_run(app, kind):
+    """
+    Save one run_stats row for the with-block: seconds per stage, other timings and counter deltas between
+    start and end (runs that overlap in time see each other's counts). The yielded dict's "status" and
+    "error" may be set by the caller; an exception marks the run as "error".
+    """
+    run = {"status": "ok", "error": None}
+    if not METRICS_ENABLED:
+        yield run
+        return
+    counters0, sums0 = _totals()
+    started = time.time()
+    try:
+        yield run
+    except Exception as e:
+        run.update(status="error", error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        counters1, sums1 = _totals()
+        stages, timings = {}, {}
+        for (name, labels), total in sums1.items():
+            delta = total - sums0.get((name, labels), 0.0)
+            if delta <= 0:
+                continue
+            if name == "stage_seconds":
+                stages[dict(labels)["stage"]] = round(delta, 4)
+            else:
+                timings[_series_name(name, labels)] = round(delta, 4)
+        counts = {
+            _series_name(name, labels): value - counters0.get((name, labels), 0)
+            for (name, labels), value in counters1.items()
+            if value != counters0.get((name, labels), 0)
+        }
+        inc("runs_total", kind=kind, status=run["status"])
+        from app.models import save_run_stats
+        try:
+            save_run_stats(app, kind, started, time.time() - started, run["status"], run["error"],
+                           stages, timings, counts)
+        except Exception:
+            inc("errors_total", where="run_stats")
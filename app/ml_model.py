@@ -1,93 +1,428 @@
 """ML model trained on accuracy history to score symbols (probability of positive next-day return)."""
+import copy
 import json
+import os
+import shutil
+import threading
+import time
 from pathlib import Path
 
-import numpy as np
-
+# numpy, sklearn and joblib are imported inside the functions that use them, so importing this module
+# (e.g. for model_available() on the dashboard) stays cheap.
+from app import metrics
 from config import DATA_DIR
 
 MODEL_FILE = DATA_DIR / "model.joblib"
 FEATURE_NAMES = ["return_1d", "return_5d", "return_20d", "volatility_10d"]
 MIN_TRAINING_SAMPLES = 8
+DEFAULT_PARAMS = {"n_estimators": 50, "max_depth": 5}
+PARAM_GRID = {"n_estimators": [50, 100, 200], "max_depth": [3, 5, 8], "min_samples_leaf": [1, 5]}
+SWEEP_FOLDS = 3
+MIN_SWEEP_SAMPLES = 30
+# Rows each tree is fit on (bootstrap subsample) once the training set is larger, e.g. universe labels
+MAX_SAMPLES_PER_TREE = 200_000
+# Incremental updates: trees added per update, fit on the rows of the most recent UPDATE_WINDOW labeled dates;
+# the oldest trees are dropped beyond MAX_TREES so the forest follows recent data
+UPDATE_TREES = 10
+UPDATE_WINDOW = 60
+MAX_TREES = 200
+# Rolling validation over the last VALIDATION_WINDOW labeled dates, each scored before the model learned from it
+VALIDATION_WINDOW = 20
+MODEL_VERSIONS_KEPT = 10
+
+# Loaded model kept in memory; "key" identifies the file version it came from
+_registry = {"key": None, "model": None, "imputer": None, "payload": None}
+# Same for the compact copy (model.npz) scored by app.tree_runtime
+_compact = {"key": None, "forest": None}
+_registry_lock = threading.Lock()
+
+
+def _build_feature_rows(dates_by_symbol):
+    """
+    Point-in-time feature rows for {symbol: [date, ...]}: one price-history read per symbol covering
+    all its dates, then one vectorized pass. Returns a DataFrame with symbol, date and feature columns.
+    """
+    import pandas as pd
+    from app import trading_calendar
+    from app.fetcher import run_bounded
+    from app.features import MIN_ML_OBS, point_in_time_features
+    from app.stock_data import fetch_history
+
+    def _build(item):
+        symbol, dates = item
+        # Exactly the MIN_ML_OBS sessions of history the earliest date's features need
+        start = trading_calendar.session_offset(min(dates), -(MIN_ML_OBS - 1))
+        series = fetch_history(symbol, start, max(dates))
+        if series is None or len(series) < 2:
+            return None
+        return point_in_time_features(series, dates).rename_axis("date").reset_index().assign(symbol=symbol)
+
+    built = [f for f in run_bounded(_build, list(dates_by_symbol.items())) if f is not None and len(f)]
+    return pd.concat(built, ignore_index=True) if built else None
 
 
 def _get_training_data(app):
-    """Build X (list of feature lists) and y (0/1) from accuracy_log."""
+    """
+    Build X (list of feature lists), y (0/1) and the rows' dates from accuracy_log, in date order.
+    Feature rows come from the features table; only rows not stored yet are computed (and then stored).
+    """
+    import numpy as np
     from app.database import get_db
-    from app.stock_data import fetch_prices_until, get_ml_features
+    from app.models import get_training_feature_rows, save_feature_rows
 
     with app.app_context():
         db = get_db()
         rows = db.execute(
             "SELECT date, predicted_symbol, actual_return FROM accuracy_log ORDER BY date"
         ).fetchall()
-    X, y = [], []
+    rows = [r for r in rows if r["actual_return"] is not None]
+    stored = get_training_feature_rows(app)
+    have = set(zip(stored["symbol"], stored["date"]))
+    missing = {}
     for r in rows:
-        date_str = r["date"]
-        symbol = r["predicted_symbol"]
-        actual_return = r["actual_return"]
-        if actual_return is None:
-            continue
-        series = fetch_prices_until(symbol, date_str, days=60)
-        if series is None:
-            continue
-        feats = get_ml_features(series)
-        if feats is None:
+        if (r["predicted_symbol"], r["date"]) not in have:
+            missing.setdefault(r["predicted_symbol"], []).append(r["date"])
+    if missing:
+        built = _build_feature_rows(missing)
+        if built is not None:
+            save_feature_rows(app, built)
+            stored = get_training_feature_rows(app)
+    by_key = stored.set_index(["symbol", "date"])[FEATURE_NAMES].fillna(0.0)
+    X, y, dates = [], [], []
+    for r in rows:
+        key = (r["predicted_symbol"], r["date"])
+        if key not in by_key.index:
             continue
-        X.append([feats[k] for k in FEATURE_NAMES])
-        y.append(1 if actual_return > 0 else 0)
-    return np.array(X, dtype=np.float64), np.array(y, dtype=np.int32)
+        X.append(by_key.loc[key].tolist())
+        y.append(1 if r["actual_return"] > 0 else 0)
+        dates.append(r["date"])
+    return (np.array(X, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)), np.array(y, dtype=np.int32),
+            np.array(dates, dtype=str))
+
+
+def _training_data(app, labels, since=None, workers=None, progress=None):
+    """
+    (X, y, dates) in date order for a label source: "picks" (the logged #1 picks in accuracy_log) or
+    "universe" (every constituent on every session of the last ML_TRAINING_YEARS, see app.training_set).
+    since limits universe rows to dates on or after it.
+    """
+    if labels == "picks":
+        return _get_training_data(app)
+    if labels != "universe":
+        raise ValueError(f"Unknown training labels {labels!r}; expected 'picks' or 'universe'")
+    from datetime import datetime, timedelta
+    from app.training_set import build_training_set
+    from config import ML_TRAINING_YEARS
 
+    end = datetime.now().strftime("%Y-%m-%d")
+    start = since or (datetime.now() - timedelta(days=round(365 * ML_TRAINING_YEARS))).strftime("%Y-%m-%d")
+    return build_training_set(start, end, workers=workers, progress=progress)
 
-def train_model(app):
+
+def _max_samples(n):
+    return min(1.0, MAX_SAMPLES_PER_TREE / n) if n else None
+
+
+def _sweep(X, y, workers):
+    """
+    Grid-search PARAM_GRID with time-ordered folds (training rows are in date order), fitting candidates on
+    `workers` processes. Returns (best params, mean CV accuracy), or (None, None) with too few rows.
+    """
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
+
+    if len(y) < MIN_SWEEP_SAMPLES:
+        return None, None
+    search = GridSearchCV(
+        RandomForestClassifier(random_state=42, max_samples=_max_samples(len(y))),
+        PARAM_GRID,
+        cv=TimeSeriesSplit(n_splits=SWEEP_FOLDS),
+        n_jobs=workers,
+        error_score=np.nan,
+    )
+    search.fit(X, y)
+    return search.best_params_, float(search.best_score_)
+
+
+def train_model(app, sweep=None, workers=None, progress=None, labels=None):
     """
-    Train RandomForest on accuracy_log history. Saves model to data/model.joblib.
+    Train RandomForest on labeled history. Saves model to data/model.joblib.
+    labels (default ML_LABELS) is "picks" (accuracy_log, one row per day) or "universe" (every constituent
+    on every session; each tree then sees at most MAX_SAMPLES_PER_TREE rows).
+    Trees are built on `workers` cores (default CPU_WORKERS). With sweep (default ML_SWEEP) the
+    hyperparameters come from a parallel grid search over PARAM_GRID instead of DEFAULT_PARAMS.
+    progress(fraction, message), if given, is called between stages.
     Returns True if trained and saved, False if not enough data.
     """
+    return _train_full(app, sweep, workers, progress, labels) is not None
+
+
+def _train_full(app, sweep, workers, progress, labels):
+    """train_model(); returns the payload it saved and installed, or None."""
     try:
         from sklearn.ensemble import RandomForestClassifier
         from sklearn.impute import SimpleImputer
-        import joblib
     except ImportError:
-        return False
+        return None
+    import numpy as np
+    from app.parallel import cpu_workers
+    from config import ML_LABELS, ML_SWEEP
 
-    X, y = _get_training_data(app)
+    labels = labels or ML_LABELS
+    workers = cpu_workers(workers)
+    if progress:
+        progress(0.0, "Building training features")
+    build_progress = (lambda f, m=None: progress(0.3 * f, m)) if progress else None
+    X, y, dates = _training_data(app, labels, workers=workers, progress=build_progress)
     if len(y) < MIN_TRAINING_SAMPLES:
-        return False
+        return None
+    do_sweep = ML_SWEEP if sweep is None else sweep
+    if progress:
+        progress(0.3, "Searching hyperparameters" if do_sweep else "Fitting model")
     # Handle any inf/nan
     imp = SimpleImputer(strategy="median")
     X = imp.fit_transform(X)
     np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
-    clf = RandomForestClassifier(n_estimators=50, max_depth=5, random_state=42)
-    clf.fit(X, y)
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    joblib.dump({"model": clf, "imputer": imp, "features": FEATURE_NAMES}, MODEL_FILE)
-    return True
+    params, cv_score = _sweep(X, y, workers) if do_sweep else (None, None)
+    params = params or DEFAULT_PARAMS
+    clf = RandomForestClassifier(**params, random_state=42, n_jobs=workers, max_samples=_max_samples(len(y)))
+    with metrics.timer("model_train_seconds"):
+        clf.fit(X, y)
+    payload = {
+        "model": clf,
+        "imputer": imp,
+        "features": FEATURE_NAMES,
+        "trained_at": time.time(),
+        "params": params,
+        "cv_score": cv_score,
+        "labels": labels,
+        "trained_through": str(dates[-1]),
+        "validation": [],
+    }
+    _save(app, payload, "full", n_rows=len(y), rows_added=len(y))
+    return payload
+
+
+def update_model(app, workers=None, progress=None):
+    """
+    Incremental refresh after new outcomes are logged, from the model's own label source. Rows labeled after
+    its trained_through date are first scored by the current model (test-then-train; hits per date feed the
+    rolling validation accuracy), then UPDATE_TREES trees fit on the rows of the latest UPDATE_WINDOW dates are
+    added and the oldest beyond MAX_TREES dropped.
+    Outcomes filled in late for dates before trained_through wait for the next full train_model().
+    Without a versioned model this falls back to train_model(). Returns a summary dict, or False if there
+    is not enough data.
+    """
+    import numpy as np
+    from app import trading_calendar
+    from app.parallel import cpu_workers
+
+    load_model()
+    with _registry_lock:
+        current = _registry["payload"]
+    if current is None or not current.get("trained_through"):
+        # The payload train just saved, not _registry["payload"], which another thread may replace meanwhile
+        payload = _train_full(app, None, workers, progress, None)
+        return payload is not None and _summary(payload, 0)
+    if progress:
+        progress(0.0, "Loading newly labeled rows")
+    labels = current.get("labels", "picks")
+    since = trading_calendar.session_offset(current["trained_through"], -UPDATE_WINDOW)
+    X, y, dates = _training_data(app, labels, since=since, workers=workers)
+    new = dates > current["trained_through"]
+    if not new.any():
+        return _summary(current, 0)
+    imputer = current["imputer"]
+    X = imputer.transform(X)
+    np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    hits = (current["model"].predict_proba(X[new])[:, 1] >= 0.5).astype(int) == y[new]
+    new_dates, per_date = np.unique(dates[new], return_inverse=True)
+    scored = [[str(d), int(h), int(n)] for d, h, n in
+              zip(new_dates, np.bincount(per_date, weights=hits), np.bincount(per_date))]
+    payload = dict(current, trained_at=time.time(), trained_through=str(new_dates[-1]),
+                   validation=(list(current.get("validation") or []) + scored)[-VALIDATION_WINDOW:])
+    recent = dates >= np.unique(dates)[-UPDATE_WINDOW:][0]
+    window = y[recent]
+    # Trees fit on a single class would not line up with the rest of the forest; keep the trees until both occur
+    if len(np.unique(window)) == 2:
+        if progress:
+            progress(0.5, "Adding trees")
+        # Grow a copy so predictions running meanwhile keep using the installed model
+        model = copy.deepcopy(current["model"])
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + UPDATE_TREES,
+                         n_jobs=cpu_workers(workers), max_samples=_max_samples(len(window)))
+        with metrics.timer("model_update_seconds"):
+            model.fit(X[recent], window)
+        model.estimators_ = model.estimators_[-MAX_TREES:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+        payload["model"] = model
+    _save(app, payload, "incremental", n_rows=len(window), rows_added=int(new.sum()))
+    return _summary(payload, int(new.sum()))
+
+
+def _summary(payload, rows_added):
+    # validation holds [date, hits, rows] per labeled date
+    validation = payload.get("validation") or []
+    hits, rows = sum(v[1] for v in validation), sum(v[2] for v in validation)
+    return {
+        "version": payload.get("version"),
+        "labels": payload.get("labels", "picks"),
+        "rows_added": rows_added,
+        "trees": len(getattr(payload["model"], "estimators_", [])),
+        "trained_through": payload.get("trained_through"),
+        "val_accuracy": round(hits / rows, 4) if rows else None,
+        "val_samples": rows,
+    }
+
+
+def _version_file(version):
+    return MODEL_FILE.parent / "models" / f"model-v{version:05d}.joblib"
+
+
+def _save(app, payload, kind, n_rows, rows_added):
+    """
+    Write payload as the next model version: data/model.joblib (replaced atomically) plus a copy under
+    data/models/ (the newest MODEL_VERSIONS_KEPT are kept), recorded in model_versions, then hot-swapped in.
+    """
+    import joblib
+    from app.models import next_model_version, save_model_version
+
+    payload["version"] = version = next_model_version(app)
+    archive = _version_file(version)
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MODEL_FILE.with_suffix(".tmp")
+    joblib.dump(payload, tmp)
+    shutil.copyfile(tmp, archive)
+    os.replace(tmp, MODEL_FILE)
+    if hasattr(payload["model"], "estimators_"):
+        from app.tree_runtime import export_forest
+        export_forest(payload["model"], payload["imputer"], _compact_file(), FEATURE_NAMES)
+    for old in sorted(archive.parent.glob("model-v*.joblib"))[:-MODEL_VERSIONS_KEPT]:
+        old.unlink(missing_ok=True)
+    summary = _summary(payload, rows_added)
+    save_model_version(app, version, kind, summary["trees"], n_rows, rows_added, payload["trained_through"],
+                       summary["val_accuracy"], summary["val_samples"], payload.get("cv_score"), summary["labels"])
+    # Hot-swap: the next load_model() returns this model without reading it back from disk
+    _install(_file_key(), payload)
+
+
+def _compact_file():
+    return MODEL_FILE.with_suffix(".npz")
+
+
+def _file_key(path=None):
+    """(mtime_ns, size) of the model file (or path), or None if it does not exist."""
+    try:
+        st = (path or MODEL_FILE).stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _install(key, data):
+    """Put a loaded payload in the registry. Models saved for a different FEATURE_NAMES are ignored."""
+    compatible = data is not None and list(data.get("features") or FEATURE_NAMES) == FEATURE_NAMES
+    if compatible and hasattr(data.get("model"), "n_jobs"):
+        # Score on every configured core, whatever the model was saved with
+        from app.parallel import cpu_workers
+        data["model"].n_jobs = cpu_workers()
+    with _registry_lock:
+        _registry["key"] = key
+        _registry["model"] = data.get("model") if compatible else None
+        _registry["imputer"] = data.get("imputer") if compatible else None
+        _registry["payload"] = data if compatible else None
+        return _registry["model"], _registry["imputer"]
+
+
+def model_available():
+    """True if a model is loaded or saved; unlike load_model() this never unpickles (or imports sklearn)."""
+    with _registry_lock:
+        if _registry["model"] is not None:
+            return True
+    return _file_key() is not None
 
 
 def load_model():
-    """Load saved model and imputer. Returns (model, imputer) or (None, None)."""
-    if not MODEL_FILE.exists():
-        return None, None
+    """
+    Return (model, imputer) or (None, None). Kept in memory after the first load; data/model.joblib
+    is only unpickled again when its mtime/size changes (e.g. replaced by another process).
+    """
+    key = _file_key()
+    with _registry_lock:
+        if key == _registry["key"]:
+            metrics.cache_result("model", True)
+            return _registry["model"], _registry["imputer"]
+    metrics.cache_result("model", False)
+    if key is None:
+        return _install(None, None)
     try:
         import joblib
-        data = joblib.load(MODEL_FILE)
-        return data.get("model"), data.get("imputer")
+        with metrics.timer("model_load_seconds"):
+            data = joblib.load(MODEL_FILE)
     except Exception:
+        metrics.inc("errors_total", where="model_load")
         return None, None
+    return _install(key, data)
+
+
+def load_compact():
+    """
+    The current model as an app.tree_runtime.Forest (memory-mapped model.npz), or None when there is no compact
+    copy or it is older than model.joblib. Reloaded only when either file changes; never imports sklearn.
+    """
+    key = (_file_key(_compact_file()), _file_key())
+    with _registry_lock:
+        if key == _compact["key"]:
+            metrics.cache_result("model", True)
+            return _compact["forest"]
+    metrics.cache_result("model", False)
+    forest = None
+    if key[0] is not None and key[1] is not None and key[0][0] >= key[1][0]:
+        try:
+            from app.tree_runtime import load_forest
+            with metrics.timer("model_load_seconds"):
+                forest = load_forest(_compact_file())
+        except Exception:
+            metrics.inc("errors_total", where="model_load")
+        if forest is not None and forest.features != FEATURE_NAMES:
+            forest = None
+    with _registry_lock:
+        _compact.update(key=key, forest=forest)
+    return forest
+
+
+def _feature_array(features):
+    """2-D float32 array in FEATURE_NAMES order from a feature DataFrame, an array, or a list of dicts."""
+    import numpy as np
+    if hasattr(features, "columns"):
+        return features[FEATURE_NAMES].to_numpy(dtype=np.float32)
+    if isinstance(features, np.ndarray):
+        return np.asarray(features, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+    return np.array([[f.get(k, 0) for k in FEATURE_NAMES] for f in features], dtype=np.float32)
 
 
 def score_with_ml(features_list):
     """
-    features_list: list of dicts with keys return_1d, return_5d, return_20d, volatility_10d.
+    features_list: list of dicts with keys return_1d, return_5d, return_20d, volatility_10d, or a
+    feature matrix (DataFrame with those columns, or array in FEATURE_NAMES order) from app.features.
     Returns list of probabilities (probability of positive next-day return), same length as input.
     If model not available, returns None.
+    With ML_RUNTIME=numpy (default) the compact copy is scored by app.tree_runtime; the sklearn model is only
+    unpickled when there is no up-to-date model.npz (e.g. a model saved by an older version) or ML_RUNTIME=sklearn.
     """
+    from config import ML_RUNTIME
+    forest = load_compact() if ML_RUNTIME == "numpy" else None
+    if forest is not None:
+        with metrics.timer("model_predict_seconds"):
+            return forest.predict_proba(_feature_array(features_list)).tolist()
     model, imputer = load_model()
     if model is None:
         return None
-    X = np.array([[f.get(k, 0) for k in FEATURE_NAMES] for f in features_list], dtype=np.float64)
-    X = imputer.transform(X)
-    np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
-    proba = model.predict_proba(X)[:, 1]
+    import numpy as np
+    with metrics.timer("model_predict_seconds"):
+        X = _feature_array(features_list)
+        X = imputer.transform(X)
+        np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        proba = model.predict_proba(X)[:, 1]
     return proba.tolist()
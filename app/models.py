@@ -1,4 +1,6 @@
 """Data access helpers for watchlist, predictions, and accuracy."""
+from datetime import date, timedelta
+
 from app.database import get_db
 
 def get_watchlist(app):
@@ -40,16 +42,14 @@ def save_daily_picks(app, date_str, picks):
     from app.database import db_connection
     with db_connection(app) as conn:
         conn.execute("DELETE FROM daily_picks WHERE date = ?", (date_str,))
-        for rank, pick in enumerate(picks[:3], start=1):
-            symbol = pick[0].upper()
-            score = pick[1]
-            reason = pick[2] or ""
-            price = pick[3] if len(pick) > 3 else None
-            conn.execute(
-                """INSERT INTO daily_picks (date, rank, symbol, score, reason, price)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (date_str, rank, symbol, score, reason, price)
-            )
+        conn.executemany(
+            """INSERT INTO daily_picks (date, rank, symbol, score, reason, price)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (date_str, rank, pick[0].upper(), pick[1], pick[2] or "", pick[3] if len(pick) > 3 else None)
+                for rank, pick in enumerate(picks[:3], start=1)
+            ]
+        )
         if picks:
             sym, sc, re = picks[0][0], picks[0][1], picks[0][2]
             conn.execute(
@@ -58,19 +58,67 @@ def save_daily_picks(app, date_str, picks):
                 (sym.upper(), date_str, sc, re or "")
             )
 
+SNAPSHOT_COLUMNS = [
+    "rank", "score", "ml_proba", "news_sentiment",
+    "return_1d", "return_5d", "return_20d", "volatility_10d", "last_close",
+]
+
+def save_score_snapshot(app, date_str, frame):
+    """
+    Replace the full score snapshot for a date in one transaction.
+    frame: DataFrame indexed by symbol with SNAPSHOT_COLUMNS (missing columns / NaN stored as NULL), or an
+    iterable of (symbol, values in SNAPSHOT_COLUMNS order), consumed while the rows are inserted.
+    """
+    if hasattr(frame, "reindex"):
+        import pandas as pd
+        data = frame.reindex(columns=SNAPSHOT_COLUMNS).astype(object)
+        data = data.where(pd.notna(data), None)
+        frame = zip(data.index, data.itertuples(index=False, name=None))
+    rows = (
+        (date_str, sym) + tuple(None if v is None or v != v else getattr(v, "item", lambda: v)() for v in vals)
+        for sym, vals in frame
+    )
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.execute("DELETE FROM score_snapshots WHERE date = ?", (date_str,))
+        conn.executemany(
+            f"""INSERT INTO score_snapshots (date, symbol, {", ".join(SNAPSHOT_COLUMNS)})
+                VALUES ({", ".join("?" * (len(SNAPSHOT_COLUMNS) + 2))})""",
+            rows
+        )
+
+def get_top_scores(app, date_str=None, limit=50, offset=0):
+    """Ranks offset+1..offset+limit of the snapshot for a date (default: latest snapshot)."""
+    with app.app_context():
+        db = get_db()
+        if date_str is None:
+            row = db.execute("SELECT MAX(date) AS date FROM score_snapshots").fetchone()
+            date_str = row["date"]
+        rows = db.execute(
+            """SELECT date, symbol, """ + ", ".join(SNAPSHOT_COLUMNS) + """ FROM score_snapshots
+               WHERE date = ? AND rank > ? ORDER BY rank LIMIT ?""",
+            (date_str, offset, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+def get_symbol_score_history(app, symbol, start=None, end=None, limit=365):
+    """One symbol's snapshot rows (rank, score, features) over time, newest first."""
+    with app.app_context():
+        db = get_db()
+        rows = db.execute(
+            """SELECT date, symbol, """ + ", ".join(SNAPSHOT_COLUMNS) + """ FROM score_snapshots
+               WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date DESC LIMIT ?""",
+            (symbol.upper(), start or "0000-00-00", end or "9999-12-31", limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
 def get_latest_daily_picks(app):
     """Return the 3 picks for the most recent date, or []."""
     with app.app_context():
         db = get_db()
-        date_row = db.execute(
-            "SELECT date FROM daily_picks ORDER BY date DESC LIMIT 1"
-        ).fetchone()
-        if not date_row:
-            return []
         rows = db.execute(
             """SELECT date, rank, symbol, score, reason, price
-               FROM daily_picks WHERE date = ? ORDER BY rank""",
-            (date_row["date"],)
+               FROM daily_picks WHERE date = (SELECT MAX(date) FROM daily_picks) ORDER BY rank"""
         ).fetchall()
         return [dict(r) for r in rows]
 
@@ -92,19 +140,19 @@ def get_daily_picks_history(app, limit=30):
     """List of dates with their 3 picks each. Each item: {date, picks: [{rank, symbol, score, reason}, ...]}."""
     with app.app_context():
         db = get_db()
-        dates = db.execute(
-            "SELECT DISTINCT date FROM daily_picks ORDER BY date DESC LIMIT ?",
+        rows = db.execute(
+            """SELECT date, rank, symbol, score, reason, price FROM daily_picks
+               WHERE date IN (SELECT DISTINCT date FROM daily_picks ORDER BY date DESC LIMIT ?)
+               ORDER BY date DESC, rank""",
             (limit,)
         ).fetchall()
         out = []
-        for d in dates:
-            date_str = d["date"]
-            rows = db.execute(
-                """SELECT rank, symbol, score, reason, price FROM daily_picks
-                   WHERE date = ? ORDER BY rank""",
-                (date_str,)
-            ).fetchall()
-            out.append({"date": date_str, "picks": [dict(r) for r in rows]})
+        for r in rows:
+            if not out or out[-1]["date"] != r["date"]:
+                out.append({"date": r["date"], "picks": []})
+            pick = dict(r)
+            del pick["date"]
+            out[-1]["picks"].append(pick)
         return out
 
 def get_predictions_history(app, limit=30):
@@ -119,11 +167,12 @@ def get_predictions_history(app, limit=30):
         return [dict(r) for r in rows]
 
 def clear_predictions(app):
-    """Remove all daily picks and predictions (keeps accuracy_log)."""
+    """Remove all daily picks, predictions and score snapshots (keeps accuracy_log)."""
     with app.app_context():
         db = get_db()
         db.execute("DELETE FROM daily_picks")
         db.execute("DELETE FROM predictions")
+        db.execute("DELETE FROM score_snapshots")
         db.commit()
 
 def get_predicted_symbol_for_date(app, date_str):
@@ -142,16 +191,119 @@ def get_predicted_symbol_for_date(app, date_str):
         ).fetchone()
         return row["symbol"] if row else None
 
+# Upserts rather than INSERT OR REPLACE, so the accuracy_totals triggers see replaced rows
+ACCURACY_LOG_UPSERT = """
+    INSERT INTO accuracy_log (date, predicted_symbol, predicted_return, actual_return, actual_close, was_correct)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(date) DO UPDATE SET
+        predicted_symbol = excluded.predicted_symbol, predicted_return = excluded.predicted_return,
+        actual_return = excluded.actual_return, actual_close = excluded.actual_close,
+        was_correct = excluded.was_correct"""
+
+PICK_ACCURACY_UPSERT = """
+    INSERT INTO pick_accuracy (date, rank, symbol, pred_close, actual_close, actual_return, was_correct)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(date, rank) DO UPDATE SET
+        symbol = excluded.symbol, pred_close = excluded.pred_close, actual_close = excluded.actual_close,
+        actual_return = excluded.actual_return, was_correct = excluded.was_correct"""
+
+# Pending picks are looked for this far back from the latest reconciled date, so a pick whose outcome
+# could not be fetched (e.g. a failed download) is retried for a while without rereading all history
+PENDING_LOOKBACK_DAYS = 10
+
 def save_accuracy(app, date_str, predicted_symbol, predicted_return, actual_return, actual_close, was_correct):
     from app.database import db_connection
     with db_connection(app) as conn:
         conn.execute(
-            """INSERT OR REPLACE INTO accuracy_log
-               (date, predicted_symbol, predicted_return, actual_return, actual_close, was_correct)
-               VALUES (?, ?, ?, ?, ?, ?)""",
+            ACCURACY_LOG_UPSERT,
             (date_str, predicted_symbol, predicted_return, actual_return, actual_close, 1 if was_correct else 0)
         )
 
+def save_accuracy_rows(app, rows):
+    """
+    Bulk save_accuracy in one transaction.
+    rows = [(date, predicted_symbol, predicted_return, actual_return, actual_close, was_correct), ...].
+    """
+    if not rows:
+        return
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.executemany(
+            ACCURACY_LOG_UPSERT,
+            [r[:5] + (1 if r[5] else 0,) for r in rows]
+        )
+
+def get_pending_accuracy(app):
+    """
+    Picks still waiting for an outcome: [(date, rank, symbol, needs_log), ...]. needs_log is true for
+    rank-1 picks missing from accuracy_log. Legacy predictions rows without daily_picks count as rank 1.
+    Only dates from PENDING_LOOKBACK_DAYS before the latest reconciled date on are considered.
+    """
+    with app.app_context():
+        db = get_db()
+        row = db.execute(
+            "SELECT (SELECT MAX(date) FROM pick_accuracy), (SELECT MAX(date) FROM accuracy_log)"
+        ).fetchone()
+        latest = max((d for d in row if d), default=None)
+        since = (date.fromisoformat(latest[:10]) - timedelta(days=PENDING_LOOKBACK_DAYS)).isoformat() if latest else ""
+        rows = db.execute(
+            """SELECT d.date, d.rank, d.symbol, (d.rank = 1 AND a.date IS NULL) AS needs_log
+               FROM daily_picks d
+               LEFT JOIN pick_accuracy p ON p.date = d.date AND p.rank = d.rank
+               LEFT JOIN accuracy_log a ON a.date = d.date
+               WHERE d.date >= ? AND (p.date IS NULL OR (d.rank = 1 AND a.date IS NULL))
+               UNION ALL
+               SELECT p.date, 1, p.symbol, 1
+               FROM predictions p
+               LEFT JOIN accuracy_log a ON a.date = p.date
+               WHERE p.date >= ? AND a.date IS NULL
+                 AND NOT EXISTS (SELECT 1 FROM daily_picks d WHERE d.date = p.date)
+               ORDER BY 1 DESC, 2""",
+            (since, since)
+        ).fetchall()
+        return [(r[0], r[1], r[2], bool(r[3])) for r in rows]
+
+def save_accuracy_results(app, results):
+    """
+    Write reconciled outcomes in one transaction: every pick to pick_accuracy, rank-1 picks flagged
+    needs_log also to accuracy_log. results = [dict(date, rank, symbol, pred_close, actual_close,
+    actual_return, was_correct, needs_log), ...].
+    """
+    if not results:
+        return
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.executemany(
+            PICK_ACCURACY_UPSERT,
+            [(r["date"], r["rank"], r["symbol"], r["pred_close"], r["actual_close"], r["actual_return"],
+              1 if r["was_correct"] else 0) for r in results]
+        )
+        conn.executemany(
+            ACCURACY_LOG_UPSERT,
+            [(r["date"], r["symbol"], None, r["actual_return"], r["actual_close"], 1 if r["was_correct"] else 0)
+             for r in results if r["needs_log"]]
+        )
+
+def get_accuracy_by_rank(app):
+    """Hit rate per pick rank from pick_accuracy: [{rank, total, correct, accuracy_pct, avg_return}, ...]."""
+    with app.app_context():
+        db = get_db()
+        rows = db.execute(
+            """SELECT rank, total, correct, return_sum, return_count FROM accuracy_totals
+               WHERE source = 'picks' AND total > 0 ORDER BY rank"""
+        ).fetchall()
+        out = []
+        for r in rows:
+            total, correct = r["total"], r["correct"]
+            out.append({
+                "rank": r["rank"],
+                "total": total,
+                "correct": correct,
+                "accuracy_pct": round(100.0 * correct / total, 1) if total else 0,
+                "avg_return": round(r["return_sum"] / r["return_count"], 3) if r["return_count"] else None,
+            })
+        return out
+
 def get_accuracy_history(app, limit=90):
     with app.app_context():
         db = get_db()
@@ -165,13 +317,154 @@ def get_accuracy_history(app, limit=90):
 def get_accuracy_stats(app):
     with app.app_context():
         db = get_db()
+        # Running counts kept by triggers on accuracy_log (see the accuracy_totals migration)
         row = db.execute(
-            """SELECT
-                 COUNT(*) as total,
-                 SUM(was_correct) as correct
-               FROM accuracy_log"""
+            "SELECT total, correct FROM accuracy_totals WHERE source = 'log' AND rank = 1"
         ).fetchone()
-        total = row["total"] or 0
-        correct = row["correct"] or 0
+        total = row["total"] if row else 0
+        correct = row["correct"] if row else 0
         pct = (100.0 * correct / total) if total else 0
         return {"total": total, "correct": correct, "accuracy_pct": round(pct, 1)}
+
+FEATURE_STORE_COLUMNS = ["return_1d", "return_5d", "return_20d", "volatility_10d", "last_close", "forward_return_1d"]
+
+def _feature_frame(rows):
+    import pandas as pd
+    return pd.DataFrame([dict(r) for r in rows], columns=["symbol", "date"] + FEATURE_STORE_COLUMNS)
+
+def get_training_feature_rows(app):
+    """Stored feature rows for every accuracy_log (symbol, date), as a DataFrame with symbol, date and FEATURE_STORE_COLUMNS."""
+    with app.app_context():
+        db = get_db()
+        rows = db.execute(
+            """SELECT f.* FROM features f
+               JOIN accuracy_log a ON a.predicted_symbol = f.symbol AND a.date = f.date"""
+        ).fetchall()
+        return _feature_frame(rows)
+
+def _symbol_slices(symbols, size=400):
+    """None (no filter) or symbol lists small enough for one IN (...) clause each."""
+    if symbols is None:
+        return [None]
+    symbols = list(dict.fromkeys(symbols))
+    return [symbols[i : i + size] for i in range(0, len(symbols), size)]
+
+def get_feature_rows(app, dates, symbols=None):
+    """Stored feature rows for the given dates (optionally only these symbols), as a DataFrame."""
+    dates = list(dict.fromkeys(dates))
+    if not dates:
+        return _feature_frame([])
+    rows = []
+    with app.app_context():
+        db = get_db()
+        marks = ",".join("?" * len(dates))
+        for chunk in _symbol_slices(symbols):
+            where = f"date IN ({marks})"
+            if chunk is not None:
+                where += f" AND symbol IN ({','.join('?' * len(chunk))})"
+            rows.extend(db.execute(
+                f"SELECT * FROM features WHERE {where} ORDER BY date, symbol",
+                dates + (chunk or [])
+            ).fetchall())
+    return _feature_frame(rows)
+
+def get_unlabeled_feature_keys(app, since_date, symbols=None):
+    """(symbol, date) of feature rows on or after since_date that have no forward_return_1d yet (optionally only these symbols)."""
+    out = []
+    with app.app_context():
+        db = get_db()
+        for chunk in _symbol_slices(symbols):
+            where = "forward_return_1d IS NULL AND date >= ?"
+            if chunk is not None:
+                where += f" AND symbol IN ({','.join('?' * len(chunk))})"
+            rows = db.execute(f"SELECT symbol, date FROM features WHERE {where}", [since_date] + (chunk or [])).fetchall()
+            out.extend((r["symbol"], r["date"]) for r in rows)
+    return out
+
+def save_feature_rows(app, frame):
+    """
+    Upsert feature rows from a DataFrame with symbol, date and any of FEATURE_STORE_COLUMNS, in one transaction.
+    NaN / missing columns never overwrite a stored value (so a row rewritten without its label keeps it).
+    """
+    if frame is None or len(frame) == 0:
+        return
+    import pandas as pd
+    cols = [c for c in FEATURE_STORE_COLUMNS if c in frame.columns]
+    data = frame[["symbol", "date"] + cols].astype(object)
+    data = data.where(pd.notna(data), None)
+    updates = ", ".join(f"{c} = COALESCE(excluded.{c}, features.{c})" for c in cols)
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.executemany(
+            f"""INSERT INTO features (symbol, date, {", ".join(cols)})
+                VALUES ({", ".join("?" * (len(cols) + 2))})
+                ON CONFLICT(symbol, date) DO UPDATE SET {updates}""",
+            list(data.itertuples(index=False, name=None))
+        )
+
+def save_feature_labels(app, labels):
+    """Set forward_return_1d for existing rows. labels = [(forward_return_1d, symbol, date), ...]."""
+    if not labels:
+        return
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.executemany(
+            "UPDATE features SET forward_return_1d = ? WHERE symbol = ? AND date = ?",
+            labels
+        )
+
+def save_run_stats(app, kind, started_at, duration, status, error, stages, timings, counters):
+    """Store one pipeline run's stats; stages/timings/counters are dicts saved as JSON."""
+    import json
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.execute(
+            """INSERT INTO run_stats (kind, started_at, duration_seconds, status, error, stages, timings, counters)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (kind, started_at, duration, status, error, json.dumps(stages), json.dumps(timings), json.dumps(counters))
+        )
+
+def get_run_stats(app, kind=None, limit=20):
+    """Most recent run_stats rows (optionally one kind), JSON columns decoded."""
+    import json
+    with app.app_context():
+        db = get_db()
+        where, params = ("WHERE kind = ?", [kind]) if kind else ("", [])
+        rows = db.execute(
+            f"SELECT * FROM run_stats {where} ORDER BY started_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+    out = []
+    for r in rows:
+        row = dict(r)
+        for col in ("stages", "timings", "counters"):
+            row[col] = json.loads(row[col]) if row[col] else {}
+        out.append(row)
+    return out
+
+def next_model_version(app):
+    """Version number for the next saved model (1 for the first)."""
+    with app.app_context():
+        row = get_db().execute("SELECT MAX(version) AS v FROM model_versions").fetchone()
+    return (row["v"] or 0) + 1
+
+def save_model_version(app, version, kind, n_trees, n_rows, rows_added, trained_through, val_accuracy, val_samples,
+                       cv_score=None, labels="picks"):
+    """Record one saved model (kind "full" or "incremental", labels "picks" or "universe") and its rolling validation accuracy."""
+    import time
+    from app.database import db_connection
+    with db_connection(app) as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO model_versions
+               (version, created_at, kind, n_trees, n_rows, rows_added, trained_through, val_accuracy, val_samples, cv_score,
+                labels)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (version, time.time(), kind, n_trees, n_rows, rows_added, trained_through, val_accuracy, val_samples,
+             cv_score, labels)
+        )
+
+def get_model_versions(app, limit=20):
+    """Most recent model versions first."""
+    with app.app_context():
+        rows = get_db().execute("SELECT * FROM model_versions ORDER BY version DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in rows]
@@ -1,28 +1,129 @@
 """Fetch market/company news (optional, requires Finnhub API key)."""
-import os
+import logging
+import threading
+import time
 from datetime import datetime, timedelta
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from app import fetcher, metrics
+from config import FINNHUB_CALLS_PER_MINUTE, NEWS_CACHE_SECONDS, NEWS_CONCURRENCY, NEWS_UI_DEADLINE_SECONDS
+
+log = logging.getLogger(__name__)
 
 FINNHUB_BASE = "https://finnhub.io/api/v1"
+FINNHUB_HOST = "finnhub.io"
+# One fetch per symbol covers this many days; shorter windows (sentiment, UI panel) are filtered from it
+NEWS_WINDOW_DAYS = 5
 
-def get_company_news(api_key, symbol, days=3):
-    """Fetch recent company news with headline, url, summary. Returns list of dicts or []."""
-    if not api_key:
-        return []
-    to_date = datetime.now()
-    from_date = to_date - timedelta(days=days)
-    url = f"{FINNHUB_BASE}/company-news"
+_session = None
+_session_lock = threading.Lock()
+_cache = {}  # symbol -> (fetched_at, to_date_str, items)
+_cache_lock = threading.Lock()
+
+
+def _get_session():
+    """Shared keep-alive session sized for NEWS_CONCURRENCY parallel requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(NEWS_CONCURRENCY, 1))
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _limiter():
+    # Half the budget as burst, half refilled over the minute: never more than the budget in any 60s window
+    half = FINNHUB_CALLS_PER_MINUTE / 2.0
+    return fetcher.get_limiter(FINNHUB_HOST, rate=half / 60.0, burst=half)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _request_news(api_key, symbol, from_date, to_date, deadline=None):
+    """Raw Finnhub company-news items for a date range, or None on error or when deadline passes first."""
     params = {
         "symbol": symbol,
         "from": from_date.strftime("%Y-%m-%d"),
         "to": to_date.strftime("%Y-%m-%d"),
         "token": api_key,
     }
-    try:
-        r = requests.get(url, params=params, timeout=10)
+    _limiter()  # registers the Finnhub budget before call_with_retry looks the limiter up
+
+    def _get():
+        r = _get_session().get(f"{FINNHUB_BASE}/company-news", params=params, timeout=10)
         r.raise_for_status()
-        items = r.json()
+        return r.json()
+
+    try:
+        return fetcher.call_with_retry(_get, host=FINNHUB_HOST, retries=1, deadline=deadline) or []
+    except TimeoutError:
+        metrics.inc("news_deadline_total")
+        return None
     except Exception:
+        metrics.inc("errors_total", where="finnhub")
+        return None
+
+
+def _is_cached(symbol):
+    """True if _recent_news would answer symbol from the cache."""
+    with _cache_lock:
+        hit = _cache.get(symbol.upper())
+    return (hit is not None and time.time() - hit[0] < NEWS_CACHE_SECONDS
+            and hit[1] == datetime.now().strftime("%Y-%m-%d"))
+
+
+def _recent_news(api_key, symbol, days, deadline=None):
+    """
+    News items from the last `days` days (days <= NEWS_WINDOW_DAYS). Served from a shared TTL cache,
+    so the sentiment pass and the UI news panel make one request per symbol per NEWS_CACHE_SECONDS.
+    When the request fails (or deadline passes first), stale cached items are served if there are any.
+    """
+    sym = symbol.upper()
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    with _cache_lock:
+        hit = _cache.get(sym)
+    fresh = hit is not None and time.time() - hit[0] < NEWS_CACHE_SECONDS and hit[1] == today
+    metrics.cache_result("news", fresh)
+    if fresh:
+        items = hit[2]
+    else:
+        items = _request_news(api_key, sym, now - timedelta(days=NEWS_WINDOW_DAYS), now, deadline=deadline)
+        if items is None:
+            if hit is None:
+                return None
+            items = hit[2]
+        else:
+            with _cache_lock:
+                _cache[sym] = (time.time(), today, items)
+    cutoff = (now - timedelta(days=days)).strftime("%Y-%m-%d")
+    return [
+        item for item in items
+        if not item.get("datetime") or datetime.fromtimestamp(item["datetime"]).strftime("%Y-%m-%d") >= cutoff
+    ]
+
+
+def get_company_news(api_key, symbol, days=3):
+    """
+    Fetch recent company news with headline, url, summary. Returns list of dicts or []. Waits at most
+    NEWS_UI_DEADLINE_SECONDS for the Finnhub budget (a prediction run may have drained it), then serves
+    cached news or [].
+    """
+    if not api_key:
+        return []
+    deadline = fetcher.deadline_in(NEWS_UI_DEADLINE_SECONDS)
+    if days <= NEWS_WINDOW_DAYS:
+        items = _recent_news(api_key, symbol, days, deadline=deadline)
+    else:
+        to_date = datetime.now()
+        items = _request_news(api_key, symbol, to_date - timedelta(days=days), to_date, deadline=deadline)
+    if items is None:
         return []
     out = []
     for item in (items or [])[:15]:
@@ -35,28 +136,10 @@ def get_company_news(api_key, symbol, days=3):
     return out
 
 
-def get_news_sentiment(api_key, symbol, from_date=None, to_date=None):
-    """Fetch company news and derive a simple sentiment score (-1 to 1)."""
-    if not api_key:
-        return None
-    to_date = to_date or datetime.now()
-    from_date = from_date or (to_date - timedelta(days=2))
-    url = f"{FINNHUB_BASE}/company-news"
-    params = {
-        "symbol": symbol,
-        "from": from_date.strftime("%Y-%m-%d"),
-        "to": to_date.strftime("%Y-%m-%d"),
-        "token": api_key,
-    }
-    try:
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        items = r.json()
-    except Exception:
-        return None
+def _sentiment(items):
+    """Simple heuristic sentiment (-1 to 1) from headline + summary keywords (no NLP; could add later)."""
     if not items:
         return 0.0
-    # Simple heuristic: use headline + summary for sentiment (no NLP; could add later)
     total = 0.0
     count = 0
     for item in items[:15]:
@@ -71,3 +154,44 @@ def get_news_sentiment(api_key, symbol, from_date=None, to_date=None):
         return 0.0
     score = total / count
     return max(-1.0, min(1.0, score))
+
+
+def get_news_sentiment(api_key, symbol, from_date=None, to_date=None):
+    """Fetch company news and derive a simple sentiment score (-1 to 1)."""
+    if not api_key:
+        return None
+    if from_date is None and to_date is None:
+        items = _recent_news(api_key, symbol, days=2)
+    else:
+        to_date = to_date or datetime.now()
+        from_date = from_date or (to_date - timedelta(days=2))
+        items = _request_news(api_key, symbol, from_date, to_date)
+    if items is None:
+        return None
+    return _sentiment(items)
+
+
+def get_news_sentiment_batch(api_key, symbols, max_workers=None, wait=False):
+    """
+    Sentiment for many symbols on up to max_workers threads (default NEWS_CONCURRENCY). Returns {symbol: score};
+    failures are omitted. Unless wait is True, symbols without cached news are skipped (and omitted) once the
+    Finnhub budget has no requests left, instead of blocking until the bucket refills.
+    """
+    symbols = list(symbols)
+    if not api_key or not symbols:
+        return {}
+    if not wait:
+        budget = _limiter().available()
+        uncached = [sym for sym in symbols if not _is_cached(sym)]
+        skipped = set(uncached[int(min(budget, len(uncached))):])
+        if skipped:
+            metrics.inc("news_skipped_total", len(skipped))
+            log.warning("Finnhub budget used up: %d of %d symbols scored without news (%s)",
+                        len(skipped), len(symbols), ", ".join(sorted(skipped)))
+            symbols = [sym for sym in symbols if sym not in skipped]
+    results = fetcher.run_bounded(
+        lambda sym: get_news_sentiment(api_key, sym),
+        symbols,
+        max_workers=NEWS_CONCURRENCY if max_workers is None else max_workers,
+    )
+    return {sym: sent for sym, sent in zip(symbols, results) if sent is not None}
@@ -0,0 +1,82 @@
+"""CPU parallelism: worker counts, and column-sharded maps over a shared-memory price array on worker processes."""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import CPU_WORKERS
+
+# Below this many columns one in-process call is faster than handing shards to workers. Kept under
+# training_set.CHUNK_SYMBOLS and the S&P 500, so real panels do get sharded.
+MIN_SHARD_COLUMNS = 200
+
+# Worker pools by size, started once and reused: spawned workers pay the interpreter and import cost only once
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def cpu_workers(n=None):
+    """Worker count to use: n, else CPU_WORKERS; 0 or less means every core."""
+    n = CPU_WORKERS if n is None else n
+    return n if n > 0 else (os.cpu_count() or 1)
+
+
+def _pool(workers):
+    """
+    Shared process pool with `workers` processes. Workers are spawned, not forked: map_columns runs on
+    job-runner threads, and forking a multi-threaded process can copy a held lock into the child.
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_shard(fn, name, shape, dtype, lo, hi):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return fn(arr[:, lo:hi])
+    finally:
+        shm.close()
+
+
+def map_columns(fn, arr, workers=None, min_columns=MIN_SHARD_COLUMNS):
+    """
+    fn(arr[:, lo:hi]) for contiguous column shards of a 2-D array, one shard per worker process; returns
+    the results in shard order. arr is copied once into shared memory, so workers attach to it instead
+    of receiving a pickled copy. fn must be a module-level function. With one worker, or fewer than
+    min_columns columns, fn(arr) runs in this process and the list has one result.
+    """
+    workers = min(cpu_workers(workers), arr.shape[1])
+    if workers <= 1 or arr.shape[1] < min_columns:
+        return [fn(arr)]
+    arr = np.ascontiguousarray(arr)
+    bounds = np.linspace(0, arr.shape[1], workers + 1).astype(int)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    try:
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        pool = _pool(workers)
+        futures = [
+            pool.submit(_run_shard, fn, shm.name, arr.shape, arr.dtype.str, lo, hi)
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        return [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
@@ -1,13 +1,26 @@
-"""Score S&P 500 symbols and pick top 3 for the day. Uses ML when trained, else momentum + news."""
+"""Score the universe (S&P 500 by default) and pick top 3 for the day. Uses ML when trained, else momentum + news."""
+import heapq
 from datetime import datetime
 
-from app.stock_data import fetch_prices_batched, get_momentum_metrics, get_ml_features
-from app.news_data import get_news_sentiment
-from app.sp500 import get_sp500_tickers
-from app.ml_model import load_model, score_with_ml, train_model, FEATURE_NAMES
+import numpy as np
+
+from app.stock_data import iter_prices_batched
+from app.features import ml_feature_frame, metrics_from_row
+from app.feature_store import features_for_prices
+from app.news_data import get_news_sentiment_batch
+from app.universe import get_universe, universe_label
+from app.ml_model import model_available, score_with_ml, train_model, FEATURE_NAMES
+from app.jobs import KIND_TRAIN, work_lock
+from app.metrics import stage
 from config import FINNHUB_API_KEY
 
-TOP_N_FOR_NEWS = 10
+# The Finnhub burst at the free-tier budget (half of 60 calls/minute), so a cold pass never waits for refills
+TOP_N_FOR_NEWS = 30
+# Leaders kept while streaming: the news candidates plus the next 3, so the top 3 stays exact after news re-ranking
+STREAM_TOP_K = TOP_N_FOR_NEWS + 3
+MOMENTUM_WEIGHTS = {"return_1d": 2.0, "return_5d": 1.5, "return_20d": 0.5}
+# Per-symbol values kept from each scored chunk: what the daily snapshot and the pick explanations need
+KEPT_COLUMNS = ["return_1d", "return_5d", "return_20d", "volatility_10d", "last_close", "momentum", "ml"]
 
 
 def _momentum_score(metrics, use_news=False, news_sentiment=None):
@@ -15,17 +28,22 @@ def _momentum_score(metrics, use_news=False, news_sentiment=None):
     if not metrics:
         return None
     score = 0.0
-    if metrics.get("return_1d") is not None:
-        score += 2.0 * metrics["return_1d"]
-    if metrics.get("return_5d") is not None:
-        score += 1.5 * metrics["return_5d"]
-    if metrics.get("return_20d") is not None:
-        score += 0.5 * metrics["return_20d"]
+    for key, weight in MOMENTUM_WEIGHTS.items():
+        if metrics.get(key) is not None:
+            score += weight * metrics[key]
     if use_news and news_sentiment is not None:
         score += 10.0 * news_sentiment
     return score
 
 
+def _momentum_scores(features):
+    """Vectorized _momentum_score over a feature frame; missing returns contribute 0 like None does."""
+    score = np.zeros(len(features))
+    for key, weight in MOMENTUM_WEIGHTS.items():
+        score += weight * np.nan_to_num(features[key].to_numpy(dtype=np.float64), nan=0.0)
+    return score
+
+
 def _format_explanation(metrics, news_sentiment=None, use_ml=False, ml_proba=None):
     """Build a clear, human-readable explanation of why this stock was ranked."""
     parts = []
@@ -64,83 +82,132 @@ def _format_explanation(metrics, news_sentiment=None, use_ml=False, ml_proba=Non
     return " ".join(parts)
 
 
-def run_prediction(app):
-    """Run daily prediction: score S&P 500, save top 3 picks for today. Uses ML if trained."""
-    from app.models import save_daily_picks
-
-    tickers = get_sp500_tickers()
+def _push_top(heap, scores, order, k=STREAM_TOP_K):
+    """Keep the k best (score, earlier ticker first on ties) entries of scores in a bounded min-heap."""
+    for sym, score in scores.items():
+        entry = (score, -order[sym], sym)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+
+def _score_chunk(app, prices, use_ml):
+    """
+    Features and scores for one chunk of {symbol: close Series}: a compact frame with the feature
+    columns plus "momentum" and "ml" (NaN where the ML model can't score). The series are not kept.
+    """
+    with stage("features"):
+        features = features_for_prices(app, prices)
+    with stage("scoring"):
+        features = features[features["n_obs"] >= 2]
+        features = features.assign(momentum=_momentum_scores(features), ml=np.nan)
+        if use_ml and len(features):
+            ml_rows = ml_feature_frame(features, FEATURE_NAMES)
+            probas = score_with_ml(ml_rows) if len(ml_rows) else None
+            if probas is not None:
+                features.loc[ml_rows.index, "ml"] = probas
+    return features
+
+
+def run_prediction(app, progress=None):
+    """
+    Run daily prediction: score the configured universe (S&P 500 by default), save top 3 picks for today.
+    Uses ML if trained. progress(fraction, message), if given, is called as chunks are scored.
+    Price chunks are scored as they arrive (features extracted, raw series dropped) and only the
+    leaders are kept in a bounded heap. Each symbol keeps just KEPT_COLUMNS, in preallocated arrays
+    that feed the daily snapshot.
+    """
+    from app.models import save_daily_picks, save_score_snapshot
+
+    with stage("universe"):
+        tickers = get_universe(app=app)
     if not tickers:
         return None
     today = datetime.now().strftime("%Y-%m-%d")
-    prices = fetch_prices_batched(tickers, days=90, chunk_size=80)
-
-    # Build features for each symbol; compute ML score or momentum score
-    model, _ = load_model()
-    use_ml = model is not None
-    scores = []
-    features_list = []
-
-    for sym in tickers:
-        series = prices.get(sym)
-        if series is None or len(series) < 2:
-            continue
-        metrics = get_momentum_metrics(series)
-        feats = get_ml_features(series) if len(series) >= 21 else None
-        features_list.append((sym, feats, metrics))
-
-    if use_ml and features_list:
-        valid = [(s, f, m) for s, f, m in features_list if f is not None]
-        if valid:
-            probas = score_with_ml([x[1] for x in valid])
-            if probas is not None:
-                for (sym, feats, metrics), proba in zip(valid, probas):
-                    explanation = _format_explanation(metrics, use_ml=True, ml_proba=proba)
-                    scores.append((sym, float(proba), explanation))
-                use_ml = True
-    if not scores:
-        use_ml = False
-        for sym, feats, metrics in features_list:
-            sc = _momentum_score(metrics, use_news=False)
-            if sc is not None:
-                explanation = _format_explanation(metrics)
-                scores.append((sym, sc, explanation))
-
-    if not scores:
+    order = {t: i for i, t in enumerate(dict.fromkeys(tickers))}
+
+    use_ml = model_available()
+    symbols = list(order)
+    kept = {name: np.full(len(symbols), np.nan) for name in KEPT_COLUMNS}
+    ml_top, momentum_top = [], []
+    done = 0
+    chunks = iter_prices_batched(tickers, days=90, chunk_size=80)
+    while True:
+        # Time spent waiting on downloads (chunk scoring overlaps with the fetches still in flight)
+        with stage("fetch"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        done += len(chunk)
+        scored = _score_chunk(app, chunk, use_ml)
+        del chunk
+        _push_top(momentum_top, scored["momentum"], order)
+        _push_top(ml_top, scored["ml"].dropna(), order)
+        pos = np.fromiter((order[sym] for sym in scored.index), dtype=np.int64, count=len(scored))
+        for name in KEPT_COLUMNS:
+            kept[name][pos] = scored[name].to_numpy(dtype=np.float64)
+        del scored
+        if progress:
+            progress(0.85 * done / len(order), f"Scored {done} of {len(order)} symbols")
+
+    # Same fallback as scoring the whole universe at once: momentum unless the model scored something
+    use_ml = bool(ml_top)
+    scores = kept["ml" if use_ml else "momentum"].copy()
+    if np.isnan(scores).all():
         return None
+    leaders = [sym for _, _, sym in sorted(ml_top if use_ml else momentum_top, reverse=True)]
 
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top_symbols = [s[0] for s in scores[:TOP_N_FOR_NEWS]]
-
+    # Only the leaders need news and explanations; the rest stay as plain scores
+    sentiments = {}
     if FINNHUB_API_KEY:
-        for i, (sym, sc, explanation) in enumerate(scores):
-            if sym not in top_symbols:
-                continue
-            sent = get_news_sentiment(FINNHUB_API_KEY, sym)
-            if sent is not None:
-                new_explanation = _format_explanation(
-                    get_momentum_metrics(prices.get(sym)) if prices.get(sym) is not None else None,
-                    news_sentiment=sent,
-                    use_ml=use_ml,
-                    ml_proba=sc if use_ml else None,
-                )
-                scores[i] = (sym, sc + (0.1 * sent if use_ml else 10.0 * sent), new_explanation)
+        if progress:
+            progress(0.9, "Fetching news for the leaders")
+        with stage("news"):
+            sentiments = get_news_sentiment_batch(FINNHUB_API_KEY, leaders[:TOP_N_FOR_NEWS])
+        for sym, sent in sentiments.items():
+            scores[order[sym]] += 0.1 * sent if use_ml else 10.0 * sent
+    leaders = sorted(leaders, key=lambda sym: (-scores[order[sym]], order[sym]))
+
+    # Snapshot ranks: argsort of the score array alone (ticker order on ties), rows built as they are saved
+    scored_pos = np.flatnonzero(~np.isnan(scores))
+    ranked = scored_pos[np.lexsort((scored_pos, -scores[scored_pos]))]
+    snapshot = (
+        (symbols[i], (rank, scores[i], kept["ml"][i] if use_ml else None, sentiments.get(symbols[i]),
+                      kept["return_1d"][i], kept["return_5d"][i], kept["return_20d"][i],
+                      kept["volatility_10d"][i], kept["last_close"][i]))
+        for rank, i in enumerate(ranked.tolist(), 1)
+    )
 
-    scores.sort(key=lambda x: x[1], reverse=True)
     top3 = []
-    for s, sc, re in scores[:3]:
-        series = prices.get(s)
-        price = float(series.iloc[-1]) if series is not None and len(series) else None
-        top3.append((s, sc, re, price))
-
-    save_daily_picks(app, today, top3)
-
-    # Optionally train ML model if we have enough accuracy history and no model yet
-    if model is None:
-        train_model(app)
+    for s in leaders[:3]:
+        i = order[s]
+        metrics = metrics_from_row({name: kept[name][i] for name in KEPT_COLUMNS})
+        re = _format_explanation(
+            metrics,
+            news_sentiment=sentiments.get(s),
+            use_ml=use_ml,
+            ml_proba=float(kept["ml"][i]) if use_ml else None,
+        )
+        top3.append((s, float(scores[i]), re, metrics["last_close"]))
+
+    with stage("db_write"):
+        save_daily_picks(app, today, top3)
+        save_score_snapshot(app, today, snapshot)
+
+    # Optionally train ML model if we have enough accuracy history and no model yet (skipped while a training job runs)
+    if not model_available():
+        lock = work_lock(KIND_TRAIN)
+        if lock.acquire(blocking=False):
+            try:
+                with stage("train"):
+                    train_model(app)
+            finally:
+                lock.release()
 
     return {
         "date": today,
         "picks": [{"symbol": s, "score": sc, "reason": re, "price": pr} for s, sc, re, pr in top3],
-        "universe": "S&P 500",
+        "universe": universe_label(),
         "used_ml": use_ml,
-    }
\ No newline at end of file
+    }
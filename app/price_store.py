@@ -0,0 +1,172 @@
+"""Local SQLite store of daily OHLCV bars, keyed by (symbol, date), so price fetches only download what is missing."""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from app.database import connection
+from config import DATA_DIR
+
+STORE_FILE = DATA_DIR / "prices.db"
+# Bars fetched for "today" are re-fetched after this many seconds (the last bar may be intraday)
+FRESH_SECONDS = 15 * 60
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+# A symbol stored as its own name (the lookup found none or failed) is looked up again after this many seconds
+NAME_RETRY_SECONDS = 24 * 3600
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS bars (
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (symbol, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS names (
+        symbol TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS coverage (
+        symbol TEXT PRIMARY KEY,
+        first_date TEXT NOT NULL,
+        last_date TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+"""
+_schema_ready = False
+
+
+@contextmanager
+def _connect():
+    """Pooled connection to the store (WAL, shared pragmas); creates the schema on first use."""
+    global _schema_ready
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with connection(STORE_FILE) as conn:
+        if not _schema_ready:
+            conn.executescript(_SCHEMA)
+            _schema_ready = True
+        yield conn
+
+
+def _chunks(items, size=500):
+    """SQLite caps bound parameters per statement; split IN (...) lists."""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def get_coverage(symbols):
+    """Return {symbol: (first_date, last_date, updated_at)} for symbols already in the store."""
+    symbols = list(symbols)
+    out = {}
+    if not symbols:
+        return out
+    with _connect() as conn:
+        for chunk in _chunks(symbols):
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT symbol, first_date, last_date, updated_at FROM coverage WHERE symbol IN ({marks})",
+                chunk,
+            ).fetchall()
+            for sym, first, last, updated in rows:
+                out[sym] = (first, last, updated)
+    return out
+
+
+def missing_from(coverage, start_str, end_str, now=None):
+    """
+    Date (YYYY-MM-DD) to fetch from so the store covers start_str..end_str, or None if nothing is missing.
+    coverage is one value from get_coverage (or None). The last stored day is re-fetched so a partial bar gets replaced.
+    """
+    if coverage is None:
+        return start_str
+    first, last, updated = coverage
+    if start_str < first:
+        return start_str
+    today = datetime.now().strftime("%Y-%m-%d")
+    if end_str > last:
+        return last
+    if end_str >= today and (now or time.time()) - updated > FRESH_SECONDS:
+        return last
+    return None
+
+
+def save_bars(frames, start_str, end_str):
+    """
+    Upsert OHLCV rows and extend coverage to start_str..end_str, in one transaction.
+    frames: {symbol: DataFrame with Open/High/Low/Close/Volume columns, or None when no new bars came back}.
+    """
+    if not frames:
+        return
+    rows = []
+    for symbol, frame in frames.items():
+        if frame is None or frame.empty or "Close" not in frame.columns:
+            continue
+        bars = frame.reindex(columns=BAR_COLUMNS).astype("float64").dropna(subset=["Close"])
+        dates = pd.DatetimeIndex(bars.index).strftime("%Y-%m-%d")
+        bars = bars.astype(object).where(bars.notna(), None)
+        rows.extend((symbol, d) + tuple(vals) for d, vals in zip(dates, bars.itertuples(index=False, name=None)))
+    now = time.time()
+    with _connect() as conn:
+        conn.executemany(
+            """INSERT OR REPLACE INTO bars (symbol, date, open, high, low, close, volume)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        conn.executemany(
+            """INSERT INTO coverage (symbol, first_date, last_date, updated_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(symbol) DO UPDATE SET
+                 first_date = MIN(first_date, excluded.first_date),
+                 last_date = MAX(last_date, excluded.last_date),
+                 updated_at = excluded.updated_at""",
+            [(symbol, start_str, end_str, now) for symbol in frames],
+        )
+
+
+def load_closes(symbols, start_str, end_str=None):
+    """Return {symbol: close Series indexed by date} for stored bars in start_str..end_str (inclusive)."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    end_str = end_str or "9999-12-31"
+    with _connect() as conn:
+        frames = []
+        for chunk in _chunks(symbols):
+            marks = ",".join("?" * len(chunk))
+            frames.append(pd.read_sql_query(
+                f"""SELECT symbol, date, close FROM bars
+                    WHERE symbol IN ({marks}) AND date >= ? AND date <= ? AND close IS NOT NULL
+                    ORDER BY symbol, date""",
+                conn,
+                params=list(chunk) + [start_str, end_str],
+            ))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if df.empty:
+        return {}
+    df["date"] = pd.to_datetime(df["date"])
+    out = {}
+    for sym, group in df.groupby("symbol", sort=False):
+        out[sym] = pd.Series(group["close"].to_numpy(), index=pd.DatetimeIndex(group["date"]), name="Close")
+    return out
+
+
+def get_name(symbol):
+    """Stored company name for symbol, or None (also for a negative entry older than NAME_RETRY_SECONDS)."""
+    with _connect() as conn:
+        row = conn.execute("SELECT name, updated_at FROM names WHERE symbol = ?", (symbol,)).fetchone()
+    if row is None or (row[0] == symbol and time.time() - row[1] > NAME_RETRY_SECONDS):
+        return None
+    return row[0]
+
+
+def save_names(names):
+    """Upsert {symbol: company name}."""
+    rows = [(sym, name, time.time()) for sym, name in names.items() if sym and name]
+    if not rows:
+        return
+    with _connect() as conn:
+        conn.executemany("INSERT OR REPLACE INTO names (symbol, name, updated_at) VALUES (?, ?, ?)", rows)
@@ -1,26 +1,56 @@
 """Flask routes for the stock predictor UI."""
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app
+import hashlib
+import json
+
+from flask import Blueprint, Response, render_template, request, redirect, url_for, jsonify, current_app
 from app.models import (
     get_latest_daily_picks,
     get_predictions_history,
     get_accuracy_history,
     get_accuracy_stats,
     clear_predictions,
+    get_top_scores,
+    get_symbol_score_history,
+    get_accuracy_by_rank,
+    get_run_stats,
+    get_model_versions,
 )
-from app.predictor import run_prediction
+from app import metrics
+from app.jobs import get_job, list_jobs, submit_prediction, submit_training
 from app.scheduler import get_scheduler_status, set_scheduler_enabled
-from app.ml_model import train_model, load_model
-from app.stock_data import get_chart_data, get_stock_name
-from app.news_data import get_company_news
+from app.universe import universe_label
 from config import FINNHUB_API_KEY
 
+# Price, news and model modules (yfinance, pandas, sklearn) are imported inside the routes that use them,
+# so the dashboard can answer before any of them is loaded.
+
 bp = Blueprint("main", __name__)
 
+CHART_MAX_AGE = 300  # seconds the browser may reuse a chart response before revalidating
+
+
+def _cache_headers(resp, etag, max_age):
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = max_age
+    return resp
+
+
+def _cacheable_json(payload, max_age, etag=None):
+    """
+    JSON response with an ETag (default: hash of the body) and Cache-Control; answers 304 when the
+    client's copy is current.
+    """
+    resp = jsonify(payload)
+    _cache_headers(resp, etag or hashlib.sha1(resp.get_data()).hexdigest(), max_age)
+    return resp.make_conditional(request)
+
 @bp.route("/")
 def index():
     stats = get_accuracy_stats(current_app)
     latest_picks = get_latest_daily_picks(current_app)
-    ml_available = load_model()[0] is not None
+    from app.ml_model import model_available
+    ml_available = model_available()
     return render_template(
         "index.html",
         latest_picks=latest_picks,
@@ -29,22 +59,45 @@ def index():
         predictions_history=get_predictions_history(current_app, limit=14),
         scheduler_status=get_scheduler_status(current_app),
         ml_available=ml_available,
+        universe=universe_label(),
     )
 
+def _job_accepted(job, created):
+    """202 with the job record; Location points at its status endpoint. created is False for a duplicate submit."""
+    resp = jsonify({"ok": True, "job": job, "created": created})
+    resp.status_code = 202
+    resp.headers["Location"] = url_for("main.api_job", job_id=job["id"])
+    return resp
+
 @bp.route("/api/run-prediction", methods=["POST"])
 def api_run_prediction():
-    result = run_prediction(current_app)
-    if result:
-        return jsonify({"ok": True, "result": result})
-    return jsonify({
-        "ok": False,
-        "error": "Could not load S&P 500 data or fetch prices. Try again in a moment.",
-    }), 400
+    return _job_accepted(*submit_prediction(current_app._get_current_object()))
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/api/runs")
+def api_runs():
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    return jsonify({"runs": get_run_stats(current_app, kind=request.args.get("kind"), limit=limit)})
+
+@bp.route("/api/jobs")
+def api_jobs():
+    return jsonify({"jobs": list_jobs()})
+
+@bp.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job"}), 404
+    return jsonify({"ok": True, "job": job})
 
 @bp.route("/api/accuracy")
 def api_accuracy():
     return jsonify({
         "stats": get_accuracy_stats(current_app),
+        "by_rank": get_accuracy_by_rank(current_app),
         "history": get_accuracy_history(current_app, limit=90),
     })
 
@@ -71,25 +124,65 @@ def api_clear_predictions():
 
 @bp.route("/api/ml/train", methods=["POST"])
 def api_ml_train():
-    if train_model(current_app):
-        return jsonify({"ok": True, "message": "Model trained."})
-    return jsonify({"ok": False, "error": "Not enough accuracy data (need 8+ days)."}), 400
+    # ?sweep=1 grid-searches hyperparameters for this run (default ML_SWEEP); ?labels=picks|universe (default ML_LABELS)
+    sweep = request.args.get("sweep", type=int)
+    labels = request.args.get("labels")
+    if labels not in (None, "picks", "universe"):
+        return jsonify({"ok": False, "error": "labels must be picks or universe"}), 400
+    return _job_accepted(*submit_training(current_app._get_current_object(),
+                                          sweep=None if sweep is None else bool(sweep), labels=labels))
+
+
+@bp.route("/api/ml/versions")
+def api_ml_versions():
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    return jsonify({"versions": get_model_versions(current_app, limit=limit)})
 
 
 @bp.route("/api/stock/<symbol>/chart")
 def api_stock_chart(symbol):
     days = request.args.get("days", 90, type=int)
     days = min(max(days, 5), 365)
+    from datetime import datetime, timedelta
+    from app import trading_calendar
+    from app.stock_data import get_chart_data, get_stock_name
     sym = symbol.upper()
-    data = get_chart_data(sym, days=days)
+    # `days` is calendar days (the period selector's "1 year" is 365); the chart is built from trading sessions
+    today = datetime.now()
+    sessions = trading_calendar.count_sessions(today - timedelta(days=days), today)
+    data = get_chart_data(sym, sessions=sessions)
     if not data:
         return jsonify({"ok": False, "error": "No data for symbol"}), 404
+    # The ETag covers the bars only, so revalidating a current copy never waits on the name lookup
+    etag = hashlib.sha1(json.dumps([sym, sessions, data]).encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        return _cache_headers(Response(status=304), etag, CHART_MAX_AGE)
     name = get_stock_name(sym)
-    return jsonify({"ok": True, "symbol": sym, "name": name, "data": data})
+    return _cacheable_json({"ok": True, "symbol": sym, "name": name, "data": data}, CHART_MAX_AGE, etag=etag)
+
+
+@bp.route("/api/scores")
+def api_scores():
+    """Stored ranking for a date (default latest): ?date=YYYY-MM-DD&limit=50&offset=0."""
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 1000)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    rows = get_top_scores(current_app, request.args.get("date"), limit=limit, offset=offset)
+    return jsonify({"ok": True, "date": rows[0]["date"] if rows else request.args.get("date"), "scores": rows})
+
+
+@bp.route("/api/stock/<symbol>/ranks")
+def api_stock_ranks(symbol):
+    """Symbol's stored rank and score over time: ?start=&end=&limit=365."""
+    limit = min(max(request.args.get("limit", 365, type=int), 1), 5000)
+    rows = get_symbol_score_history(
+        current_app, symbol, request.args.get("start"), request.args.get("end"), limit=limit
+    )
+    return jsonify({"ok": True, "symbol": symbol.upper(), "history": rows})
 
 
 @bp.route("/api/stock/<symbol>/news")
 def api_stock_news(symbol):
+    from app.news_data import get_company_news
     sym = symbol.upper()
     news = get_company_news(FINNHUB_API_KEY, sym, days=5)
     return jsonify({"ok": True, "symbol": sym, "news": news})
\ No newline at end of file
@@ -1,7 +1,4 @@
 """Run prediction every day at 9 AM EST. Can be paused/resumed via UI."""
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-import pytz
 from config import SCHEDULE_HOUR, SCHEDULE_MINUTE, SCHEDULE_TIMEZONE
 
 JOB_PREDICTION = "daily_prediction"
@@ -9,17 +6,20 @@ JOB_ACCURACY = "daily_accuracy"
 
 def start_scheduler(app, start_paused=False):
     """Schedule daily prediction at 9 AM EST and accuracy update at 5 PM. Returns scheduler."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    import pytz
+
     tz = pytz.timezone(SCHEDULE_TIMEZONE)
 
+    # Both go through the job queue, so a manual run already in progress is not started a second time
     def job_prediction():
-        with app.app_context():
-            from app.predictor import run_prediction
-            run_prediction(app)
+        from app.jobs import submit_prediction
+        submit_prediction(app)
 
     def job_accuracy():
-        with app.app_context():
-            from app.accuracy import update_latest_accuracy
-            update_latest_accuracy(app)
+        from app.jobs import submit_accuracy
+        submit_accuracy(app)
 
     scheduler = BackgroundScheduler(timezone=tz)
     scheduler.add_job(
@@ -1,15 +1,10 @@
-"""S&P 500 ticker list from Wikipedia, cached locally."""
-import json
-import time
+"""S&P 500 constituents from Wikipedia, with membership history rebuilt from its list of changes."""
+from datetime import datetime, timedelta
 from io import StringIO
 
 import pandas as pd
 import requests
 
-from config import DATA_DIR
-
-CACHE_FILE = DATA_DIR / "sp500_tickers.json"
-CACHE_DAYS = 7
 WIKI_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
 
 
@@ -23,44 +18,79 @@ def _yahoo_ticker(sym):
 def get_sp500_tickers(force_refresh=False):
     """
     Return list of S&P 500 ticker symbols (Yahoo-style, e.g. BRK-B).
-    Uses cached list if fresh; otherwise fetches from Wikipedia.
+    Uses the cached constituent snapshot if fresh; otherwise fetches from Wikipedia.
+    """
+    from app.universe import get_universe
+    return get_universe("sp500", force_refresh=force_refresh)
+
+
+def _change_rows(changes):
+    """(date, added, removed) per row of Wikipedia's "Selected changes" table (two-level header)."""
+    cols = [" ".join(str(c) for c in col) if isinstance(col, tuple) else str(col) for col in changes.columns]
+    changes = changes.set_axis(cols, axis=1)
+    date_col = cols[0]
+    added = next(c for c in cols if c.startswith("Added") and "Ticker" in c)
+    removed = next(c for c in cols if c.startswith("Removed") and "Ticker" in c)
+    dates = pd.to_datetime(changes[date_col], errors="coerce")
+    for d, a, r in zip(dates, changes[added], changes[removed]):
+        if pd.isna(d):
+            continue
+        yield d.strftime("%Y-%m-%d"), _yahoo_ticker(a) if pd.notna(a) else None, _yahoo_ticker(r) if pd.notna(r) else None
+
+
+def membership_history(current, changes):
+    """
+    {date: constituents from that date on}: walk the change list back from the current members, undoing
+    each day's additions and removals. The state before the oldest listed change is dated the day before it.
     """
-    now = time.time()
-    if not force_refresh and CACHE_FILE.exists():
+    today = datetime.now().strftime("%Y-%m-%d")
+    members = list(dict.fromkeys(current))
+    history = {today: members}
+    by_date = {}
+    for date_str, added, removed in _change_rows(changes):
+        if date_str <= today:
+            day = by_date.setdefault(date_str, (set(), set()))
+            if added:
+                day[0].add(added)
+            if removed:
+                day[1].add(removed)
+    for date_str in sorted(by_date, reverse=True):
+        added, removed = by_date[date_str]
+        history.setdefault(date_str, members)
+        members = [s for s in members if s not in added] + sorted(removed - set(members))
+        before = (datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        history[before] = members
+    return history
+
+
+def fetch_sp500_membership():
+    """{date: tickers} from Wikipedia: today's constituents plus the rebuilt history (the universe provider)."""
+    resp = requests.get(WIKI_URL, timeout=15, headers={"User-Agent": "Mozilla/5.0"})
+    resp.raise_for_status()
+    tables = pd.read_html(StringIO(resp.text))
+    df = tables[0]
+    if "Symbol" not in df.columns:
+        return {}
+    tickers = list(dict.fromkeys(t for t in (_yahoo_ticker(s) for s in df["Symbol"].dropna().astype(str)) if t))
+    if "Security" in df.columns:
+        from app.price_store import save_names
+        save_names({_yahoo_ticker(s): str(n).strip() for s, n in zip(df["Symbol"], df["Security"]) if _yahoo_ticker(s)})
+    if len(tables) > 1:
         try:
-            with open(CACHE_FILE, "r") as f:
-                data = json.load(f)
-            if now - data.get("updated", 0) < CACHE_DAYS * 86400:
-                return data["tickers"]
-        except Exception:
+            return membership_history(tickers, tables[1])
+        except (StopIteration, KeyError, ValueError):
             pass
-
-    try:
-        resp = requests.get(WIKI_URL, timeout=15)
-        resp.raise_for_status()
-        tables = pd.read_html(StringIO(resp.text))
-        df = tables[0]
-        if "Symbol" not in df.columns:
-            return _fallback_tickers()
-        raw = df["Symbol"].astype(str).str.strip().dropna().unique().tolist()
-        tickers = [_yahoo_ticker(s) for s in raw if _yahoo_ticker(s)]
-        tickers = list(dict.fromkeys(tickers))
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        with open(CACHE_FILE, "w") as f:
-            json.dump({"tickers": tickers, "updated": now}, f)
-        return tickers
-    except Exception:
-        return _fallback_tickers()
+    return {datetime.now().strftime("%Y-%m-%d"): tickers}
 
 
 def _fallback_tickers():
-    """Minimal fallback if Wikipedia fails; still ~500 names."""
+    """Minimal fallback if Wikipedia fails and nothing is cached yet."""
     # Small subset of well-known S&P 500 tickers so we always have something
     fallback = (
         "AAPL MSFT GOOGL AMZN NVDA META TSLA BRK-B JPM JNJ V UNH XOM WMT PG HD MA CVX "
         "LLY ABBV MRK PEP KO AVGO COST PFE TMO ABT MCD CSCO ACRM DIS WFC NEE PM TXN NKE "
         "BMY UPS HON INTC AMGN QCOM HCA RTX INTU HUM AMAT HII SBUX LMT MDT GILD C CI "
         "ADI TJX BKNG ISRG VRTX REPL BLK LRCX DE APH KLAC SNPS PANW CDNS MDLZ MAR "
-        "NXPI AON GS AMAT CHTR TMUS ZTS BMY MU"
+        "NXPI AON GS CHTR TMUS ZTS MU"
     )
-    return [s.strip() for s in fallback.split() if s.strip()]
+    return list(dict.fromkeys(s.strip() for s in fallback.split() if s.strip()))
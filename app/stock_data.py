@@ -1,173 +1,283 @@
 """Fetch historical stock data using yfinance."""
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import yfinance as yf
 import pandas as pd
 
+from app import fetcher, metrics, price_store, trading_calendar
+from config import FETCH_DEADLINE_SECONDS
+
+# Built chart payloads by (symbol, days), reused while the underlying bars are fresh
+CHART_CACHE_SIZE = 512
+_chart_cache = OrderedDict()
+_chart_lock = threading.Lock()
+
 
 def get_stock_name(symbol):
-    """Return full company name for symbol, or symbol if unavailable."""
+    """
+    Return full company name for symbol, or symbol if unavailable. Names are kept in the local store;
+    so are misses (as the symbol itself), which are retried after price_store.NAME_RETRY_SECONDS.
+    """
+    sym = symbol.upper()
+    stored = price_store.get_name(sym)
+    if stored:
+        return stored
     try:
-        t = yf.Ticker(symbol.upper())
+        import yfinance as yf
+        t = yf.Ticker(sym)
         info = t.info
-        return (info.get("longName") or info.get("shortName") or symbol).strip() or symbol
+        name = (info.get("longName") or info.get("shortName") or sym).strip() or sym
     except Exception:
-        return symbol.upper()
+        metrics.inc("errors_total", where="stock_name")
+        name = sym
+    price_store.save_names({sym: name})
+    return name
 
 
-def _fetch_one(symbol, days=90):
-    """Fetch one symbol; more reliable than batch when market is closed or for few symbols."""
-    sym = symbol.upper()
+def _split_download(data, symbols):
+    """Split a yf.download frame into {symbol: OHLCV DataFrame}; handles flat and MultiIndex columns."""
+    out = {}
+    if data is None or data.empty:
+        return out
+    if isinstance(data.columns, pd.MultiIndex):
+        # group_by="ticker" gives (Ticker, Price); the default gives (Price, Ticker)
+        for level in range(data.columns.nlevels):
+            present = set(data.columns.get_level_values(level))
+            for sym in symbols:
+                if sym in present:
+                    out[sym] = data.xs(sym, axis=1, level=level)
+            if out:
+                break
+    elif len(symbols) == 1 and "Close" in data.columns:
+        out[symbols[0]] = data
+    return {sym: frame for sym, frame in out.items() if "Close" in frame.columns and frame["Close"].notna().any()}
+
+
+def _download(symbols, start_str, end_str, downloader=None, deadline=None):
+    """
+    One yfinance request for symbols over start_str..end_str (inclusive), rate limited and retried.
+    downloader replaces yf.download (same signature), e.g. a local stub. Returns {symbol: DataFrame} or None on error.
+    """
+    if downloader is None:
+        import yfinance as yf
+        downloader = yf.download
+    end = datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1)
     try:
-        data = yf.download(
-            sym,
-            period="3mo",
-            progress=False,
-            auto_adjust=True,
-            threads=False,
+        data = fetcher.call_with_retry(
+            lambda: downloader(
+                symbols if len(symbols) > 1 else symbols[0],
+                start=start_str,
+                end=end.strftime("%Y-%m-%d"),
+                progress=False,
+                group_by="ticker",
+                auto_adjust=True,
+                threads=False,
+            ),
+            host=fetcher.YAHOO_HOST,
+            deadline=deadline,
         )
     except Exception:
+        metrics.inc("errors_total", where="yahoo_download")
         return None
-    if data is None or data.empty or "Close" not in data.columns:
-        return None
-    close = data["Close"].dropna()
-    if len(close) < 2:
+    return _split_download(data, symbols)
+
+
+def _gap_sessions(coverage, start_str, end_str):
+    """Trading days in start_str..end_str outside the stored first..last range of coverage (a get_coverage value)."""
+    first, last, _ = coverage
+    before = trading_calendar.count_sessions(start_str, trading_calendar.previous_session(first)) if start_str < first else 0
+    return before + trading_calendar.count_sessions(trading_calendar.next_session(last), end_str)
+
+
+def _refresh_store(symbols, start_str, end_str, downloader=None, deadline=None):
+    """
+    Bring the local price store up to date for symbols over start_str..end_str.
+    Only missing bars are downloaded: symbols sharing the same gap go in one request, so a warm
+    daily run makes a single small delta request per chunk.
+    """
+    coverage = price_store.get_coverage(symbols)
+    pending = {}
+    for sym in symbols:
+        fetch_from = price_store.missing_from(coverage.get(sym), start_str, end_str)
+        if fetch_from is not None:
+            pending.setdefault(fetch_from, []).append(sym)
+    missing = sum(len(syms) for syms in pending.values())
+    metrics.cache_result("price_store", True, len(symbols) - missing)
+    metrics.cache_result("price_store", False, missing)
+    for fetch_from, syms in pending.items():
+        frames = _download(syms, fetch_from, end_str, downloader=downloader, deadline=deadline)
+        if frames is None:
+            continue
+        to_save = {sym: frames[sym] for sym in syms if sym in frames}
+        # A stored symbol that came back empty only gets its coverage extended when the gap has no
+        # sessions (weekends, holidays); otherwise the download dropped it and the gap is retried next time
+        to_save.update({
+            sym: None for sym in syms
+            if sym not in frames and sym in coverage and not _gap_sessions(coverage[sym], fetch_from, end_str)
+        })
+        price_store.save_bars(to_save, fetch_from, end_str)
+
+
+def _fetch_one(symbol, days=90, downloader=None, deadline=None):
+    """Fetch one symbol's last `days` trading days; more reliable than batch when market is closed or for few symbols."""
+    sym = symbol.upper()
+    start_str, end_str = trading_calendar.lookback_window(days)
+    _refresh_store([sym], start_str, end_str, downloader=downloader, deadline=deadline)
+    close = price_store.load_closes([sym], start_str, end_str).get(sym)
+    if close is None or len(close) < 2:
         return None
     return close
 
 
-def get_chart_data(symbol, days=90):
-    """Return list of {date: 'YYYY-MM-DD', close: float} for charting (full time series)."""
+def get_chart_data(symbol, sessions=63):
+    """Return list of {date: 'YYYY-MM-DD', close: float} for the last `sessions` trading days, for charting."""
     sym = symbol.upper()
-    end = datetime.now()
-    start = end - timedelta(days=days + 30)
-    try:
-        data = yf.download(
-            sym,
-            start=start.strftime("%Y-%m-%d"),
-            end=(end + timedelta(days=1)).strftime("%Y-%m-%d"),
-            progress=False,
-            auto_adjust=True,
-            threads=False,
-        )
-    except Exception:
-        return []
-    if data is None or data.empty:
-        return []
-    # Flatten: yfinance can return MultiIndex columns for single ticker
-    if isinstance(data.columns, pd.MultiIndex):
-        if sym in data.columns.get_level_values(0):
-            close = data[sym]["Close"].copy()
-        else:
-            close = data["Close"].copy() if "Close" in data.columns else None
-    else:
-        close = data["Close"].copy() if "Close" in data.columns else None
+    key = (sym, sessions)
+    with _chart_lock:
+        hit = _chart_cache.get(key)
+        if hit is not None and time.time() - hit[0] < price_store.FRESH_SECONDS:
+            _chart_cache.move_to_end(key)
+            metrics.cache_result("chart", True)
+            return hit[1]
+    metrics.cache_result("chart", False)
+    start_str, end_str = trading_calendar.lookback_window(sessions)
+    _refresh_store([sym], start_str, end_str)
+    close = price_store.load_closes([sym], start_str, end_str).get(sym)
     if close is None or close.empty:
         return []
-    close = close.dropna().sort_index()
-    if close.index.duplicated().any():
-        close = close.groupby(level=0).last()
-    # Build list by position so every value is scalar
-    out = []
-    for i in range(len(close)):
-        d = close.index[i]
-        v = close.iloc[i]
-        try:
-            date_str = d.strftime("%Y-%m-%d") if hasattr(d, "strftime") else str(d)[:10]
-        except Exception:
-            date_str = str(d)[:10]
-        try:
-            scalar = float(v)
-        except (TypeError, ValueError):
-            scalar = float(pd.Series(v).iloc[0])
-        out.append({"date": date_str, "close": round(scalar, 2)})
+    dates = pd.DatetimeIndex(close.index).strftime("%Y-%m-%d")
+    values = close.to_numpy(dtype="float64").round(2).tolist()
+    out = [{"date": d, "close": v} for d, v in zip(dates, values)]
+    with _chart_lock:
+        _chart_cache[key] = (time.time(), out)
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
     return out
 
 
 def fetch_prices_until(symbol, end_date_str, days=60):
-    """Fetch price series for one symbol ending on or before end_date_str (for ML training)."""
-    end = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)
-    start = end - timedelta(days=days + 30)
-    try:
-        data = yf.download(
-            symbol.upper(),
-            start=start.strftime("%Y-%m-%d"),
-            end=end.strftime("%Y-%m-%d"),
-            progress=False,
-            auto_adjust=True,
-            threads=False,
-        )
-    except Exception:
-        return None
-    if data is None or data.empty or "Close" not in data.columns:
-        return None
-    close = data["Close"].dropna()
-    if len(close) < 2:
+    """Fetch the last `days` trading days of one symbol ending on or before end_date_str (for ML training)."""
+    sym = symbol.upper()
+    start_str, end_str = trading_calendar.lookback_window(days, end_date_str)
+    _refresh_store([sym], start_str, end_str)
+    close = price_store.load_closes([sym], start_str, end_str).get(sym)
+    if close is None or len(close) < 2:
         return None
     return close
 
 
-def fetch_prices(symbols, days=60):
-    """Fetch closing prices for the last several trading days. Works outside market hours."""
+def fetch_history(symbol, start_str, end_str):
+    """Close series for one symbol between two dates (inclusive), read through the local store."""
+    sym = symbol.upper()
+    _refresh_store([sym], start_str, end_str)
+    return price_store.load_closes([sym], start_str, end_str).get(sym)
+
+
+def fetch_close_panel(symbols, start_str, end_str, chunk_size=80, max_workers=None):
+    """Wide date x symbol DataFrame of closes between two dates (inclusive), read through the local store."""
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    chunks = [symbols[i : i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    fetcher.run_bounded(lambda chunk: _refresh_store(chunk, start_str, end_str), chunks, max_workers=max_workers)
+    closes = price_store.load_closes(symbols, start_str, end_str)
+    if not closes:
+        return pd.DataFrame(dtype="float64")
+    return pd.DataFrame(closes).sort_index()
+
+
+def fetch_prices(symbols, days=60, downloader=None, deadline=None):
+    """Fetch closing prices for the last `days` trading days. Works outside market hours."""
     if not symbols:
         return {}
     if isinstance(symbols, str):
         symbols = [symbols]
     symbols = [s.upper() for s in symbols]
-    result = {}
 
-    # Try batch first for efficiency
-    end = datetime.now()
-    start = end - timedelta(days=days + 40)
-    try:
-        data = yf.download(
-            symbols,
-            start=start.strftime("%Y-%m-%d"),
-            end=(end + timedelta(days=1)).strftime("%Y-%m-%d"),
-            progress=False,
-            group_by="ticker",
-            auto_adjust=True,
-            threads=False,
-        )
-    except Exception:
-        data = None
-
-    if data is not None and not data.empty:
-        if len(symbols) == 1:
-            if isinstance(data.columns, pd.MultiIndex):
-                if symbols[0] in data.columns.get_level_values(0):
-                    result[symbols[0]] = data[symbols[0]]["Close"].dropna()
-            elif "Close" in data.columns:
-                result[symbols[0]] = data["Close"].dropna()
-        else:
-            for sym in symbols:
-                if isinstance(data.columns, pd.MultiIndex) and sym in data.columns.get_level_values(0):
-                    ser = data[sym]["Close"].dropna()
-                    if len(ser) >= 2:
-                        result[sym] = ser
+    # Batch delta download into the local store, then read everything back from it
+    start_str, end_str = trading_calendar.lookback_window(days)
+    _refresh_store(symbols, start_str, end_str, downloader=downloader, deadline=deadline)
+    stored = price_store.load_closes(symbols, start_str, end_str)
+    result = {sym: ser for sym, ser in stored.items() if len(ser) >= 2}
 
     # Fallback: fetch each symbol individually (more reliable on weekends / outside market)
     for sym in symbols:
-        if sym not in result or len(result[sym]) < 2:
-            one = _fetch_one(sym, days=days)
+        if sym not in result:
+            one = _fetch_one(sym, days=days, downloader=downloader, deadline=deadline)
             if one is not None:
                 result[sym] = one
 
     return result
 
 
-def fetch_prices_batched(symbols, days=60, chunk_size=80):
+def fetch_prices_batched(symbols, days=60, chunk_size=80, max_workers=None, deadline_seconds=None, downloader=None):
     """
     Fetch prices for many symbols in chunks (for S&P 500). Returns same dict as fetch_prices.
+    Chunks, then per-symbol fallbacks, run on up to max_workers threads (default FETCH_CONCURRENCY;
+    1 = sequential) under the Yahoo rate limit. Work not started within deadline_seconds
+    (default FETCH_DEADLINE_SECONDS) is skipped, so a flaky morning returns partial data instead of hanging.
     """
     if not symbols:
         return {}
-    symbols = [s.upper() if isinstance(s, str) else s for s in symbols]
-    result = {}
-    for i in range(0, len(symbols), chunk_size):
-        chunk = symbols[i : i + chunk_size]
-        result.update(fetch_prices(chunk, days=days))
+    symbols = list(dict.fromkeys(s.upper() if isinstance(s, str) else s for s in symbols))
+    deadline = fetcher.deadline_in(FETCH_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+    start_str, end_str = trading_calendar.lookback_window(days)
+
+    chunks = [symbols[i : i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    fetcher.run_bounded(
+        lambda chunk: _refresh_store(chunk, start_str, end_str, downloader=downloader, deadline=deadline),
+        chunks,
+        max_workers=max_workers,
+        deadline=deadline,
+    )
+    stored = price_store.load_closes(symbols, start_str, end_str)
+    result = {sym: ser for sym, ser in stored.items() if len(ser) >= 2}
+
+    missing = [sym for sym in symbols if sym not in result]
+    singles = fetcher.run_bounded(
+        lambda sym: _fetch_one(sym, days=days, downloader=downloader, deadline=deadline),
+        missing,
+        max_workers=max_workers,
+        deadline=deadline,
+    )
+    for sym, one in zip(missing, singles):
+        if one is not None:
+            result[sym] = one
+    metrics.inc("symbols_total", len(result), outcome="fetched")
+    metrics.inc("symbols_total", len(symbols) - len(result), outcome="failed")
     return result
 
+
+def iter_prices_batched(symbols, days=60, chunk_size=80, max_workers=None, deadline_seconds=None, downloader=None):
+    """
+    Streaming fetch_prices_batched: yields one {symbol: close Series} dict per chunk as soon as that
+    chunk (and its per-symbol fallbacks) is done, while other chunks are still downloading. Chunks
+    arrive in completion order; together they hold the same series fetch_prices_batched returns.
+    """
+    if not symbols:
+        return
+    symbols = list(dict.fromkeys(s.upper() if isinstance(s, str) else s for s in symbols))
+    deadline = fetcher.deadline_in(FETCH_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+    start_str, end_str = trading_calendar.lookback_window(days)
+
+    def _chunk(chunk):
+        _refresh_store(chunk, start_str, end_str, downloader=downloader, deadline=deadline)
+        stored = price_store.load_closes(chunk, start_str, end_str)
+        result = {sym: ser for sym, ser in stored.items() if len(ser) >= 2}
+        for sym in chunk:
+            if sym not in result:
+                one = _fetch_one(sym, days=days, downloader=downloader, deadline=deadline)
+                if one is not None:
+                    result[sym] = one
+        return result
+
+    chunks = [symbols[i : i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    for chunk, result in fetcher.iter_bounded(_chunk, chunks, max_workers=max_workers, deadline=deadline):
+        fetched = len(result or ())
+        metrics.inc("symbols_total", fetched, outcome="fetched")
+        metrics.inc("symbols_total", len(chunk) - fetched, outcome="failed")
+        if result:
+            yield result
+
 def compute_returns(series: pd.Series, periods=1):
     """Compute period-over-period return (e.g. 1 = one-day return)."""
     if series is None or len(series) < periods + 1:
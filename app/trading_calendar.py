@@ -0,0 +1,183 @@
+"""
+Offline NYSE trading calendar: sessions precomputed from the exchange's holiday rules, with O(1)
+next/previous session lookups, trading-day offsets and exact lookback windows.
+
+Every function takes a date as 'YYYY-MM-DD', datetime/date or Timestamp and returns 'YYYY-MM-DD'
+strings, like the rest of the app. Dates outside CALENDAR_START..CALENDAR_END raise ValueError.
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_START = date(1990, 1, 1)
+CALENDAR_END = date(2050, 12, 31)
+
+# Unscheduled full-day closures (national days of mourning, 9/11, Hurricane Sandy)
+SPECIAL_CLOSURES = [
+    "1994-04-27",
+    "2001-09-11", "2001-09-12", "2001-09-13", "2001-09-14",
+    "2004-06-11",
+    "2007-01-02",
+    "2012-10-29", "2012-10-30",
+    "2018-12-05",
+    "2025-01-09",
+]
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th (1-based) given weekday (Mon=0) of a month; n=-1 for the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    """Full-day NYSE holidays of a year under the current rules (early closes are trading days)."""
+    days = [
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    ]
+    # A Saturday New Year's Day is not made up on the Friday before (that Friday ends the prior year)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.append(_observed(new_year))
+    if year >= 1998:
+        days.append(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    if year >= 2022:
+        days.append(_observed(date(year, 6, 19)))  # Juneteenth
+    return sorted(days)
+
+
+@lru_cache(maxsize=1)
+def _tables():
+    """
+    (sessions, on_or_before): sessions is the sorted datetime64[D] array of trading days; on_or_before[i]
+    is the index in sessions of the last session on or before calendar day CALENDAR_START + i (-1 if none).
+    """
+    days = np.arange(np.datetime64(CALENDAR_START), np.datetime64(CALENDAR_END) + 1, dtype="datetime64[D]")
+    closed = [np.datetime64(d) for y in range(CALENDAR_START.year, CALENDAR_END.year + 1) for d in nyse_holidays(y)]
+    closed.extend(np.datetime64(d) for d in SPECIAL_CLOSURES)
+    is_session = np.is_busday(days) & ~np.isin(days, np.array(closed, dtype="datetime64[D]"))
+    return days[is_session], np.cumsum(is_session) - 1
+
+
+def _day_index(day):
+    """Calendar-day offset of a date from CALENDAR_START."""
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d").date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    i = (day - CALENDAR_START).days
+    if not 0 <= i <= (CALENDAR_END - CALENDAR_START).days:
+        raise ValueError(f"{day} is outside the trading calendar ({CALENDAR_START}..{CALENDAR_END})")
+    return i
+
+
+def _session(pos):
+    sessions = _tables()[0]
+    if not 0 <= pos < len(sessions):
+        raise ValueError("Trading day offset runs past the trading calendar")
+    return str(sessions[pos])
+
+
+def _pos_on_or_before(day):
+    return int(_tables()[1][_day_index(day)])
+
+
+def _pos_on_or_after(day):
+    sessions, on_or_before = _tables()
+    pos = int(on_or_before[_day_index(day)])
+    if pos < 0 or sessions[pos] != np.datetime64(_as_str(day)):
+        pos += 1
+    return pos
+
+
+def _as_str(day):
+    return day[:10] if isinstance(day, str) else pd.Timestamp(day).strftime("%Y-%m-%d")
+
+
+def is_session(day):
+    """True if the exchange trades on day."""
+    pos = _pos_on_or_before(day)
+    return pos >= 0 and str(_tables()[0][pos]) == _as_str(day)
+
+
+def session_on_or_before(day):
+    """Latest trading day on or before day (the session whose close is the latest as of day)."""
+    return _session(_pos_on_or_before(day))
+
+
+def session_on_or_after(day):
+    """Earliest trading day on or after day."""
+    return _session(_pos_on_or_after(day))
+
+
+def next_session(day):
+    """First trading day strictly after day."""
+    return _session(_pos_on_or_before(day) + 1)
+
+
+def previous_session(day):
+    """Last trading day strictly before day."""
+    return _session(_pos_on_or_after(day) - 1)
+
+
+def session_offset(day, n):
+    """
+    The trading day n sessions from day, counted from session_on_or_before(day): n=0 is that session,
+    n=1 the next one, n=-1 the one before (so a Saturday +1 is Monday and -1 is Thursday).
+    """
+    return _session(_pos_on_or_before(day) + n)
+
+
+def count_sessions(start, end):
+    """Number of trading days in start..end (inclusive)."""
+    return max(0, _pos_on_or_before(end) - _pos_on_or_after(start) + 1)
+
+
+def sessions_between(start, end):
+    """DatetimeIndex of the trading days in start..end (inclusive)."""
+    sessions = _tables()[0]
+    lo, hi = _pos_on_or_after(start), _pos_on_or_before(end)
+    return pd.DatetimeIndex(sessions[lo : hi + 1] if hi >= lo else sessions[:0])
+
+
+def lookback_window(sessions, end=None):
+    """
+    (start_str, end_str) spanning exactly `sessions` trading days that end on the last session on or
+    before end (default today). Use it instead of padding calendar days for weekends and holidays.
+    """
+    end = session_on_or_before(end or datetime.now())
+    return session_offset(end, -(max(sessions, 1) - 1)), end
@@ -0,0 +1,70 @@
+"""
+Cross-sectional training set: every universe member on every session, labeled by its next-day return.
+
+Rows pair features as of close t with the return from close t to the next session's close (the same pairing
+as accuracy_log outcomes and the feature store's forward_return_1d). They are generated one symbol chunk at a
+time from the local price store and kept as float32, so years of a 500-3,000 name universe fit in memory.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from app import trading_calendar
+from app.features import MIN_ML_OBS
+
+CHUNK_SYMBOLS = 250  # symbols per close panel; bounds the float64 working set while features are computed
+
+
+def build_training_set(start, end, universe=None, symbols=None, chunk_size=CHUNK_SYMBOLS, workers=None,
+                       progress=None):
+    """
+    Labeled rows for every (session, symbol) with start <= session <= end, MIN_ML_OBS bars of history and a
+    completed next session. symbols defaults to everyone in the universe (default UNIVERSE) during the period,
+    and each row needs the symbol to have been a constituent on that date (point-in-time snapshots).
+    progress(fraction, message), if given, is called per chunk.
+    Returns (X float32 of shape (rows, len(FEATURE_NAMES)), y int8 with 1 = next-day return > 0,
+    dates as YYYY-MM-DD strings), in date order.
+    """
+    from app.backtest import feature_tensor
+    from app.ml_model import FEATURE_NAMES
+    from app.stock_data import fetch_close_panel
+    from app.universe import get_universe, members_between, membership_matrix
+    from config import UNIVERSE
+
+    if symbols is None:
+        universe = universe or UNIVERSE
+        symbols = members_between(universe, start, end) or get_universe(universe)
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    warmup = trading_calendar.session_offset(start, -(MIN_ML_OBS - 1))
+    today = np.datetime64(datetime.now().strftime("%Y-%m-%d"))
+    first = np.datetime64(start)
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    xs, ys, days = [], [], []
+    for n, chunk in enumerate(chunks):
+        if progress:
+            progress(n / len(chunks), f"Labeling symbols {n * chunk_size + 1}-{n * chunk_size + len(chunk)} of {len(symbols)}")
+        panel = fetch_close_panel(chunk, warmup, end)
+        if panel.empty or len(panel) < 2:
+            continue
+        tensor, obs = feature_tensor(panel, workers=workers)
+        closes = panel.to_numpy(dtype=np.float64)
+        index = panel.index.to_numpy().astype("datetime64[D]")
+        forward = np.full_like(closes, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            forward[:-1] = (closes[1:] / closes[:-1] - 1.0) * 100
+        # The next bar must be a finished session, not today's partial one
+        settled = np.zeros(len(index), dtype=bool)
+        settled[:-1] = index[1:] < today
+        valid = (obs >= MIN_ML_OBS) & ~np.isnan(forward) & (settled & (index >= first))[:, None]
+        if universe is not None:
+            valid &= membership_matrix(universe, panel.index, list(panel.columns))
+        rows = np.nonzero(valid)[0]
+        xs.append(tensor[valid].astype(np.float32))
+        ys.append((forward[valid] > 0).astype(np.int8))
+        days.append(index[rows])
+        del tensor, obs, closes, forward
+    if not xs:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=np.float32), np.empty(0, dtype=np.int8), np.empty(0, dtype=str)
+    order = np.argsort(np.concatenate(days), kind="stable")
+    dates = np.concatenate(days)[order].astype(str)
+    return np.concatenate(xs)[order], np.concatenate(ys)[order], dates
@@ -0,0 +1,208 @@
+"""
+Compact random-forest format and a pure-NumPy evaluator, so scoring needs neither sklearn nor unpickling.
+
+export_forest() flattens every tree of a fitted RandomForestClassifier, plus the imputer's fill values,
+into a few concatenated arrays saved as an uncompressed .npz; load_forest() memory-maps them back.
+Forest.predict_proba walks all trees for a block of rows at once, one tree level per step.
+
+Trees up to MAX_DENSE_DEPTH are stored "dense": padded to perfect binary trees (heap order, children of
+slot i at 2i+1 and 2i+2), so a step is a compare and an index computation. Deeper trees keep sklearn's
+node layout with explicit child arrays. Thresholds are float32, rounded down from sklearn's float64
+thresholds, which keeps `x <= threshold` identical for float32 inputs.
+"""
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MAX_DENSE_DEPTH = 12
+BLOCK_ROWS = 1024  # rows per evaluation block; the node index array is BLOCK_ROWS x trees
+
+
+def _float32_floor(values):
+    """Largest float32 <= each float64 value, so float32 x <= result exactly when x <= value."""
+    out = values.astype(np.float32)
+    over = out.astype(np.float64) > values
+    out[over] = np.nextafter(out[over], np.float32(-np.inf))
+    return out
+
+
+def _leaf_proba(tree, positive):
+    counts = tree.value[:, 0, :]
+    totals = counts.sum(axis=1)
+    if positive is None:
+        return np.zeros(tree.node_count)
+    return counts[:, positive] / np.where(totals > 0, totals, 1)
+
+
+def _dense_tree(tree, proba, depth):
+    """(feature, threshold, leaf value) arrays of a tree padded to a perfect binary tree of `depth` levels."""
+    feature = np.zeros(2 ** depth - 1, dtype=np.int64)
+    threshold = np.full(2 ** depth - 1, np.inf)
+    nodes = np.zeros(1, dtype=np.int64)
+    for level in range(depth):
+        slots = slice(2 ** level - 1, 2 ** (level + 1) - 1)
+        leaf = tree.children_left[nodes] < 0
+        # A leaf above the last level always goes left (threshold +inf) and both copies lead to itself
+        feature[slots] = np.where(leaf, 0, tree.feature[nodes])
+        threshold[slots] = np.where(leaf, np.inf, tree.threshold[nodes])
+        left = np.where(leaf, nodes, tree.children_left[nodes])
+        right = np.where(leaf, nodes, tree.children_right[nodes])
+        nodes = np.stack([left, right], axis=1).ravel()
+    return feature, threshold, proba[nodes]
+
+
+def export_forest(model, imputer, path, features):
+    """
+    Write model (a fitted RandomForestClassifier) and imputer (fitted SimpleImputer or None) to path as .npz.
+    Leaf values are the probability of class 1.
+    """
+    classes = list(model.classes_)
+    positive = classes.index(1) if 1 in classes else None
+    depth = max(est.tree_.max_depth for est in model.estimators_)
+    dense = depth <= MAX_DENSE_DEPTH
+    parts = {"feature": [], "threshold": [], "value": [], "left": [], "right": []}
+    roots, offset = [], 0
+    for est in model.estimators_:
+        tree = est.tree_
+        proba = _leaf_proba(tree, positive)
+        if dense:
+            feature, threshold, value = _dense_tree(tree, proba, depth)
+        else:
+            leaf = tree.children_left < 0
+            own = np.arange(offset, offset + tree.node_count)
+            # Leaves point to themselves, so every row can take the same number of steps
+            feature = np.where(leaf, 0, tree.feature)
+            threshold = np.where(leaf, np.inf, tree.threshold)
+            value = np.where(leaf, proba, 0.0)
+            parts["left"].append(np.where(leaf, own, tree.children_left + offset))
+            parts["right"].append(np.where(leaf, own, tree.children_right + offset))
+            roots.append(offset)
+            offset += tree.node_count
+        parts["feature"].append(feature)
+        parts["threshold"].append(threshold)
+        parts["value"].append(value)
+    n_features = len(features)
+    if imputer is not None:
+        stats = np.asarray(imputer.statistics_, dtype=np.float64)
+        # Without keep_empty_features the imputer drops columns it saw no values for
+        keep_all = getattr(imputer, "keep_empty_features", False)
+        columns = np.arange(n_features) if keep_all else np.flatnonzero(~np.isnan(stats))
+        fill = np.nan_to_num(stats[columns], nan=0.0)
+    else:
+        columns, fill = np.arange(n_features), np.zeros(n_features)
+    arrays = {
+        "meta": np.array([FORMAT_VERSION, depth, int(dense), len(model.estimators_)], dtype=np.int64),
+        "features": np.array(features, dtype=str),
+        "columns": columns.astype(np.int32),
+        "fill": fill.astype(np.float32),
+        "feature": np.concatenate(parts["feature"]).astype(np.int32),
+        "threshold": _float32_floor(np.concatenate(parts["threshold"]).astype(np.float64)),
+        "value": np.concatenate(parts["value"]).astype(np.float32),
+    }
+    if not dense:
+        arrays.update(
+            left=np.concatenate(parts["left"]).astype(np.int32),
+            right=np.concatenate(parts["right"]).astype(np.int32),
+            roots=np.array(roots, dtype=np.int32),
+        )
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _mmap_npz(path):
+    """{name: array} for an uncompressed .npz, each member memory-mapped instead of read."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                with np.load(path) as data:
+                    return {k: data[k] for k in data.files}
+            # Local file header: 30 fixed bytes, then the name and extra field, then the .npy member
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+            start = info.header_offset + 30 + name_len + extra_len
+            f.seek(start)
+            version = np.lib.format.read_magic(f)
+            header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran, dtype = header(f)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if not np.prod(shape) or dtype.hasobject:
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                # A plain ndarray view of the mapping: indexing a np.memmap subclass is slower
+                arrays[name] = np.asarray(np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                                                    order="F" if fortran else "C", offset=f.tell()))
+    return arrays
+
+
+class Forest:
+    """A flattened forest loaded by load_forest()."""
+
+    def __init__(self, arrays):
+        _, self.depth, dense, self.n_trees = (int(v) for v in arrays["meta"])
+        self.dense = bool(dense)
+        self.features = [str(s) for s in arrays["features"]]
+        self.columns = np.asarray(arrays["columns"])
+        self.fill = np.asarray(arrays["fill"])
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        if self.dense:
+            inner = 2 ** self.depth - 1
+            self._base = (np.arange(self.n_trees, dtype=np.int32) * inner)[None, :]
+            # Leaf slot k of tree t is value[t * 2**depth + k]; after `depth` steps node = inner + k
+            self._leaf_base = (np.arange(self.n_trees, dtype=np.int32) * (inner + 1) - inner)[None, :]
+        else:
+            self.left = arrays["left"]
+            self.right = arrays["right"]
+            self.roots = np.asarray(arrays["roots"])
+
+    def _prepare(self, block):
+        block = block[:, self.columns]
+        missing = np.isnan(block)
+        if missing.any():
+            block[missing] = np.broadcast_to(self.fill, block.shape)[missing]
+        return np.nan_to_num(block, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def _leaves(self, block):
+        """Leaf value reached in every tree, shape (rows, trees)."""
+        flat = block.ravel()
+        row_start = (np.arange(len(block), dtype=np.int32) * block.shape[1])[:, None]
+        if self.dense:
+            node = np.zeros((len(block), self.n_trees), dtype=np.int32)
+            for _ in range(self.depth):
+                slot = self._base + node
+                node = 2 * node + 1 + (flat[row_start + self.feature[slot]] > self.threshold[slot])
+            return self.value[self._leaf_base + node]
+        node = np.broadcast_to(self.roots.astype(np.int64), (len(block), self.n_trees))
+        for _ in range(self.depth):
+            go_left = flat[row_start + self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node]
+
+    def predict_proba(self, X):
+        """Probability of class 1 for each row of X (rows x features, in the exported feature order)."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, len(self.features))
+        out = np.empty(len(X), dtype=np.float64)
+        for lo in range(0, len(X), BLOCK_ROWS):
+            block = self._prepare(X[lo:lo + BLOCK_ROWS])
+            out[lo:lo + len(block)] = self._leaves(block).mean(axis=1)
+        return out
+
+
+def load_forest(path, mmap=True):
+    """Forest from an export_forest() file, memory-mapped unless mmap is False. None for an unknown format."""
+    if mmap:
+        arrays = _mmap_npz(path)
+    else:
+        with np.load(path) as data:
+            arrays = {k: data[k] for k in data.files}
+    if int(arrays["meta"][0]) != FORMAT_VERSION:
+        return None
+    return Forest(arrays)
@@ -0,0 +1,207 @@
+"""
+Universe providers: which symbols get scored (S&P 500, Russell 1000/3000, a CSV list, the watchlist).
+
+Every refresh is kept as a dated constituent snapshot under data/universes/<name>/YYYY-MM-DD.txt
+(one symbol per line), so membership can be looked up as of any past date and backtests score the
+names that were in the index back then instead of today's survivors.
+"""
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime
+from io import StringIO
+
+# pandas, numpy and requests are imported where used: universe_label() is on the dashboard's import path
+from config import DATA_DIR, UNIVERSE, UNIVERSE_CSV
+
+UNIVERSE_DIR = DATA_DIR / "universes"
+CACHE_DAYS = 7
+ISHARES_HOLDINGS = {
+    "russell1000": "https://www.ishares.com/us/products/239707/ishares-russell-1000-etf/1467271812596.ajax"
+                   "?fileType=csv&fileName=IWB_holdings&dataType=fund",
+    "russell3000": "https://www.ishares.com/us/products/239714/ishares-russell-3000-etf/1467271812596.ajax"
+                   "?fileType=csv&fileName=IWV_holdings&dataType=fund",
+}
+# iShares drops the share-class separator; Yahoo wants it
+ISHARES_TICKERS = {"BRKB": "BRK-B", "BFB": "BF-B"}
+LABELS = {"sp500": "S&P 500", "russell1000": "Russell 1000", "russell3000": "Russell 3000", "watchlist": "Watchlist"}
+
+
+def normalize_symbols(symbols):
+    """Yahoo-style symbols (BRK.B -> BRK-B, upper case), blanks dropped, duplicates removed in order."""
+    import pandas as pd
+    out = (str(s).strip().replace(".", "-").upper() for s in symbols if s is not None and not pd.isna(s))
+    return list(dict.fromkeys(s for s in out if s and s not in ("NAN", "-")))
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _sp500(app=None):
+    from app.sp500 import fetch_sp500_membership
+    return fetch_sp500_membership()
+
+
+def _ishares(name):
+    def _fetch(app=None):
+        import pandas as pd
+        import requests
+        resp = requests.get(ISHARES_HOLDINGS[name], timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+        resp.raise_for_status()
+        lines = resp.text.splitlines()
+        header = next(i for i, line in enumerate(lines) if line.startswith("Ticker,"))
+        df = pd.read_csv(StringIO("\n".join(lines[header:])), dtype=str)
+        if "Asset Class" in df.columns:
+            df = df[df["Asset Class"] == "Equity"]
+        return {_today(): [ISHARES_TICKERS.get(s, s) for s in normalize_symbols(df["Ticker"])]}
+
+    return _fetch
+
+
+def _watchlist(app=None):
+    if app is None:
+        return {}
+    from app.models import get_watchlist
+    return {_today(): [w["symbol"] for w in get_watchlist(app)]}
+
+
+def _csv(path):
+    """A symbol column (Symbol/Ticker or the first column); with a date column each date is a snapshot."""
+    def _fetch(app=None):
+        import pandas as pd
+        df = pd.read_csv(path, dtype=str)
+        cols = {c.lower(): c for c in df.columns}
+        sym_col = cols.get("symbol") or cols.get("ticker") or df.columns[0]
+        if "date" not in cols:
+            return {_today(): df[sym_col].tolist()}
+        dates = pd.to_datetime(df[cols["date"]]).dt.strftime("%Y-%m-%d")
+        return {d: group.tolist() for d, group in df[sym_col].groupby(dates)}
+
+    return _fetch
+
+
+PROVIDERS = {
+    "sp500": _sp500,
+    "russell1000": _ishares("russell1000"),
+    "russell3000": _ishares("russell3000"),
+    "watchlist": _watchlist,
+}
+# Read fresh every time instead of waiting CACHE_DAYS
+LIVE = {"watchlist"}
+
+
+def _provider(name):
+    """(provider, live) for a universe name; "csv" uses UNIVERSE_CSV and "csv:<path>" any file."""
+    if name == "csv" or name.startswith("csv:"):
+        return _csv(name[4:] or UNIVERSE_CSV), True
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown universe {name!r}; expected one of {sorted(PROVIDERS)} or csv:<path>")
+    return PROVIDERS[name], name in LIVE
+
+
+def _snapshot_dir(name):
+    return UNIVERSE_DIR / ("csv_" + "".join(c if c.isalnum() else "_" for c in name[4:]) if name.startswith("csv:") else name)
+
+
+def snapshot_dates(name):
+    """Sorted dates (YYYY-MM-DD) that have a stored snapshot for this universe."""
+    folder = _snapshot_dir(name)
+    if not folder.is_dir():
+        return []
+    return sorted(p.stem for p in folder.glob("*.txt"))
+
+
+def _read_snapshot(name, date_str):
+    return (_snapshot_dir(name) / f"{date_str}.txt").read_text().split()
+
+
+def save_snapshot(name, symbols, date_str=None):
+    """
+    Store the constituents as of date_str (default today). Unchanged membership is not written again;
+    the latest snapshot is only touched, so it counts as fresh.
+    """
+    date_str = date_str or _today()
+    symbols = normalize_symbols(symbols)
+    folder = _snapshot_dir(name)
+    folder.mkdir(parents=True, exist_ok=True)
+    earlier = [d for d in snapshot_dates(name) if d <= date_str]
+    if earlier and set(_read_snapshot(name, earlier[-1])) == set(symbols):
+        os.utime(folder / f"{earlier[-1]}.txt")
+        return
+    (folder / f"{date_str}.txt").write_text("\n".join(symbols) + "\n")
+
+
+def members_on(name, date_str):
+    """Constituents as of date_str (latest snapshot on or before it; the earliest one before history starts)."""
+    dates = snapshot_dates(name)
+    if not dates:
+        return []
+    pos = max(bisect_right(dates, date_str) - 1, 0)
+    return _read_snapshot(name, dates[pos])
+
+
+def members_between(name, start_str, end_str):
+    """Every symbol that was a constituent at some point in start_str..end_str, in first-seen order."""
+    dates = snapshot_dates(name)
+    if not dates:
+        return []
+    lo = max(bisect_right(dates, start_str) - 1, 0)
+    hi = bisect_right(dates, end_str)
+    return normalize_symbols(s for d in dates[lo:max(hi, lo + 1)] for s in _read_snapshot(name, d))
+
+
+def membership_matrix(name, dates, symbols):
+    """Boolean array (len(dates), len(symbols)): True where the symbol was a constituent on that date."""
+    import numpy as np
+    import pandas as pd
+    snaps = snapshot_dates(name)
+    dates = pd.DatetimeIndex(dates).strftime("%Y-%m-%d")
+    if not snaps:
+        return np.ones((len(dates), len(symbols)), dtype=bool)
+    col = {s: j for j, s in enumerate(symbols)}
+    per_snapshot = np.zeros((len(snaps), len(symbols)), dtype=bool)
+    for i, d in enumerate(snaps):
+        idx = [col[s] for s in _read_snapshot(name, d) if s in col]
+        per_snapshot[i, idx] = True
+    pos = np.maximum(np.searchsorted(snaps, np.asarray(dates), side="right") - 1, 0)
+    return per_snapshot[pos]
+
+
+def get_universe(name=None, app=None, force_refresh=False):
+    """
+    Current constituents of a universe (default UNIVERSE), Yahoo-style and deduplicated.
+    Cached as snapshot files for CACHE_DAYS; if the source fails the latest snapshot is used, and for
+    the S&P 500 the built-in fallback list after that.
+    """
+    name = name or UNIVERSE
+    provider, live = _provider(name)
+    dates = snapshot_dates(name)
+    if dates and not live and not force_refresh:
+        latest = _snapshot_dir(name) / f"{dates[-1]}.txt"
+        if time.time() - latest.stat().st_mtime < CACHE_DAYS * 86400:
+            return _read_snapshot(name, dates[-1])
+    try:
+        history = provider(app=app)
+    except Exception:
+        history = {}
+    history = {d: s for d, s in history.items() if len(s)}
+    if history:
+        known = set(dates)
+        latest = max(history)
+        for date_str in sorted(history):
+            if date_str == latest or date_str not in known:
+                save_snapshot(name, history[date_str], date_str)
+        return normalize_symbols(history[latest])
+    if dates:
+        return _read_snapshot(name, dates[-1])
+    if name == "sp500":
+        from app.sp500 import _fallback_tickers
+        return _fallback_tickers()
+    return []
+
+
+def universe_label(name=None):
+    """Display name of a universe ("S&P 500", "Russell 3000", "Custom list")."""
+    name = name or UNIVERSE
+    return LABELS.get(name, "Custom list")
@@ -0,0 +1 @@
+"""Offline benchmarks for the daily prediction pipeline (see README, "Benchmarks")."""
@@ -0,0 +1,94 @@
+"""
+Indicator library timing: batch mode over a (dates, symbols) panel vs one incremental update per bar.
+
+    python -m benchmarks.bench_indicators [--dates 756] [--symbols 3000] [--repeats 5]
+
+Batch times cover the whole panel. The update column is the median cost of advancing every symbol by one
+bar after the full history has been fed in, i.e. what a daily run would pay per indicator. It does not grow
+with the history length. Exits 1 when the last incremental row differs from batch mode by more than 1e-8
+(relative).
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app import indicators
+
+
+def _median_seconds(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _panel(dates, symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (dates, symbols)), axis=0))
+    # Late listings and the odd missing bar, as in a real universe panel
+    starts = rng.integers(0, dates // 4, symbols)
+    close[np.arange(dates)[:, None] < starts] = np.nan
+    close[rng.random(close.shape) < 0.002] = np.nan
+    high = close * (1 + rng.uniform(0, 0.02, close.shape))
+    low = close * (1 - rng.uniform(0, 0.02, close.shape))
+    volume = np.where(np.isnan(close), np.nan, rng.uniform(1e5, 1e7, close.shape))
+    return close, high, low, volume
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch vs incremental indicator timing.")
+    parser.add_argument("--dates", type=int, default=756)
+    parser.add_argument("--symbols", type=int, default=3000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    close, high, low, volume = _panel(args.dates, args.symbols)
+    n = args.symbols
+    # name: (batch call, incremental state factory, inputs per bar, picks the compared output)
+    cases = {
+        "rolling_mean(20)": (lambda: indicators.rolling_mean(close, 20), lambda: indicators.RollingWindow(n, 20),
+                             (close,), lambda st, out: out),
+        "rolling_std(20)": (lambda: indicators.rolling_std(close, 20), lambda: indicators.RollingWindow(n, 20),
+                            (close,), lambda st, out: st.std()),
+        "zscore(20)": (lambda: indicators.zscore(close, 20), lambda: indicators.RollingWindow(n, 20),
+                       (close,), lambda st, out: st.zscore(close[-1])),
+        "ema(12)": (lambda: indicators.ema(close, 12), lambda: indicators.Ema(n, 12), (close,), lambda st, out: out),
+        "rsi(14)": (lambda: indicators.rsi(close), lambda: indicators.Rsi(n), (close,), lambda st, out: out),
+        "atr(14)": (lambda: indicators.atr(high, low, close), lambda: indicators.Atr(n),
+                    (high, low, close), lambda st, out: out),
+        "macd(12,26,9)": (lambda: indicators.macd(close)[2], lambda: indicators.Macd(n),
+                          (close,), lambda st, out: out[2]),
+        "volume_ratio(20)": (lambda: indicators.volume_ratio(volume, 20), lambda: indicators.VolumeRatio(n, 20),
+                             (volume,), lambda st, out: out),
+    }
+
+    failed = False
+    print(f"{args.dates} dates x {args.symbols} symbols")
+    print(f"{'indicator':<20}{'batch ms':>10}{'update ms':>11}{'us/symbol':>11}{'max rel diff':>14}")
+    for name, (batch, make_state, inputs, pick) in cases.items():
+        batch_seconds = _median_seconds(batch, args.repeats)
+        expected = batch()[-1]
+        state = make_state()
+        for t in range(args.dates - 1):
+            state.update(*(a[t] for a in inputs))
+        last = pick(state, state.update(*(a[-1] for a in inputs)))
+        update_seconds = _median_seconds(lambda: state.update(*(a[-1] for a in inputs)), args.repeats * 20)
+        both = ~np.isnan(expected) & ~np.isnan(last)
+        diff = float(np.max(np.abs(last[both] - expected[both]) / np.maximum(np.abs(expected[both]), 1e-12),
+                            initial=0.0))
+        mismatch = not np.array_equal(np.isnan(expected), np.isnan(last)) or diff > 1e-8
+        failed |= mismatch
+        print(f"{name:<20}{batch_seconds * 1000:>10.1f}{update_seconds * 1000:>11.3f}"
+              f"{update_seconds / n * 1e6:>11.3f}{diff:>14.1e}{'  MISMATCH' if mismatch else ''}")
+    if failed:
+        print("FAIL: incremental and batch modes disagree")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
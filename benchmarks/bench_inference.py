@@ -0,0 +1,76 @@
+"""
+Scoring latency of the compact NumPy runtime (app.tree_runtime) against sklearn's predict_proba.
+
+    python -m benchmarks.bench_inference [--rows 80 500] [--trees 200] [--depth 5] [--repeats 20]
+
+Fits a RandomForest on synthetic feature rows (with some NaNs, as live features have), exports it, and times
+both paths on float32 matrices of each size. Exits 1 when the two disagree by more than 1e-6.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _time(fn, repeats):
+    fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sklearn vs NumPy forest scoring.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[80, 500])
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.impute import SimpleImputer
+
+    from app.ml_model import FEATURE_NAMES
+    from app.tree_runtime import export_forest, load_forest
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, len(FEATURE_NAMES))).astype(np.float32)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    y = (np.nan_to_num(X[:, 0]) + rng.normal(scale=2, size=len(X)) > 0).astype(int)
+    imputer = SimpleImputer(strategy="median").fit(X)
+    model = RandomForestClassifier(n_estimators=args.trees, max_depth=args.depth, n_jobs=1, random_state=0)
+    model.fit(imputer.transform(X), y)
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="bench_inference_") as tmp:
+        joblib_path, npz_path = Path(tmp) / "model.joblib", Path(tmp) / "model.npz"
+        joblib.dump({"model": model, "imputer": imputer}, joblib_path)
+        export_forest(model, imputer, npz_path, FEATURE_NAMES)
+        load_time = _time(lambda: load_forest(npz_path), args.repeats)
+        forest = load_forest(npz_path)
+        print(f"{args.trees} trees, depth {args.depth}: model.joblib {os.path.getsize(joblib_path) / 1024:.0f} KB, "
+              f"model.npz {os.path.getsize(npz_path) / 1024:.0f} KB, npz load {load_time * 1000:.2f} ms")
+        print(f"{'rows':>6}{'sklearn ms':>12}{'numpy ms':>10}{'speedup':>9}{'max diff':>11}")
+        for n in args.rows:
+            batch = X[rng.integers(0, len(X), size=n)]
+            sk = _time(lambda: model.predict_proba(imputer.transform(batch))[:, 1], args.repeats)
+            npy = _time(lambda: forest.predict_proba(batch), args.repeats)
+            diff = float(np.abs(model.predict_proba(imputer.transform(batch))[:, 1] - forest.predict_proba(batch)).max())
+            failed |= diff > 1e-6
+            print(f"{n:>6}{sk * 1000:>12.2f}{npy * 1000:>10.2f}{sk / npy:>8.1f}x{diff:>11.1e}")
+    if failed:
+        print("FAIL: NumPy runtime differs from sklearn by more than 1e-6")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Time the daily pipeline stage by stage against offline fixtures and write the results as JSON.
+
+    python -m benchmarks.bench_pipeline                      # 100, 500 and 5,000 synthetic symbols
+    python -m benchmarks.bench_pipeline --sizes 500 --fixture recorded_sp500
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/previous.json
+
+Stages: ticker load, cold and warm price fetch, feature build, scoring, news enrichment, DB write,
+then end-to-end run_prediction, update_latest_accuracy and train_model. Each stage reports seconds,
+symbols/sec and (unless --no-memory) peak traced memory. --compare exits 1 when a stage got slower
+than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Replayed responses need no politeness delay; set before config is imported
+os.environ.setdefault("FETCH_RATE_PER_SEC", "0")
+os.environ.setdefault("FETCH_RETRIES", "0")
+os.environ.setdefault("FINNHUB_CALLS_PER_MINUTE", "1000000")
+
+from benchmarks.fixtures import ReplayDownloader, ensure_synthetic, fixture_paths, replay_http  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_SIZES = [100, 500, 5000]
+ACCURACY_DAYS = 20
+TRAINING_ROWS = 40
+
+
+class _Env:
+    """Fresh temp data dir for one universe: price store, constituent snapshot, model file and SQLite DB."""
+
+    def __init__(self, fixture):
+        import app as app_pkg
+        import yfinance
+        from app import ml_model, price_store, universe
+
+        self.tmp = Path(tempfile.mkdtemp(prefix="bench_"))
+        self.replay = ReplayDownloader(fixture)
+        self.fixture = fixture
+        price_store.STORE_FILE = self.tmp / "prices.db"
+        price_store._schema_ready = False
+        tickers = json.loads(fixture_paths(fixture)["tickers"].read_text())["tickers"]
+        universe.UNIVERSE = "sp500"
+        universe.UNIVERSE_DIR = self.tmp / "universes"
+        universe.save_snapshot("sp500", tickers)
+        ml_model.MODEL_FILE = self.tmp / "model.joblib"
+        yfinance.download = self.replay
+        app_pkg.DATABASE_PATH = self.tmp / "stock_predictor.db"
+        self.app = app_pkg.create_app()
+
+
+def _stages(env, measure_memory):
+    """Run every stage once; returns {stage: {seconds, symbols, symbols_per_sec[, peak_mb]}}."""
+    from app import fetcher, predictor, sp500
+    from app.accuracy import update_latest_accuracy
+    from app.features import build_feature_frame
+    from app.ml_model import train_model
+    from app.models import save_accuracy, save_daily_picks
+    from app import news_data
+    from app.news_data import get_news_sentiment_batch
+    from app.stock_data import fetch_prices_batched
+    import pandas as pd
+
+    report = {}
+    state = {}
+
+    def stage(name, fn, symbols):
+        if measure_memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        state[name] = fn()
+        seconds = time.perf_counter() - t0
+        entry = {"seconds": round(seconds, 6), "symbols": symbols,
+                 "symbols_per_sec": round(symbols / seconds, 1) if seconds > 0 else None}
+        if measure_memory:
+            entry["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        report[name] = entry
+
+    stage("ticker_load", sp500.get_sp500_tickers, 0)
+    tickers = state["ticker_load"]
+    n = len(tickers)
+    report["ticker_load"]["symbols"] = n
+    stage("price_fetch_cold", lambda: fetch_prices_batched(tickers, days=90, downloader=env.replay), n)
+    stage("price_fetch_warm", lambda: fetch_prices_batched(tickers, days=90, downloader=env.replay), n)
+    prices = state["price_fetch_warm"]
+    stage("feature_build", lambda: build_feature_frame(prices), n)
+    features = state["feature_build"]
+
+    def score():
+        scores = pd.Series(predictor._momentum_scores(features), index=features.index)
+        return scores.sort_values(ascending=False, kind="stable")
+    stage("scoring", score, len(features))
+    scores = state["scoring"]
+    top = list(scores.index[: predictor.TOP_N_FOR_NEWS])
+
+    def news():
+        news_data.clear_cache()
+        with replay_http(env.fixture):
+            return get_news_sentiment_batch("bench-key", top)
+    stage("news_enrichment", news, len(top))
+
+    def news_free_tier():
+        # Cold cache under the real free-tier bucket (60 calls/minute) instead of the unlimited bench budget
+        limiter = fetcher._limiters.get(news_data.FINNHUB_HOST)
+        fetcher._limiters[news_data.FINNHUB_HOST] = fetcher.RateLimiter(30 / 60.0, burst=30)
+        news_data.clear_cache()
+        try:
+            with replay_http(env.fixture):
+                return get_news_sentiment_batch("bench-key", top)
+        finally:
+            fetcher._limiters[news_data.FINNHUB_HOST] = limiter
+    stage("news_enrichment_free_tier", news_free_tier, len(top))
+    today = datetime.now().strftime("%Y-%m-%d")
+    picks = [(s, float(sc), "benchmark", float(features.loc[s, "last_close"])) for s, sc in scores.iloc[:3].items()]
+    stage("db_write", lambda: save_daily_picks(env.app, today, picks), len(picks))
+
+    def full_run():
+        predictor.FINNHUB_API_KEY = "bench-key"
+        news_data.clear_cache()
+        try:
+            with replay_http(env.fixture):
+                return predictor.run_prediction(env.app)
+        finally:
+            from config import FINNHUB_API_KEY
+            predictor.FINNHUB_API_KEY = FINNHUB_API_KEY
+    stage("run_prediction", full_run, n)
+
+    dates = [d.strftime("%Y-%m-%d") for d in pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=ACCURACY_DAYS + 1)[:-1]]
+    for i, d in enumerate(dates):
+        save_daily_picks(env.app, d, [(tickers[i % n], 1.0, "benchmark", None)])
+    stage("update_latest_accuracy", lambda: update_latest_accuracy(env.app), len(dates))
+
+    train_dates = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.offsets.BDay(ACCURACY_DAYS + 1), periods=TRAINING_ROWS)
+    for i, d in enumerate(train_dates):
+        save_accuracy(env.app, d.strftime("%Y-%m-%d"), tickers[(i * 7) % n], None, (-1) ** i * 0.5, 100.0, i % 2 == 0)
+    stage("train_model", lambda: train_model(env.app), TRAINING_ROWS + len(dates))
+    return report
+
+
+def bench_universe(size, fixture=None, measure_memory=True):
+    """Benchmark one universe (fresh temp env per pass). Timings come from an untraced pass."""
+    fixture = fixture or ensure_synthetic(size)
+    result = {"fixture": fixture, "stages": _stages(_Env(fixture), measure_memory=False)}
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            mem = _stages(_Env(fixture), measure_memory=True)
+        finally:
+            tracemalloc.stop()
+        for name, entry in mem.items():
+            result["stages"][name]["peak_mb"] = entry["peak_mb"]
+        result["peak_memory_mb"] = max(e["peak_mb"] for e in mem.values())
+    pipeline = ["ticker_load", "price_fetch_cold", "feature_build", "scoring", "news_enrichment", "db_write"]
+    total = sum(result["stages"][s]["seconds"] for s in pipeline)
+    n = result["stages"]["ticker_load"]["symbols"]
+    result["pipeline_seconds"] = round(total, 6)
+    result["symbols_per_sec"] = round(n / total, 1) if total > 0 else None
+    return result
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(current, previous, threshold):
+    """Stages slower than previous by more than threshold (fraction). Returns list of messages."""
+    regressions = []
+    for size, res in current["universes"].items():
+        old = previous.get("universes", {}).get(size)
+        if not old:
+            continue
+        for name, entry in res["stages"].items():
+            before = old["stages"].get(name, {}).get("seconds")
+            if before and entry["seconds"] > before * (1 + threshold) and entry["seconds"] - before > 0.01:
+                regressions.append(f"{size} symbols / {name}: {before:.3f}s -> {entry['seconds']:.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--fixture", help="use this fixture set (one size) instead of synthetic data")
+    parser.add_argument("--out", type=Path, help="JSON output path (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "universes": {},
+    }
+    sizes = [None] if args.fixture else args.sizes
+    for size in sizes:
+        res = bench_universe(size, fixture=args.fixture, measure_memory=not args.no_memory)
+        key = str(res["stages"]["ticker_load"]["symbols"])
+        results["universes"][key] = res
+        print(f"{key:>6} symbols: pipeline {res['pipeline_seconds']:.2f}s, {res['symbols_per_sec']} symbols/s"
+              + (f", peak {res['peak_memory_mb']} MB" if "peak_memory_mb" in res else ""))
+        for name, entry in res["stages"].items():
+            print(f"         {name:<24} {entry['seconds']:>9.4f}s")
+
+    out = args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"Wrote {out}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for msg in regressions:
+            print("REGRESSION", msg)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
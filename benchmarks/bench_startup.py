@@ -0,0 +1,95 @@
+"""
+Cold-start profile: time to import the app, create it and answer the first dashboard request, plus the
+modules with the largest cumulative import time (a package's figure includes what it imports).
+
+    python -m benchmarks.bench_startup [--repeats 5] [--top 15] [--max-seconds 1.0] [--out results.json]
+
+Every measurement runs in a fresh interpreter (started with -X importtime) against a temporary database.
+The first boot creates the schema; the others find it at the latest version and skip setup. Exits 1 when
+the median time to first response is above --max-seconds.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in the child interpreter; prints one JSON line of timings
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import app as app_pkg
+t1 = time.perf_counter()
+app_pkg.DATABASE_PATH = sys.argv[1]
+app = app_pkg.create_app()
+t2 = time.perf_counter()
+status = app.test_client().get("/").status_code
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2, "total": t3 - t0,
+                  "status": status, "heavy_loaded": sorted(m for m in HEAVY if m in sys.modules)}))
+"""
+HEAVY = ("yfinance", "sklearn", "joblib", "pandas", "numpy", "apscheduler", "requests")
+
+
+def _boot(db_path):
+    """One cold start in a new interpreter: (timings dict, {module: cumulative import seconds})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"HEAVY = {HEAVY!r}\n" + CHILD, str(db_path)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package" (nested imports are indented)
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative) / 1e6
+    return json.loads(proc.stdout.strip().splitlines()[-1]), imports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and time-to-first-response profile.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        db_path = Path(tmp) / "stock_predictor.db"
+        first, _ = _boot(db_path)
+        runs = [_boot(db_path) for _ in range(max(args.repeats, 1))]
+
+    timings = {k: statistics.median(r[k] for r, _ in runs) for k in ("import", "create_app", "first_request", "total")}
+    imports = {}
+    for _, mods in runs:
+        for name, seconds in mods.items():
+            imports.setdefault(name, []).append(seconds)
+    top = sorted(((statistics.median(v), k) for k, v in imports.items()), reverse=True)[:args.top]
+
+    print(f"first boot (creates schema): {first['total'] * 1000:8.1f} ms")
+    for key, seconds in timings.items():
+        print(f"{key:<28} {seconds * 1000:8.1f} ms  (median of {len(runs)})")
+    print(f"heavy modules loaded by the first response: {', '.join(runs[-1][0]['heavy_loaded']) or 'none'}")
+    print(f"\n{'module (cumulative)':<40}{'ms':>9}")
+    for seconds, name in top:
+        print(f"{name:<40}{seconds * 1000:>9.1f}")
+
+    failed = args.max_seconds is not None and timings["total"] > args.max_seconds
+    if failed:
+        print(f"FAIL: time to first response {timings['total']:.3f}s (max {args.max_seconds}s)")
+    if args.out:
+        args.out.write_text(json.dumps({
+            "first_boot": first, "median": timings, "heavy_loaded": runs[-1][0]["heavy_loaded"],
+            "imports_ms": {name: round(seconds * 1000, 2) for seconds, name in top},
+        }, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Fixture files for offline benchmarks: synthetic or recorded yfinance bars and Finnhub news, plus
+replayers that serve them in place of the network.
+
+Files for a fixture set NAME live in benchmarks/fixtures/:
+  NAME.prices.csv.gz  long-format bars: symbol,date,Open,High,Low,Close,Volume
+  NAME.news.json      {symbol: [Finnhub company-news items]}
+  NAME.tickers.json   {"tickers": [...]} (same shape as the S&P 500 ticker cache)
+"""
+import json
+import urllib.parse
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+HEADLINES = [
+    ("Shares surge after earnings beat", "Revenue growth tops estimates."),
+    ("Stock falls on guidance miss", "Analysts see a decline in margins."),
+    ("Company announces investor day", "Management to present strategy."),
+    ("Rally continues as bulls gain ground", "Momentum names rise again."),
+    ("Shares drop amid sector loss", "Bear case gains attention."),
+]
+
+
+def fixture_paths(name):
+    return {
+        "prices": FIXTURE_DIR / f"{name}.prices.csv.gz",
+        "news": FIXTURE_DIR / f"{name}.news.json",
+        "tickers": FIXTURE_DIR / f"{name}.tickers.json",
+    }
+
+
+def generate_synthetic(name, n_symbols, days=260, seed=0):
+    """Write a deterministic synthetic fixture set: n_symbols random-walk series and a few news items each."""
+    rng = np.random.default_rng(seed)
+    symbols = [f"S{i:05d}" for i in range(n_symbols)]
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    rets = rng.normal(0.0004, 0.018, size=(days, n_symbols))
+    close = 50 * np.exp(np.cumsum(rets, axis=0)) * rng.uniform(0.5, 5.0, size=n_symbols)
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+    frame = pd.DataFrame({
+        "symbol": np.tile(symbols, days),
+        "date": np.repeat(dates.strftime("%Y-%m-%d"), n_symbols),
+        "Open": (close - spread / 2).ravel(),
+        "High": (close + spread).ravel(),
+        "Low": (close - spread).ravel(),
+        "Close": close.ravel(),
+        "Volume": rng.integers(100_000, 10_000_000, size=close.size).astype(float),
+    })
+    paths = fixture_paths(name)
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    frame.to_csv(paths["prices"], index=False, float_format="%.4f")
+    now = int(datetime.now().timestamp())
+    news = {
+        sym: [
+            {"headline": h, "summary": s, "url": f"https://example.com/{sym}/{j}", "datetime": now - j * 3600}
+            for j, (h, s) in enumerate(HEADLINES[k % len(HEADLINES):] + HEADLINES[:k % len(HEADLINES)])
+        ]
+        for k, sym in enumerate(symbols)
+    }
+    paths["news"].write_text(json.dumps(news))
+    paths["tickers"].write_text(json.dumps({"tickers": symbols}))
+    return paths
+
+
+def record(name, symbols, days=260, api_key=None):
+    """Record real yfinance bars (and Finnhub news when api_key is set) for symbols into a fixture set."""
+    import yfinance as yf
+    from app.news_data import FINNHUB_BASE
+    import requests
+
+    data = yf.download(symbols, period=f"{days}d", group_by="ticker", auto_adjust=True,
+                       progress=False, threads=True)
+    rows = []
+    for sym in symbols:
+        if sym not in data.columns.get_level_values(0):
+            continue
+        bars = data[sym].dropna(subset=["Close"]).reset_index()
+        bars.insert(0, "symbol", sym)
+        bars = bars.rename(columns={bars.columns[1]: "date"})
+        bars["date"] = pd.to_datetime(bars["date"]).dt.strftime("%Y-%m-%d")
+        rows.append(bars[["symbol", "date", "Open", "High", "Low", "Close", "Volume"]])
+    paths = fixture_paths(name)
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    pd.concat(rows, ignore_index=True).to_csv(paths["prices"], index=False)
+    news = {}
+    if api_key:
+        to_date = datetime.now()
+        for sym in symbols:
+            r = requests.get(f"{FINNHUB_BASE}/company-news", timeout=10, params={
+                "symbol": sym, "from": (to_date - pd.Timedelta(days=5)).strftime("%Y-%m-%d"),
+                "to": to_date.strftime("%Y-%m-%d"), "token": api_key,
+            })
+            news[sym] = r.json() if r.ok else []
+    paths["news"].write_text(json.dumps(news))
+    paths["tickers"].write_text(json.dumps({"tickers": list(symbols)}))
+    return paths
+
+
+def ensure_synthetic(n_symbols, days=260):
+    """Name of the synthetic fixture set for n_symbols, generating it on first use."""
+    name = f"synthetic_{n_symbols}"
+    if not fixture_paths(name)["prices"].exists():
+        generate_synthetic(name, n_symbols, days=days)
+    return name
+
+
+class ReplayDownloader:
+    """
+    Stand-in for yf.download serving bars from a fixture set. Dates are shifted so the last recorded
+    bar lands on the latest business day, keeping old recordings inside the pipeline's lookback windows.
+    """
+
+    def __init__(self, name):
+        bars = pd.read_csv(fixture_paths(name)["prices"])
+        dates = pd.to_datetime(bars["date"])
+        latest = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=1)[0]
+        lag = len(pd.bdate_range(dates.max(), latest)) - 1
+        bars["date"] = dates + pd.offsets.BDay(lag) if lag > 0 else dates
+        self.frames = {
+            sym: group.drop(columns="symbol").set_index("date").sort_index()
+            for sym, group in bars.groupby("symbol", sort=False)
+        }
+        self.calls = 0
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        self.calls += 1
+        syms = [tickers] if isinstance(tickers, str) else list(tickers)
+        out = {}
+        for sym in syms:
+            frame = self.frames.get(sym)
+            if frame is None:
+                continue
+            out[sym] = frame.loc[(frame.index >= pd.Timestamp(start)) & (frame.index < pd.Timestamp(end))]
+        if not out:
+            return pd.DataFrame()
+        return pd.concat(out, axis=1)
+
+
+@contextmanager
+def replay_http(name):
+    """Serve Finnhub company-news requests made through `requests` from the fixture's news file."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    news = json.loads(fixture_paths(name)["news"].read_text())
+    original = HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        parsed = urllib.parse.urlparse(request.url)
+        params = urllib.parse.parse_qs(parsed.query)
+        resp = requests.models.Response()
+        resp.request = request
+        resp.url = request.url
+        if parsed.path.endswith("/company-news"):
+            resp.status_code = 200
+            resp._content = json.dumps(news.get(params.get("symbol", [""])[0], [])).encode()
+            resp.headers["Content-Type"] = "application/json"
+        else:
+            resp.status_code = 404
+            resp._content = b"{}"
+        return resp
+
+    HTTPAdapter.send = send
+    try:
+        yield
+    finally:
+        HTTPAdapter.send = original
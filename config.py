@@ -20,3 +20,37 @@ FLASK_ENV = os.getenv("FLASK_ENV", "development")
 SCHEDULE_HOUR = 9
 SCHEDULE_MINUTE = 0
 SCHEDULE_TIMEZONE = "America/New_York"
+
+# Price downloads: parallel chunk requests, request rate per host, retries and a per-run time budget
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+FETCH_RATE_PER_SEC = float(os.getenv("FETCH_RATE_PER_SEC", "2"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+FETCH_BACKOFF_SECONDS = float(os.getenv("FETCH_BACKOFF_SECONDS", "1.0"))
+FETCH_DEADLINE_SECONDS = float(os.getenv("FETCH_DEADLINE_SECONDS", "600"))
+
+# Finnhub news: free tier allows 60 calls/minute; fetched news is reused for NEWS_CACHE_SECONDS
+FINNHUB_CALLS_PER_MINUTE = int(os.getenv("FINNHUB_CALLS_PER_MINUTE", "60"))
+NEWS_CACHE_SECONDS = int(os.getenv("NEWS_CACHE_SECONDS", "900"))
+NEWS_CONCURRENCY = int(os.getenv("NEWS_CONCURRENCY", "8"))
+# The stock page's news panel waits at most this long for the Finnhub budget, then serves cached or no news
+NEWS_UI_DEADLINE_SECONDS = float(os.getenv("NEWS_UI_DEADLINE_SECONDS", "2"))
+
+# Symbols scored each day: sp500, russell1000, russell3000, watchlist, or csv (UNIVERSE_CSV) / csv:<path>
+UNIVERSE = os.getenv("UNIVERSE", "sp500").strip().lower()
+UNIVERSE_CSV = os.getenv("UNIVERSE_CSV", str(DATA_DIR / "universe.csv"))
+
+# CPU work (feature shards, model training/scoring, hyperparameter sweeps): 0 = every core, 1 = single process
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0"))
+# Grid-search model hyperparameters on every training run instead of using the fixed defaults
+ML_SWEEP = os.getenv("ML_SWEEP", "0") == "1"
+# Training labels: "picks" (the logged #1 pick per day) or "universe" (every constituent's next-day return
+# on every session of the last ML_TRAINING_YEARS)
+ML_LABELS = os.getenv("ML_LABELS", "picks")
+ML_TRAINING_YEARS = float(os.getenv("ML_TRAINING_YEARS", "3"))
+# Scoring runtime: "numpy" reads the compact model.npz without importing sklearn; "sklearn" unpickles model.joblib
+ML_RUNTIME = os.getenv("ML_RUNTIME", "numpy")
+# After each accuracy update, add trees for the newly labeled rows instead of waiting for a full retrain
+ML_INCREMENTAL = os.getenv("ML_INCREMENTAL", "1") == "1"
+
+# Pipeline metrics at /metrics and per-run stats in run_stats; set to 0 to turn instrumentation off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
@@ -1,12 +1,12 @@
 """Entry point: start Flask app and scheduler (local only for security)."""
 import os
 
-from app import create_app
-from app.scheduler import start_scheduler
-
-app = create_app()
-
 if __name__ == "__main__":
+    # Imports and app creation stay under the guard: spawned worker processes re-import this module
+    from app import create_app
+    from app.scheduler import start_scheduler
+
+    app = create_app()
     start_paused = os.getenv("DISABLE_SCHEDULER") == "1"
     start_scheduler(app, start_paused=start_paused)
     port = 5000
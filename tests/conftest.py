@@ -0,0 +1,23 @@
+"""Shared fixtures: every test gets its own temporary price store and database, and no rate-limit sleeps."""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_store(tmp_path, monkeypatch):
+    from app import fetcher, price_store
+
+    monkeypatch.setattr(price_store, "STORE_FILE", tmp_path / "prices.db")
+    monkeypatch.setattr(price_store, "_schema_ready", False)
+    monkeypatch.setattr(fetcher, "FETCH_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(fetcher, "_limiters", {})
+    fetcher.get_limiter(fetcher.YAHOO_HOST, rate=0)
+    return tmp_path
+
+
+@pytest.fixture
+def app(isolated_store, monkeypatch):
+    """The Flask app on a fresh database in the test's temporary directory."""
+    import app as app_package
+
+    monkeypatch.setattr(app_package, "DATABASE_PATH", isolated_store / "stock_predictor.db")
+    return app_package.create_app()
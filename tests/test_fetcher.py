@@ -0,0 +1,134 @@
+"""The fetch layer against local stub downloaders: retries, the deadline cut-off and partial failures."""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import fetcher, price_store
+from app.stock_data import fetch_prices_batched
+
+
+class StubDownloader:
+    """
+    Stands in for yf.download. Raises for the first `failures` calls, sleeps `delay` seconds per call,
+    and leaves out the symbols in `drop` when they are requested together with others.
+    """
+
+    def __init__(self, failures=0, delay=0.0, drop=()):
+        self.failures = failures
+        self.delay = delay
+        self.drop = set(drop)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, symbols, start, end, **kwargs):
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        with self._lock:
+            self.calls.append(symbols)
+            failing = len(self.calls) <= self.failures
+        if self.delay:
+            time.sleep(self.delay)
+        if failing:
+            raise ConnectionError("stub failure")
+        if len(symbols) > 1:
+            symbols = [s for s in symbols if s not in self.drop]
+        index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1))
+        frames = {
+            sym: pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": np.arange(1.0, len(index) + 1),
+                               "Volume": 1.0}, index=index)
+            for sym in symbols
+        }
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
+def test_retries_until_the_download_succeeds(monkeypatch):
+    monkeypatch.setattr(fetcher, "FETCH_RETRIES", 3)
+    stub = StubDownloader(failures=2)
+
+    result = fetch_prices_batched(["AAA", "BBB"], days=30, downloader=stub, max_workers=1)
+
+    assert sorted(result) == ["AAA", "BBB"]
+    assert len(stub.calls) == 3
+    assert all(call == ["AAA", "BBB"] for call in stub.calls)
+    assert result["AAA"].iloc[-1] == len(result["AAA"])
+
+
+def test_gives_up_after_the_configured_retries(monkeypatch):
+    monkeypatch.setattr(fetcher, "FETCH_RETRIES", 1)
+    stub = StubDownloader(failures=100)
+
+    result = fetch_prices_batched(["AAA", "BBB"], days=30, downloader=stub, max_workers=1)
+
+    assert result == {}
+    # One batch request and one per-symbol fallback, each tried 1 + FETCH_RETRIES times
+    assert len(stub.calls) == 3 * (1 + 1)
+    assert price_store.get_coverage(["AAA", "BBB"]) == {}
+
+
+def test_call_with_retry_does_not_back_off_past_the_deadline(monkeypatch):
+    # Backoff draws the full jittered delay: 1 s for the first retry
+    monkeypatch.setattr(fetcher.random, "uniform", lambda lo, hi: hi)
+    monkeypatch.setattr(fetcher, "FETCH_BACKOFF_SECONDS", 1.0)
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise ConnectionError("stub failure")
+
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        fetcher.call_with_retry(failing, retries=5, deadline=start + 0.2)
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 0.2
+
+
+def test_call_with_retry_backs_off_between_attempts(monkeypatch):
+    delays = []
+    monkeypatch.setattr(fetcher.random, "uniform", lambda lo, hi: hi)
+    monkeypatch.setattr(fetcher.time, "sleep", delays.append)
+    stub = StubDownloader(failures=3)
+
+    fetcher.call_with_retry(lambda: stub(["AAA"], "2026-01-05", "2026-01-10"), retries=3, backoff=0.5)
+
+    assert len(stub.calls) == 4
+    assert delays == [0.5, 1.0, 2.0]
+
+
+def test_work_not_started_before_the_deadline_is_skipped():
+    stub = StubDownloader(delay=0.3)
+
+    result = fetch_prices_batched(["AAA", "BBB", "CCC"], days=30, chunk_size=1, max_workers=1,
+                                  deadline_seconds=0.1, downloader=stub)
+
+    # The first chunk was already running at the deadline and completes; nothing else starts
+    assert stub.calls == [["AAA"]]
+    assert sorted(result) == ["AAA"]
+
+
+def test_symbols_dropped_by_the_batch_are_fetched_alone():
+    stub = StubDownloader(drop={"BBB"})
+
+    result = fetch_prices_batched(["AAA", "BBB", "CCC"], days=30, downloader=stub, max_workers=1)
+
+    assert sorted(result) == ["AAA", "BBB", "CCC"]
+    assert stub.calls == [["AAA", "BBB", "CCC"], ["BBB"]]
+
+
+def test_dropped_symbol_keeps_its_gap_for_the_next_refresh():
+    fetch_prices_batched(["AAA", "BBB"], days=30, downloader=StubDownloader(), max_workers=1)
+    before = price_store.get_coverage(["BBB"])["BBB"][:2]
+
+    # A later, wider refresh where the batch drops BBB and its fallback fails too
+    stub = StubDownloader(drop={"BBB"})
+
+    def batch_only(symbols, start, end, **kwargs):
+        if isinstance(symbols, str) or len(symbols) == 1:
+            raise ConnectionError("stub failure")
+        return stub(symbols, start, end, **kwargs)
+
+    result = fetch_prices_batched(["AAA", "BBB"], days=60, downloader=batch_only, max_workers=1)
+
+    assert "AAA" in result
+    assert price_store.get_coverage(["BBB"])["BBB"][:2] == before
@@ -0,0 +1,73 @@
+"""News fetching against a stub Finnhub session: the UI deadline, stale-cache fallback and batch skipping."""
+import logging
+import time
+
+import pytest
+
+from app import news_data
+
+
+class StubSession:
+    """Stands in for the requests session; returns one news item per call and records the symbols asked for."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params["symbol"])
+        stub = self
+
+        class Response:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return [{"headline": f"{params['symbol']} news {len(stub.calls)}", "url": "", "summary": "",
+                         "datetime": int(time.time())}]
+
+        return Response()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    stub = StubSession()
+    monkeypatch.setattr(news_data, "_get_session", lambda: stub)
+    monkeypatch.setattr(news_data, "NEWS_UI_DEADLINE_SECONDS", 0.2)
+    news_data.clear_cache()
+    yield stub
+    news_data.clear_cache()
+
+
+def _set_budget(tokens=0.0):
+    """Leave `tokens` requests in the Finnhub bucket (none: drained, as after a prediction run's sentiment pass)."""
+    limiter = news_data._limiter()
+    with limiter._lock:
+        limiter._tokens = tokens
+        limiter._last = time.monotonic()
+
+
+def test_company_news_fails_fast_when_budget_is_drained(session):
+    _set_budget()
+    t0 = time.monotonic()
+    assert news_data.get_company_news("key", "AAA") == []
+    assert time.monotonic() - t0 < 1.0
+    assert session.calls == []
+
+
+def test_company_news_serves_stale_cache_when_budget_is_drained(session, monkeypatch):
+    first = news_data.get_company_news("key", "AAA")
+    assert [n["headline"] for n in first] == ["AAA news 1"]
+    monkeypatch.setattr(news_data, "NEWS_CACHE_SECONDS", 0)
+    _set_budget()
+    assert news_data.get_company_news("key", "AAA") == first
+    assert session.calls == ["AAA"]
+
+
+def test_batch_skips_and_logs_uncached_symbols_past_the_budget(session, caplog):
+    news_data.get_company_news("key", "AAA")
+    _set_budget(2.0)
+    with caplog.at_level(logging.WARNING, logger="app.news_data"):
+        result = news_data.get_news_sentiment_batch("key", ["AAA", "BBB", "CCC", "DDD"], max_workers=1)
+    assert sorted(result) == ["AAA", "BBB", "CCC"]
+    assert sorted(session.calls) == ["AAA", "BBB", "CCC"]
+    assert "1 of 4 symbols scored without news (DDD)" in caplog.text
@@ -0,0 +1,177 @@
+"""
+Dashboard and accuracy queries against databases seeded with 1 and 10 years of picks: every statement they run
+must be answered from an index (EXPLAIN QUERY PLAN shows no SCAN of a table, except an index walk that a LIMIT stops),
+and the SQLite VM steps each accessor takes must not grow with the history. Step counts are deterministic, unlike
+timings.
+"""
+import re
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app import database, models
+
+# Accessors behind "/", /api/accuracy and the accuracy job
+QUERIES = {
+    "get_latest_daily_picks": lambda app: models.get_latest_daily_picks(app),
+    "get_latest_prediction": lambda app: models.get_latest_prediction(app),
+    "get_daily_picks_history": lambda app: models.get_daily_picks_history(app, limit=30),
+    "get_predictions_history": lambda app: models.get_predictions_history(app, limit=14),
+    "get_accuracy_history": lambda app: models.get_accuracy_history(app, limit=90),
+    "get_accuracy_stats": lambda app: models.get_accuracy_stats(app),
+    "get_accuracy_by_rank": lambda app: models.get_accuracy_by_rank(app),
+    "get_pending_accuracy": lambda app: models.get_pending_accuracy(app),
+}
+PENDING_DATES = 5  # most recent dates the seed leaves without outcomes
+SCAN = re.compile(r"^SCAN \w+(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def _seed(app, years):
+    """Fill daily_picks, predictions, accuracy_log and pick_accuracy with `years` of trading days (3 picks each)."""
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252 * years).strftime("%Y-%m-%d")
+    picks, preds, acc, outcomes = [], [], [], []
+    for i, d in enumerate(dates):
+        for rank in (1, 2, 3):
+            sym = f"S{(i * 3 + rank) % 500:03d}"
+            picks.append((d, rank, sym, 1.0 / rank, "seed", 100.0))
+            if rank == 1:
+                preds.append((sym, d, 1.0, "seed"))
+        if i < len(dates) - PENDING_DATES:
+            acc.append((d, f"S{(i * 3 + 1) % 500:03d}", None, 0.5 - (i % 2), 100.0, i % 2))
+            outcomes.extend((d, rank, f"S{(i * 3 + rank) % 500:03d}", 100.0, 100.5, 0.5, rank % 2) for rank in (1, 2, 3))
+    with database.db_connection(app) as conn:
+        conn.executemany("INSERT INTO daily_picks (date, rank, symbol, score, reason, price) VALUES (?, ?, ?, ?, ?, ?)", picks)
+        conn.executemany("INSERT INTO predictions (symbol, date, score, reason) VALUES (?, ?, ?, ?)", preds)
+        conn.executemany(models.ACCURACY_LOG_UPSERT, acc)
+        conn.executemany(models.PICK_ACCURACY_UPSERT, outcomes)
+
+
+def _unbounded_scans(sql, plan):
+    """Plan steps that read a whole table: a SCAN without an index, or an index walk with no LIMIT to stop it."""
+    limited = " LIMIT " in " ".join(sql.upper().split())
+    return [step for step in plan if SCAN.match(step) and ("INDEX" not in step or not limited)]
+
+
+class Recorder:
+    """Wraps database.acquire so every connection reports its SELECT statements and VM steps."""
+
+    def __init__(self, monkeypatch):
+        self.statements, self.steps = [], 0
+        database.close_pools()
+        acquire = database.acquire
+
+        def traced(path):
+            conn = acquire(path)
+            conn.set_trace_callback(self._trace)
+            conn.set_progress_handler(self._step, 1)
+            return conn
+
+        monkeypatch.setattr(database, "acquire", traced)
+
+    def _trace(self, sql):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.statements.append(sql)
+
+    def _step(self):
+        self.steps += 1
+        return 0
+
+    def run(self, fn, app):
+        self.statements, self.steps = [], 0
+        result = fn(app)
+        return result, self.statements, self.steps
+
+
+def _app_on(path):
+    """The Flask app on the database at path (created and migrated if new)."""
+    import app as app_package
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app_package, "DATABASE_PATH", path)
+        return app_package.create_app()
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    """{years: database path} for a 1- and a 10-year history, built once for the module."""
+    paths = {}
+    for years in (1, 10):
+        paths[years] = tmp_path_factory.mktemp(f"queries_{years}y") / "stock_predictor.db"
+        _seed(_app_on(paths[years]), years)
+    database.close_pools()
+    return paths
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_no_unbounded_scan(seeded, monkeypatch, name):
+    app = _app_on(seeded[10])
+    recorder = Recorder(monkeypatch)
+    _, statements, _ = recorder.run(QUERIES[name], app)
+    assert statements
+    with database.connection(seeded[10]) as conn:
+        for sql in statements:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            assert not _unbounded_scans(sql, plan), f"{name} scans a whole table: {sql}\n" + "\n".join(plan)
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_work_does_not_grow_with_history(seeded, monkeypatch, name):
+    recorder = Recorder(monkeypatch)
+    steps = {}
+    for years, path in seeded.items():
+        app = _app_on(path)
+        QUERIES[name](app)  # first call per app may create the connection
+        steps[years] = recorder.run(QUERIES[name], app)[2]
+    assert steps[10] <= steps[1] * 1.1 + 50, f"{name}: {steps[1]} VM steps on 1 year, {steps[10]} on 10 years"
+
+
+def test_pending_accuracy_finds_unreconciled_dates(seeded):
+    pending = models.get_pending_accuracy(_app_on(seeded[10]))
+    assert len(pending) == PENDING_DATES * 3
+    assert {r[3] for r in pending if r[1] == 1} == {True}
+
+
+def test_accuracy_totals_match_the_tables(seeded):
+    app = _app_on(seeded[10])
+    with database.connection(seeded[10]) as conn:
+        total, correct = conn.execute("SELECT COUNT(*), SUM(was_correct) FROM accuracy_log").fetchone()
+        by_rank = conn.execute(
+            "SELECT rank, COUNT(*), SUM(was_correct), AVG(actual_return) FROM pick_accuracy GROUP BY rank ORDER BY rank"
+        ).fetchall()
+    stats = models.get_accuracy_stats(app)
+    assert (stats["total"], stats["correct"]) == (total, correct)
+    assert [(r["rank"], r["total"], r["correct"], r["avg_return"]) for r in models.get_accuracy_by_rank(app)] == [
+        (rank, n, c, round(avg, 3)) for rank, n, c, avg in by_rank
+    ]
+
+
+def test_accuracy_totals_follow_upserts(app):
+    models.save_accuracy(app, "2024-01-02", "AAA", None, 1.0, 10.0, True)
+    models.save_accuracy(app, "2024-01-03", "BBB", None, -1.0, 10.0, False)
+    models.save_accuracy(app, "2024-01-02", "AAA", None, -2.0, 10.0, False)  # re-reconciled
+    assert models.get_accuracy_stats(app) == {"total": 2, "correct": 0, "accuracy_pct": 0.0}
+
+
+def test_accuracy_totals_migration_counts_existing_rows(tmp_path):
+    path = tmp_path / "old.db"
+    app = _app_on(path)
+    models.save_accuracy_results(app, [
+        {"date": "2024-01-02", "rank": rank, "symbol": "AAA", "pred_close": 10.0, "actual_close": 11.0,
+         "actual_return": float(rank), "was_correct": rank != 2, "needs_log": rank == 1}
+        for rank in (1, 2, 3)
+    ])
+    database.close_pools()
+    # Back to the schema before accuracy_totals, as a database created by an older release
+    conn = sqlite3.connect(path)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.execute("DROP TABLE accuracy_totals")
+    conn.execute(f"PRAGMA user_version = {len(database.MIGRATIONS) - 1}")
+    conn.commit()
+    conn.close()
+    app = _app_on(path)
+    assert models.get_accuracy_stats(app) == {"total": 1, "correct": 1, "accuracy_pct": 100.0}
+    assert [(r["rank"], r["total"], r["correct"], r["avg_return"]) for r in models.get_accuracy_by_rank(app)] == [
+        (1, 1, 1, 1.0), (2, 1, 0, 2.0), (3, 1, 1, 3.0)
+    ]
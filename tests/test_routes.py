@@ -0,0 +1,30 @@
+"""Route-level behaviour that does not need live data: parameters are translated before the data layer sees them."""
+import pandas as pd
+import pytest
+
+from app import stock_data, trading_calendar
+
+
+@pytest.fixture
+def chart_calls(monkeypatch):
+    calls = []
+
+    def fake_chart(symbol, sessions=63):
+        calls.append(sessions)
+        start, end = trading_calendar.lookback_window(sessions)
+        return [{"date": d.strftime("%Y-%m-%d"), "close": 1.0} for d in trading_calendar.sessions_between(start, end)]
+
+    monkeypatch.setattr(stock_data, "get_chart_data", fake_chart)
+    monkeypatch.setattr(stock_data, "get_stock_name", lambda symbol: symbol)
+    return calls
+
+
+@pytest.mark.parametrize("days", [5, 30, 90, 180, 365])
+def test_chart_days_are_calendar_days(app, chart_calls, days):
+    resp = app.test_client().get(f"/api/stock/aaa/chart?days={days}")
+    assert resp.status_code == 200
+    data = resp.get_json()["data"]
+    assert chart_calls == [len(data)]
+    # The first bar is no more than `days` calendar days (and no fewer than days - 5) before the last one
+    span = (pd.Timestamp(data[-1]["date"]) - pd.Timestamp(data[0]["date"])).days
+    assert days - 5 <= span <= days